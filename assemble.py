@@ -13,30 +13,42 @@ There are two approaches to "resolving" labels:
 
 import re
 import sys
+import enum
 import json
 from pathlib import Path
 import argparse
 import configparser
-from typing import Dict, List,  Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 
 import logging
 logging.basicConfig()
 log = logging.getLogger(__name__)
-log.setLevel(logging.DEBUG)
+# Errors only; quackc --trace=assemble:debug shows each jump resolved
+log.setLevel(logging.WARNING)
 
 
 class Configuration:
     def __init__(self):
         config = configparser.ConfigParser()
+        # read() skips a missing file, so that shows up as a missing key
+        config.read("asm.conf")
         try:
-            config.read("asm.conf")
             self.tvmlib = Path(config["DEFAULT"]["TVMLIB"])
-        except FileExistsError:
+        except KeyError:
             # If no configuration file is present, we will look in ./OBJ
             self.tvmlib = Path("./OBJ")
 
 
-CONFIG = Configuration()  # Visible from any code
+_config: Optional[Configuration] = None
+
+def config() -> Configuration:
+    """The configuration in ./asm.conf, read when first needed rather than on
+    import, so that modules importing this one work from any directory.
+    """
+    global _config
+    if _config is None:
+        _config = Configuration()
+    return _config
 
 
 def cli() -> object:
@@ -60,18 +72,22 @@ class ImportedModule:
     """Imported module uses information from
     json file
     """
-    def __init__(self, path: Path):
-        with open(path, "r") as source:
-            self.json = json.load(source)
+    def __init__(self, struct: dict):
+        self.json = struct
         # Dict from name to position would be faster, but
         # number of lookups is very small
         self.methods: List[str] = self.json["methods"]
         self.fields:  List[str] = self.json["fields"]
 
+    @classmethod
+    def load(cls, path: Path) -> "ImportedModule":
+        with open(path, "r") as source:
+            return cls(json.load(source))
+
     def method_slot(self, name: str) -> int:
         if name in self.methods:
             return self.methods.index(name)
-        log.error(f"Method {name} not defined")
+        log.error("Method %s not defined", name)
         return 0
 
     def n_methods(self) -> int:
@@ -81,17 +97,40 @@ class ImportedModule:
         return self.fields.index(name)
 
 
+# Cache of imported modules, shared by every class assembled in this
+# process.  Each ObjectCode keeps its own list of the modules it
+# imports, in the order their indexes are assigned.
 IMPORTS: Dict[str, Optional[ImportedModule]] = { "$": None }
 # $ will be replaced by current class name in output .json file
 
 
+def reset_imports():
+    """Forget every imported module, so that object files are read again"""
+    IMPORTS.clear()
+    IMPORTS["$"] = None
+
+
 def import_module(module: str) -> ImportedModule:
     if module not in IMPORTS:
-        path = CONFIG.tvmlib.joinpath(module).with_suffix(".json")
-        IMPORTS[module] = ImportedModule(path)
+        path = config().tvmlib.joinpath(module).with_suffix(".json")
+        IMPORTS[module] = ImportedModule.load(path)
     return IMPORTS[module]
 
 
+def register_module(objcode: "ObjectCode"):
+    """Make a class assembled in this process importable by
+    classes assembled after it, without reading back its .json file.
+    """
+    IMPORTS[objcode.class_name] = ImportedModule(objcode.struct())
+
+
+def register_layout(class_name: str, methods: List[str], fields: List[str]):
+    """Make a class importable before it is assembled, from its vtable
+    and field layout, so classes can be assembled in any order.
+    """
+    IMPORTS[class_name] = ImportedModule({"methods": methods, "fields": fields})
+
+
 # The named literals MUST match the definitions
 # in vm_loader.h for CODE_NOTHING, etc
 # #define CODE_NOTHING  (-1)
@@ -174,33 +213,153 @@ class InstructionSet:
 # after all).  Create stub symbol files for built-ins.
 # So assembler does a lot of the symbolic -> numeric resolution.
 
-# Instruction set is a global
-INSTRS = InstructionSet("opdefs.txt")
+# Instruction set is a global.  opdefs.txt lives beside this file.
+INSTRS = InstructionSet(str(Path(__file__).resolve().parent.joinpath("opdefs.txt")))
 
 
-class Instruction:
-    """Object code instruction, including operand if any."""
-    def __init__(self, label: Optional[str],
-                 operation: InstructionDef,
-                 operand: Optional[str]):
-        self.label = label
-        self.operation = operation
-        self.operand = operand
-        if operation.ops == '0':
-            assert operand is None
-        else:
-            assert operand is not None
+# ----------------
+#  Instruction IR.  The compiler hands the assembler a list of
+#  these items directly, so nothing is formatted as text and then
+#  parsed again.  Assembly source is parsed into the same items by
+#  translate(), and render() turns a list of items back into text.
+#
+#  Each opcode is a member of Op, named after the operation in
+#  opdefs.txt (Op.JUMP_IF is jump_if) with the operation's numeric
+#  code as its value.
+#
+Op = enum.IntEnum("Op", [(name.upper(), instr.code) for name, instr in INSTRS.ops.items()])
+
+
+class MemberRef(NamedTuple):
+    """Class:method operand of call, Class:field operand of
+    load_field and store_field.  The class being assembled may be
+    named either by its own name or by $.
+    """
+    class_name: str
+    member: str
 
     def __str__(self) -> str:
-        if self.label:
-            label = f"{self.label}: "
-        else:
-            label = "  "
-        if self.operand:
-            operand = f"    {self.operand}"
-        else:
-            operand = ""
-        return f"{label} {self.operation.name} {operand}"
+        return f"{self.class_name}:{self.member}"
+
+
+class IntConst(NamedTuple):
+    value: int
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+
+class StrConst(NamedTuple):
+    """String constant; value is the string itself, escapes decoded"""
+    value: str
+
+    @classmethod
+    def from_literal(cls, literal: str) -> "StrConst":
+        """From a quoted literal with escapes, as in Quack or assembly source"""
+        # Only the enclosing quotes: strip('"') would also take an escaped one
+        return cls(literal[1:-1].encode("utf-8").decode("unicode_escape"))
+
+    def __str__(self) -> str:
+        return json.dumps(self.value)
+
+
+class NamedConst(NamedTuple):
+    """One of NAMED_LITERALS (nothing, true, false)"""
+    name: str
+
+    def __str__(self) -> str:
+        return self.name
+
+
+# Operand of an instruction, by operation:
+#   const                  IntConst, StrConst or NamedConst
+#   call                   MemberRef (Class:method)
+#   load_field, store_field  MemberRef (Class:field)
+#   new, is_instance       str (class name)
+#   load, store            str (variable name)
+#   jump, jump_if, jump_ifnot  str (label)
+#   return, alloc, roll    int
+Operand = Union[MemberRef, IntConst, StrConst, NamedConst, str, int, None]
+
+
+class Instr(NamedTuple):
+    """One operation of the vm with its operand, if any"""
+    op: Op
+    operand: Operand = None
+
+    def __str__(self) -> str:
+        if self.operand is None:
+            return f"\t{self.op.name.lower()}"
+        return f"\t{self.op.name.lower()} {self.operand}"
+
+
+class Label(NamedTuple):
+    name: str
+
+    def __str__(self) -> str:
+        return f"{self.name}:"
+
+
+class ClassDecl(NamedTuple):
+    class_name: str
+    super_name: str
+
+    def __str__(self) -> str:
+        return f".class {self.class_name}:{self.super_name}"
+
+
+class IntervalDecl(NamedTuple):
+    """Preorder interval of this class in the compiler's class hierarchy:
+    its subclasses are numbered pre..last.  Lets the VM's is_instance
+    test subclassing with two comparisons.
+    """
+    pre: int
+    last: int
+
+    def __str__(self) -> str:
+        return f".interval {self.pre} {self.last}"
+
+
+class FieldDecl(NamedTuple):
+    name: str
+
+    def __str__(self) -> str:
+        return f".field {self.name}"
+
+
+class MethodDecl(NamedTuple):
+    """Starts the code of a method, or with forward, reserves
+    its slot so it can be called before it is defined.
+    """
+    name: str
+    forward: bool = False
+
+    def __str__(self) -> str:
+        if self.forward:
+            return f".method {self.name} forward"
+        return f".method {self.name}"
+
+
+class ArgsDecl(NamedTuple):
+    names: Tuple[str, ...]
+
+    def __str__(self) -> str:
+        return f".args {','.join(self.names)}"
+
+
+class LocalsDecl(NamedTuple):
+    names: Tuple[str, ...]
+
+    def __str__(self) -> str:
+        return f".local {','.join(self.names)}"
+
+
+IRItem = Union[Instr, Label, ClassDecl, IntervalDecl, FieldDecl, MethodDecl, ArgsDecl, LocalsDecl]
+
+
+def render(items: List[IRItem]) -> List[str]:
+    """Assembly source lines for a list of IR items"""
+    return [str(item) for item in items]
 
 
 # ----------------
@@ -216,10 +375,15 @@ class ObjectCode:
         # The following are initialized in declare_class
         self.class_name: str = ""
         self.super_name: str = ""
+        # (pre, last) from an .interval directive, if any
+        self.interval: Optional[Tuple[int, int]] = None
         self.method_list: List[str] = []
         self.field_list: List[str] = []
-        # Constant pool
+        # Constant pool; each constant is in it once, however many
+        # instructions use it (the vm loader takes 30 per class)
         self.constants: List[Tuple[str, int]] = []
+        # (kind, value) -> index in constants
+        self.constant_index: Dict[Tuple[str, str], int] = {}
         # Method code (instructions)
         self.code = []  # Will expand to code per method
         # For each method defined here, we want its
@@ -235,19 +399,35 @@ class ObjectCode:
         self.labels: Dict[str, int] = {}
         # address -> unresolved label
         self.label_patch: Dict[int, str] = {}
+        # Modules referenced by this class, indexed by position;
+        # $ (this class) is always first
+        self.imports: List[str] = ["$"]
+
+    def import_module(self, module: str) -> ImportedModule:
+        """Look up a module through the shared cache, recording
+        that this class imports it.
+        """
+        if module not in self.imports:
+            self.imports.append(module)
+        return import_module(module)
 
     def declare_class(self, name: str, super_name: str):
         self.class_name = name
         self.super_name = super_name
-        super_module = import_module(super_name)
+        super_module = self.import_module(super_name)
         # Methods and field list are initially those
         # we inherit, but may be extended elsewhere
-        # in the assembly code
-        self.method_list = super_module.methods
+        # in the assembly code.  Copied, because the
+        # imported module may be shared with other classes.
+        self.method_list = list(super_module.methods)
         self.n_inherited = len(super_module.methods)
-        self.field_list = super_module.fields
+        self.field_list = list(super_module.fields)
         # AND we need to be able to refer to this class in NEW
 
+    def declare_interval(self, pre: int, last: int):
+        assert pre <= last, "Interval must not be empty"
+        self.interval = (pre, last)
+
     def declare_field(self, name: str):
         """Add a field to objects of this class;
         do this before methods.
@@ -312,44 +492,49 @@ class ObjectCode:
         if var in self.method_locals:
             local_num = self.method_locals.index(var)
             return 3 + local_num
-        log.error(f"Local variable {var} not declared in this method")
+        log.error("Local variable %s not declared in this method", var)
         return 88   # Just a placeholder; this code should not be used!
 
-    def resolve_call(self, full_name: str) -> int:
-        """Resolve "Class:method" to slot number"""
-        class_name, method_name = full_name.split(":")
+    def is_this_class(self, class_name: str) -> bool:
+        return class_name == "$" or class_name == self.class_name
+
+    def resolve_call(self, ref: MemberRef) -> int:
+        """Resolve Class:method to slot number"""
+        class_name, method_name = ref
         try:
-            if class_name == "$":
+            if self.is_this_class(class_name):
                 # This class
                 method_slot = self.method_list.index(method_name)
             else:
                 # Imported class
-                module_record = import_module(class_name)
+                module_record = self.import_module(class_name)
                 method_slot = module_record.method_slot(method_name)
         except LookupError:
-            log.error(f"No such method '{full_name}'")
+            log.error("No such method '%s'", ref)
             method_slot = 0xBAD  # 2989 decimal
         return method_slot
 
-    def resolve_field(self, full_name: str) -> int:
+    def resolve_field(self, ref: MemberRef) -> int:
         """Resolve Class:field to slot number"""
-        class_name, field_name = full_name.split(":")
+        class_name, field_name = ref
         try:
-            if class_name == "$":
+            if self.is_this_class(class_name):
                 # This class
                 field_slot = self.field_list.index(field_name)
             else:
                 # Imported class (is that legal in Quack?)
-                module_record = import_module(class_name)
+                module_record = self.import_module(class_name)
                 field_slot = module_record.field_slot(field_name)
         except LookupError:
-            log.error(f"No such field '{full_name}'")
+            log.error("No such field '%s'", ref)
             field_slot = 0xBAD  # 2989 decimal
         return field_slot
 
     def resolve_class(self, class_name: str) -> int:
-        import_module(class_name)  # In case we need to
-        index = list(IMPORTS).index(class_name)
+        if self.is_this_class(class_name):
+            return 0
+        self.import_module(class_name)  # In case we need to
+        index = self.imports.index(class_name)
         return index
 
     def resolve_jumps(self):
@@ -361,10 +546,10 @@ class ObjectCode:
                 # PC will be patch loc + 1
                 jump_span = label_loc - (patch_loc + 1)
                 self.code[patch_loc] = jump_span
-                log.debug(f"Jump from loc {patch_loc} to {patch_label} "
-                          f"({label_loc}) is {jump_span} words")
+                log.debug("Jump from loc %d to %s (%d) is %d words",
+                          patch_loc, patch_label, label_loc, jump_span)
             except IndexError:
-                log.error(f"Unresolved label '{patch_label}'")
+                log.error("Unresolved label '%s'", patch_label)
 
     def add_int_constant(self, literal: str) -> int:
         literal_index = len(self.int_constants)
@@ -380,22 +565,18 @@ class ObjectCode:
         """On a line by itself"""
         self.labels[label] = len(self.code)
 
-    def add_instruction(self, instr: Instruction):
-        if instr.label:
-            # Address of next instruction
-            self.labels[instr.label] = len(self.code)
-        self.code.append(instr.operation.code)
-        if instr.operand:
+    def add_instruction(self, instr: Instr):
+        self.code.append(int(instr.op))
+        if instr.operand is not None:
             # Many operands require interpretation
             # that depends on the operation
             op_value = self.encode_operand(instr)
             self.code.append(op_value)
 
-    def encode_operand(self, instr: Instruction):
+    def encode_operand(self, instr: Instr):
         """Each operand type is idiosyncratic"""
-        op: str = instr.operation.name
-        operand: str = instr.operand
-        if op == "const":
+        op, operand = instr
+        if op is Op.CONST:
             # We have integer constants and string
             # constants.  They reside in the same
             # runtime table, but are initialized
@@ -403,49 +584,49 @@ class ObjectCode:
             # keep them together in one list to give them
             # consistent internal numbers that can be remapped
             # in the loader.
-            if operand in NAMED_LITERALS:
-                return NAMED_LITERALS[operand]
-            if re.match("[0-9]+", operand):
-                kind = "i"
-            elif re.match('["][^"]*["]', operand):
-                kind = "s"
-                operand = operand.strip("\"").\
-                    encode("utf-8").decode("unicode_escape")
+            if isinstance(operand, IntConst):
+                key = ("i", str(operand.value))
+            elif isinstance(operand, StrConst):
+                key = ("s", operand.value)
+            elif operand.name in NAMED_LITERALS:
+                return NAMED_LITERALS[operand.name]
             else:
-                log.error(f"Could not type operand '{operand}'")
-                kind = "BOGUS CONSTANT"
-            self.constants.append({"kind": kind, "value": operand})
-            return len(self.constants) - 1
-        if op == "call":
+                # Already reported by parse_operand
+                key = ("BOGUS CONSTANT", operand.name)
+            if key not in self.constant_index:
+                self.constant_index[key] = len(self.constants)
+                self.constants.append({"kind": key[0], "value": key[1]})
+            return self.constant_index[key]
+        if op is Op.CALL:
             slot = self.resolve_call(operand)
             return slot
-        if op in ["load_field", "store_field"]:
+        if op is Op.LOAD_FIELD or op is Op.STORE_FIELD:
             # These operations use indexes into the fields of an object
             slot = self.resolve_field(operand)
             return slot
-        if op in  ["new", "is_instance"]:
+        if op is Op.NEW or op is Op.IS_INSTANCE:
             # We use an index into the list of modules
             slot = self.resolve_class(operand)
             return slot
-        if op in ["load", "store"]:
+        if op is Op.LOAD or op is Op.STORE:
             return self.resolve_local(operand)
-        if op in ["return",  "alloc", "roll"]:
+        if op is Op.RETURN or op is Op.ALLOC or op is Op.ROLL:
             # These operations have integer operands that should be
             # resolved by the compiler
-            return int(operand)
-        if op in ["jump", "jump_if", "jump_ifnot"]:
+            return operand
+        if op is Op.JUMP or op is Op.JUMP_IF or op is Op.JUMP_IFNOT:
             # Operand is a label, which we may not have seen yet.
             # Leave it to be patched in the final label resolution step
             self.label_patch[len(self.code)] = operand
             return UNRESOLVED_ADDRESS
         # Match should be exhaustive
-        log.error(f"Unhandled operand type for {instr}")
+        log.error("Unhandled operand type for %s", instr)
 
-    def json(self) -> str:
+    def struct(self) -> dict:
         struct = {
             "class_name": self.class_name,
             "super": self.super_name,
-            "imports": [self.class_name] + list(IMPORTS)[1:],
+            "imports": [self.class_name] + self.imports[1:],
             "methods": self.method_list,
             "fields": self.field_list,
             # It's just simpler to count fields and methods
@@ -457,7 +638,14 @@ class ObjectCode:
             "constants": self.constants,
             "code": self.method_code
         }
-        return json.dumps(struct, indent=4)
+        # Classes without an interval are checked by walking their
+        # superclass chain in the VM
+        if self.interval is not None:
+            struct["interval"] = list(self.interval)
+        return struct
+
+    def json(self) -> str:
+        return json.dumps(self.struct(), indent=4)
 
     def __str__(self) -> str:
         return self.json()
@@ -481,7 +669,7 @@ INSTR_PAT = re.compile(r"""
     \s*
     (?P<opname> [a-zA-Z_]+)      # Operation name is required
     (\s+ (?P<operand>     # Operands are integers, quoted strings, or names
-             [0-9]+           # Integers are strings of digits
+             -?[0-9]+         # Integers are strings of digits, maybe negative
            |
              ["](             # String begins and ends with quote
                ([\\].)  |           # Anything escaped
@@ -507,6 +695,13 @@ CLASS_DECL_PAT = re.compile(r"""
 \s*
 """, re.VERBOSE)
 
+# Directive:  Preorder interval of this class, ".interval pre last"
+INTERVAL_DECL_PAT = re.compile(r"""
+[.]interval \s+
+(?P<pre> [0-9]+ ) \s+ (?P<last> [0-9]+ )
+\s*
+""", re.VERBOSE)
+
 # Directive: Name this method
 #   (Starts a new method entry in the code object)
 METHOD_DEF_PAT = re.compile(r"""
@@ -538,7 +733,7 @@ FIELD_DECL_PAT = re.compile(r"""
 #   can be used within method code.
 LOCALS_DECL_PAT = re.compile(r"""
 [.]local \s+
-(?P<local_var_name> (\w+)(,\w+)*)
+(?P<local_var_name> ([$]?\w+)(,[$]?\w+)*)   # $names are the compiler's own
 \s*
 """, re.VERBOSE)
 
@@ -552,8 +747,28 @@ ARGS_DECL_PAT = re.compile(r"""
 """, re.VERBOSE)
 
 
-def translate(lines: List[str]) -> ObjectCode:
-    code = ObjectCode()
+def parse_operand(op: Op, operand: str) -> Operand:
+    """Typed operand from its text in assembly source"""
+    if op is Op.CONST:
+        if operand in NAMED_LITERALS:
+            return NamedConst(operand)
+        if re.match("-?[0-9]+", operand):
+            return IntConst(int(operand))
+        if re.match('["][^"]*["]', operand):
+            return StrConst.from_literal(operand)
+        log.error("Could not type operand '%s'", operand)
+        return NamedConst(operand)
+    if op is Op.CALL or op is Op.LOAD_FIELD or op is Op.STORE_FIELD:
+        class_name, member = operand.split(":")
+        return MemberRef(class_name, member)
+    if op is Op.RETURN or op is Op.ALLOC or op is Op.ROLL:
+        return int(operand)
+    return operand
+
+
+def parse(lines: List[str]) -> List[IRItem]:
+    """Parse assembly source into IR items"""
+    items: List[IRItem] = []
     for line in lines:
         line = strip_comments(line)
         if not line:
@@ -565,55 +780,48 @@ def translate(lines: List[str]) -> ObjectCode:
         if match:
             class_name = match.groupdict()["class_name"]
             superclass_name = match.groupdict()["super_name"]
-            code.declare_class(class_name, superclass_name)
+            items.append(ClassDecl(class_name, superclass_name))
+            continue
+
+        # Class interval (.interval pre last)
+        match = INTERVAL_DECL_PAT.match(line)
+        if match:
+            items.append(IntervalDecl(int(match.group("pre")), int(match.group("last"))))
             continue
 
         # Method (.method f forward) to be filled in later
         match = METHOD_DECL_PAT.match(line)
         if match:
             method_name = match.groupdict()["method_name"]
-            code.declare_method(method_name)
+            items.append(MethodDecl(method_name, forward=True))
             continue
 
         # Method (.method) followed immediately by body
         match = METHOD_DEF_PAT.match(line)
         if match:
             method_name = match.groupdict()["method_name"]
-            code.begin_method(method_name)
+            items.append(MethodDecl(method_name))
             continue
 
         # Field declaration, ".field name"
         match = FIELD_DECL_PAT.match(line)
         if match:
             field_name = match.groupdict()["field_name"]
-            code.declare_field(field_name)
+            items.append(FieldDecl(field_name))
             continue
 
         # Local variable declaration, ".local name,name,name"
         match = LOCALS_DECL_PAT.match(line)
         if match:
             locals_name_list = match.groupdict()["local_var_name"]
-            method_locals = locals_name_list.split(",")
-            n_locals = len(method_locals)
-            # Allocate space on stack for local variables
-            code.add_instruction(Instruction(
-                label=None,
-                operation=INSTRS["alloc"],
-                operand=n_locals))
-            # Now set up locals symbol table information
-            code.declare_locals(method_locals)
+            items.append(LocalsDecl(tuple(locals_name_list.split(","))))
             continue
 
-        # Local variable declaration, ".local name,name,name"
+        # Method arguments, ".args name,name,name"
         match = ARGS_DECL_PAT.match(line)
         if match:
-            locals_name_list = match.groupdict()["arg_var_name"]
-            args = locals_name_list.split(",")
-            # No space allocation needed, unlike local variables,
-            # because these are *before* (at negative offsets from)
-            # the frame pointer.
-            # Set up locals symbol table information
-            code.declare_args(args)
+            args_name_list = match.groupdict()["arg_var_name"]
+            items.append(ArgsDecl(tuple(args_name_list.split(","))))
             continue
 
         # An operation (label: operation operand)
@@ -621,27 +829,68 @@ def translate(lines: List[str]) -> ObjectCode:
         if match:
             parts = match.groupdict()
             label = parts["label"]
-            opname = parts["opname"]
+            op = Op[parts["opname"].upper()]
             operand = parts["operand"]
-            instruction = Instruction(label, INSTRS[opname], operand)
-            code.add_instruction(instruction)
+            if label:
+                items.append(Label(label))
+            if operand is not None:
+                operand = parse_operand(op, operand)
+            items.append(Instr(op, operand))
             continue
 
         # A label with no instruction
-        # An operation (label: operation operand)
         match = LABEL_PAT.match(line)
         if not match:
-            log.error(f"NO MATCH on '{line}'")
+            log.error("NO MATCH on '%s'", line)
             continue
         parts = match.groupdict()
-        label = parts["label"]
-        code.add_label(label)
+        items.append(Label(parts["label"]))
 
+    return items
+
+
+def translate_ir(items: List[IRItem]) -> ObjectCode:
+    code = ObjectCode()
+    for item in items:
+        # Instructions first; they are by far the most common item
+        if isinstance(item, Instr):
+            code.add_instruction(item)
+        elif isinstance(item, Label):
+            code.add_label(item.name)
+        elif isinstance(item, MethodDecl):
+            if item.forward:
+                # Method to be filled in later
+                code.declare_method(item.name)
+            else:
+                # Method followed immediately by body
+                code.begin_method(item.name)
+        elif isinstance(item, LocalsDecl):
+            # Allocate space on stack for local variables
+            code.add_instruction(Instr(Op.ALLOC, len(item.names)))
+            # Now set up locals symbol table information
+            code.declare_locals(list(item.names))
+        elif isinstance(item, ArgsDecl):
+            # No space allocation needed, unlike local variables,
+            # because these are *before* (at negative offsets from)
+            # the frame pointer.
+            code.declare_args(list(item.names))
+        elif isinstance(item, FieldDecl):
+            code.declare_field(item.name)
+        elif isinstance(item, ClassDecl):
+            code.declare_class(item.class_name, item.super_name)
+        elif isinstance(item, IntervalDecl):
+            code.declare_interval(item.pre, item.last)
+        else:
+            log.error("Unknown IR item %r", item)
 
     code.resolve_jumps()  # Of the last method entered
     return code
 
 
+def translate(lines: List[str]) -> ObjectCode:
+    return translate_ir(parse(lines))
+
+
 def main():
     """Assemble one file into object code in json format"""
     args = cli()
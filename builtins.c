@@ -4,6 +4,7 @@
  * */ #include <stdio.h>
 #include <stdlib.h>  /* Malloc lives here   */
 #include <string.h>  /* For strcpy */
+#include <limits.h>  /* INT_MAX */
 
 #include "builtins.h"
 #include "vm_core.h"
@@ -180,11 +181,18 @@ vm_Word method_Obj_equals[] = {
 };
 
 
-/* The Obj Class (a singleton) */
+/* The Obj Class (a singleton)
+ * The builtin classes are numbered as the compiler numbers them
+ * (number_classes in main/class_hierarchy.py):  Obj 0, Int 1,
+ * String 2, Nothing 3, Boolean 4.  Compiled classes bring their
+ * intervals in their object files.
+ */
 struct  class_struct  the_class_Obj_struct = {
         .header = {.class_name ="Obj",
                    .healthy_class_tag = HEALTHY,
                    .super = 0,
+                   .pre = 0,
+                   .last = INT_MAX,  // Every class is a subclass of Obj
                    .n_fields = 0,
                    .object_size = sizeof(struct obj_Obj_struct) },
         .vtable =
@@ -443,7 +451,8 @@ struct  class_struct  the_class_String_struct = {
                    .healthy_class_tag = HEALTHY,
                    .n_fields = 0,
                    .object_size = sizeof(struct obj_String_struct),
-                   .super=the_class_Obj},
+                   .super=the_class_Obj,
+                   .pre = 2, .last = 2},
         method_String_constructor,     /* Constructor */
         method_String_string,
         method_String_print,
@@ -588,6 +597,7 @@ struct  class_struct  the_class_Boolean_struct = {
         .header = {.class_name = "Boolean",
                    .healthy_class_tag = HEALTHY,
                    .super = the_class_Obj,
+                   .pre = 4, .last = 4,
                    .n_fields = 0,
                    .object_size = sizeof (struct obj_Boolean_struct) },
         .vtable =
@@ -675,6 +685,7 @@ struct  class_struct  the_class_Nothing_struct = {
                 .class_name = "Nothing",
                 .healthy_class_tag = HEALTHY,
                 .super = the_class_Obj,
+                .pre = 3, .last = 3,
                 .n_fields = 0,
                 .object_size = sizeof (struct class_Nothing_struct) },
         .vtable =
@@ -977,6 +988,7 @@ struct  class_struct  the_class_Int_struct = {
                 .class_name = "Int",
                 .healthy_class_tag = HEALTHY,
                 .super = the_class_Obj,
+                .pre = 1, .last = 1,
                 .n_fields = 0,
                 .object_size = sizeof(struct obj_Int_struct),
         },
@@ -15,7 +15,8 @@ int main(int argc, char *argv[]) {
     char load_path[PATHBUFSIZE];
     int ok = 1;
     char *load_library = "./OBJ";
-    while ((opt = getopt(argc, argv, ":DL:")) != -1) {
+    int count_steps = 0;
+    while ((opt = getopt(argc, argv, ":DSL:")) != -1) {
         switch (opt) {
             case 'L':
                 load_library = optarg;
@@ -26,6 +27,9 @@ int main(int argc, char *argv[]) {
                 set_log_level(DEBUG);
                 vm_logging = DEBUG;
                 break;
+            case 'S':
+                count_steps = 1;
+                break;
             case ':':
                 fprintf(stderr, "Option %s requires a value\n", optarg);
                 ok = 0;
@@ -51,6 +55,9 @@ int main(int argc, char *argv[]) {
         log_info("Executing %s\n", main_class);
         vm_run();
         log_info("Ran");
+        if (count_steps) {
+            fprintf(stderr, "\nExecuted %ld instructions\n", vm_steps);
+        }
     } else {
         fprintf(stderr, "Errors, will not run\n");
     }
@@ -1,25 +1,45 @@
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, Union
+import collections
+import logging
+import pathlib
+import sys
+
+# assemble.py lives at the repository root, one level above this directory
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+from assemble import (Op, Instr, Label, ClassDecl, IntervalDecl, FieldDecl, MethodDecl, ArgsDecl, LocalsDecl,
+                      MemberRef, IntConst, StrConst, NamedConst, IRItem)
 
 import class_hierarchy
 import dependency_graph
+import tracing
+from tracing import PARSE, INIT_CHECK, TYPE_INFER, CODEGEN, HIERARCHY
+from traversal import run, walk
 
 ch: class_hierarchy.RootObjClass
 
 class ASTNode:
-    """Abstract base class"""
+    """Abstract base class.
+    The passes (r_eval, l_eval, c_eval, type_eval and init_check) of nodes with
+    children are generators that yield the passes of their children, so that deep
+    trees need no deep recursion; start them with traversal.run (see traversal.py).
+    """
+    __slots__ = ('children',)
+
     def __init__(self) -> None:
         self.children: List[ASTNode] = []
 
-    def r_eval(self, local_var_dict: Dict[str, str]) -> Optional[List[str]]:
+    def r_eval(self, local_var_dict: Dict[str, str], out: "Emitter") -> None:
         """Evaluate for value"""
         raise NotImplementedError(f"r_eval not implemented for node type {self.__class__.__name__}")
 
-    def l_eval(self) -> Optional[List[str]]:
+    def l_eval(self, local_var_dict: Dict[str, str], out: "Emitter") -> None:
         """Evaluate for value"""
         raise NotImplementedError(f"r_eval not implemented for node type {self.__class__.__name__}")
 
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]) -> Optional[List[str]]:
-        raise NotImplementedError(f"c_eval not implemented for node type {self.__class__.__name__}")
+    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str], out: "Emitter") -> None:
+        # By default, evaluate for value and branch on it
+        yield self.r_eval(local_var_dict, out)
+        out.emit(Instr(Op.JUMP_IF, true_branch), Instr(Op.JUMP, false_branch))
 
     def type_eval(self, local_var_dict: Dict[str, str]) -> Optional[str]:
         raise NotImplementedError(f"type_eval not implemented for node type {self.__class__.__name__}")
@@ -37,22 +57,25 @@ def new_label(prefix: str) -> str:
     LAB_COUNT += 1
     return f"{prefix}_{LAB_COUNT}"
 
-def pretty_helper(node: ASTNode, level: int, indent_str: str) -> List[str]:
-    print(node)
-    # print(node.children)
-    if len(node.children) == 0:
-        return [indent_str*level, node.pretty_label(), '\n']
-
-    l = [indent_str*level, node.pretty_label(), '\n']
-    # print(l)
-    for n in node.children:
-        if n:
-            l += pretty_helper(n, level+1, indent_str)
+def reset_labels() -> None:
+    """Number labels from 1 again, so each program's code is the same however many came before it"""
+    global LAB_COUNT
+    LAB_COUNT = 0
 
+def pretty_helper(node: ASTNode, level: int, indent_str: str) -> List[str]:
+    l = []
+    stack = [(node, level)]
+    while stack:
+        node, level = stack.pop()
+        l += [indent_str*level, node.pretty_label(), '\n']
+        stack.extend((child, level+1) for child in reversed(node.children) if child)
     return l
 
+def pretty_format(RootNode: ASTNode) -> str:
+    return ''.join(pretty_helper(RootNode, 0, '  '))
+
 def pretty_print(RootNode: ASTNode) -> None:
-    print(''.join(pretty_helper(RootNode, 0, '  ')))
+    print(pretty_format(RootNode))
 
 def populate_local_var_dict_with_initialized_vars(local_var_dict: Dict[str, str], local_var_list: List[str]):
     for initialized_var in local_var_list:
@@ -61,21 +84,180 @@ def populate_local_var_dict_with_initialized_vars(local_var_dict: Dict[str, str]
             local_var_dict[initialized_var] = None
 
 
+def merge_scope_vars(local_var_list: List[Any], scope_var_list: List[Any], present: Set[Any]):
+    """Add the variables initialized in the scope of an if or else block to local_var_list.
+    Variables from TypeCaseVarAssignment are added as they are, others in ('OTHERSCOPE', name) form.
+    present is the set of items of local_var_list; items already in it are not added again,
+    so long else-if and typecase chains do not pile up copies of the same entries.
+    """
+    for i in scope_var_list:
+        if isinstance(i, tuple) and i[0] == 'TYPECASE':
+            entry = i
+        elif i in present:
+            continue
+        else:
+            # If it's already a tuple get the value
+            entry = ('OTHERSCOPE', i[1] if isinstance(i, tuple) else i)
+        if entry not in present:
+            local_var_list.append(entry)
+            present.add(entry)
+
+
+def referenced_variables(statement: ASTNode) -> Tuple[Set[str], Set[str]]:
+    """Names of the variables (including this.x fields) a statement reads
+    and assigns anywhere inside it.  Assigned variables are also read, as an
+    assignment joins its type with the variable's previous type.
+    """
+    reads: Set[str] = set()
+    writes: Set[str] = set()
+    for node in walk(statement):
+        if isinstance(node, (VarReferenceNode, TypeCaseVarReferenceNode, ThisReferenceLexpNode)):
+            reads.add(node.get_value())
+        elif isinstance(node, AssignmentNode):
+            lexp = node.children[0]
+            if isinstance(lexp, (VarReferenceNode, TypeCaseVarReferenceNode, ThisReferenceLexpNode)):
+                writes.add(lexp.get_value())
+    return reads, writes
+
+def referenced_classes(node: ASTNode) -> Set[str]:
+    """Names of the classes a node and the nodes inside it name: constructor calls,
+    declared variable types and typecase alternatives"""
+    classes: Set[str] = set()
+    for node in walk(node):
+        if isinstance(node, ConstructorCall):
+            classes.add(node.caller_name)
+        elif isinstance(node, AssignmentNode) and node.var_type:
+            classes.add(node.var_type)
+        elif isinstance(node, IsInstanceNode):
+            classes.add(node.target_class)
+        elif isinstance(node, TypeCaseVarReferenceNode):
+            classes.add(node.forced_type)
+    return classes
+
+
+def order_classes(class_list: List[ASTNode]) -> List[ASTNode]:
+    """Order class nodes so that each class comes after its superclass and after
+    the classes its constructor needs (parameter types and classes named in its
+    body), keeping the source order otherwise. Methods are checked after every
+    class is declared, so they may use classes in any order.
+    """
+    index_of: Dict[str, int] = {}
+    for index, class_node in enumerate(class_list):
+        index_of.setdefault(class_node.children[0].class_name, index)
+
+    graph = dependency_graph.Dependency_Graph()
+    for index, class_node in enumerate(class_list):
+        class_signature, constructor_statement_block, _ = class_node.children
+        graph.addVertex(index)
+        dependencies = {class_signature.super_class, *class_signature.children[0].arg_types}
+        dependencies |= referenced_classes(constructor_statement_block)
+        for dependency in dependencies:
+            # Builtin and undefined classes are left for the type checker
+            dependency_index = index_of.get(dependency)
+            if dependency_index is not None and dependency_index != index:
+                graph.addEdge(dependency_index, index)
+    try:
+        order = graph.topologicalSort()
+    except dependency_graph.CycleError as e:
+        cycle = ' -> '.join(class_list[index].children[0].class_name for index in e.cycle)
+        raise TypeError(f'Classes depend on each other in a cycle: {cycle}') from None
+    PARSE.debug('Class order: %s', [class_list[index].children[0].class_name for index in order])
+    return [class_list[index] for index in order]
+
+# Marks a variable that is not in the dict at all
+_ABSENT = object()
+
+def infer_block_types(statements: List[ASTNode], local_var_dict: Dict[str, str], description: str) -> List[Optional[str]]:
+    """Type evaluate a block of statements until the variable types in local_var_dict stop changing.
+    The first pass evaluates every statement in order. After that, a statement is evaluated again
+    only when a variable it reads changed type, instead of re-checking the whole block.
+    Returns what each statement's type_eval returned in its last (final) evaluation.
+    """
+    readers: Dict[str, List[int]] = {}
+    watched_keys: List[List[Any]] = []
+    for index, statement in enumerate(statements):
+        reads, writes = referenced_variables(statement)
+        for name in reads:
+            readers.setdefault(name, []).append(index)
+        # Variables scoped to an if or while show up in the dict in tuple form as well
+        watched_keys.append([key for name in writes for key in (name, ('OTHERSCOPE', name), ('TYPECASE', name))])
+
+    results: List[Optional[str]] = [None] * len(statements)
+    worklist = collections.deque(range(len(statements)))
+    queued = [True] * len(statements)
+    evaluations = 0
+    while worklist:
+        index = worklist.popleft()
+        queued[index] = False
+        keys = watched_keys[index]
+        before = [local_var_dict.get(key, _ABSENT) for key in keys]
+        size_before = len(local_var_dict)
+        results[index] = run(statements[index].type_eval(local_var_dict))
+        evaluations += 1
+
+        changed = [key for key, old in zip(keys, before) if local_var_dict.get(key, _ABSENT) != old]
+        added = sum(1 for old in before if old is _ABSENT) - sum(1 for key in keys if local_var_dict.get(key, _ABSENT) is _ABSENT)
+        if len(local_var_dict) - size_before != added:
+            # The statement added variables it does not assign; assume anything may have changed
+            changed = list(readers)
+        for key in changed:
+            name = key[1] if isinstance(key, tuple) else key
+            for reader in readers.get(name, ()):
+                if not queued[reader]:
+                    queued[reader] = True
+                    worklist.append(reader)
+
+    TYPE_INFER.info('%s: types settled after %d statement evaluations for %d statements', description, evaluations, len(statements))
+    TYPE_INFER.debug('%s', local_var_dict)
+    return results
+
+def join_return_types(statements: List[ASTNode], statement_types: List[Optional[str]]) -> Optional[str]:
+    """What a statement block may return: the LCA of the types its return, if and while statements
+    (and the blocks typecases become) may return"""
+    final_ret_type = None
+    for statement, cur_ret_type in zip(statements, statement_types):
+        if isinstance(statement, (IfNode, WhileNode, ReturnStatementNode, StatementBlockNode)):
+            if not final_ret_type: # If no return type was previously assigned...
+                final_ret_type = cur_ret_type
+            elif not cur_ret_type: # If the current line doesn't return anything continue
+                continue
+            else: # Otherwise, assign the LCA
+                final_ret_type = ch.find_LCA(cur_ret_type, final_ret_type)
+    return final_ret_type
+
+
+class Emitter:
+    """Code of one method (or for a class, of all its methods).
+    r_eval, c_eval and l_eval append to the buffer of the method being
+    generated instead of returning lists for their parent to concatenate,
+    so code generation is linear in the size of the method.
+    """
+    def __init__(self, num_arguments: int = 0) -> None:
+        self.code: List[IRItem] = []
+        # Return statements pop the method's arguments
+        self.num_arguments = num_arguments
+
+    def emit(self, *items: IRItem) -> None:
+        self.code.extend(items)
+
+
 class RootNode(ASTNode):
     """Sequence of statements"""
+    __slots__ = ()
+
     def __init__(self, program: ASTNode):
         super().__init__()
         self.children.append(program)
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         """Evaluate for value"""
         program = self.children[0]
-        return program.r_eval(local_var_dict)
+        yield program.r_eval(local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         """Evaluate for value"""
         program = self.children[0]
-        return program.type_eval(local_var_dict)
+        return (yield program.type_eval(local_var_dict))
 
     def pretty_label(self) -> str:
         return "RootNode"
@@ -83,6 +265,8 @@ class RootNode(ASTNode):
 
 class IfNode(ASTNode):
     """if cond then block else block"""
+    __slots__ = ('thenscope_local_var_list', 'elsescope_local_var_list')
+
     def __init__(self, condpart: ASTNode, thenpart: ASTNode, elsepart: ASTNode) -> None:
         super().__init__()
         self.children.append(condpart)
@@ -90,35 +274,29 @@ class IfNode(ASTNode):
         if elsepart:
             self.children.append(elsepart)
 
-        # Type checking will populate this
-        self.thenscope_local_var_dict = None
-        self.elsescope_local_var_dict = None
-
-        # Initialization check will populate this
+        # Initialization check will populate these with the variables each block
+        # initializes, beyond those of the enclosing scope
         self.thenscope_local_var_list = None
         self.elsescope_local_var_list = None
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         """Evaluate for value"""
         if len(self.children) == 2:
             condpart, thenpart = self.children
-            elsepart = []
+            elsepart = None
         else:
             condpart, thenpart, elsepart = self.children
 
         then_label = new_label("then")
         else_label = new_label("else")
         endif_label = new_label("endif")
-        iftest = condpart.c_eval(then_label, else_label, local_var_dict)
-        thenblock = thenpart.r_eval(local_var_dict)
-        elseblock = elsepart.r_eval(local_var_dict) if elsepart else []
-        return (iftest
-                + [then_label + ":"]
-                + thenblock
-                + [f"\tjump {endif_label}"]
-                + [else_label + ":"]
-                + elseblock
-                + [endif_label + ":"])
+        yield condpart.c_eval(then_label, else_label, local_var_dict, out)
+        out.emit(Label(then_label))
+        yield thenpart.r_eval(local_var_dict, out)
+        out.emit(Instr(Op.JUMP, endif_label), Label(else_label))
+        if elsepart:
+            yield elsepart.r_eval(local_var_dict, out)
+        out.emit(Label(endif_label))
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         # KEY THING FOR IFNODE in constructors:
@@ -138,7 +316,7 @@ class IfNode(ASTNode):
             var_dict_after_if = local_var_dict.copy()
             populate_local_var_dict_with_initialized_vars(var_dict_after_if, self.thenscope_local_var_list)
 
-            final_ret_type = thenpart.type_eval(var_dict_after_if)
+            final_ret_type = (yield thenpart.type_eval(var_dict_after_if))
 
             # Update local_var_dict - (only need to update item types. Since single if can't add new variables, the only thing that happens is taking the LCA of variables that was previously declared. var_dict never loses or adds items here)
             for new_item in var_dict_after_if:
@@ -153,7 +331,7 @@ class IfNode(ASTNode):
 
             var_dict_after_then = local_var_dict.copy()
             populate_local_var_dict_with_initialized_vars(var_dict_after_then, self.thenscope_local_var_list)
-            thenpart_ret_type = thenpart.type_eval(var_dict_after_then)
+            thenpart_ret_type = (yield thenpart.type_eval(var_dict_after_then))
 
             # Update return type of the statement bloc
             # final_ret_type = ch.find_LCA(final_ret_type, thenpart_ret_type) if thenpart_ret_type else pass
@@ -165,7 +343,7 @@ class IfNode(ASTNode):
 
             var_dict_after_else = local_var_dict.copy()
             populate_local_var_dict_with_initialized_vars(var_dict_after_else, self.elsescope_local_var_list)
-            elsepart_ret_type = elsepart.type_eval(var_dict_after_else)
+            elsepart_ret_type = (yield elsepart.type_eval(var_dict_after_else))
 
             # Update return type of the statement bloc
             # final_ret_type = ch.find_LCA(final_ret_type, elsepart_ret_type) if final_ret_type else elsepart_ret_type
@@ -187,7 +365,7 @@ class IfNode(ASTNode):
                 local_var_dict[new_item] = new_dict[new_item]
 
         # Make sure that the condpart actually evaluates to a Boolean
-        if condpart.type_eval(local_var_dict) != "Boolean":
+        if (yield condpart.type_eval(local_var_dict)) != "Boolean":
             raise TypeError("If statement expects the condition to return a Boolean")
 
         return final_ret_type
@@ -196,68 +374,42 @@ class IfNode(ASTNode):
 
         if len(self.children) == 2:
             condpart, thenpart = self.children
-            condpart.init_check(local_var_list, in_constructor)
+            yield condpart.init_check(local_var_list, in_constructor)
             # condpart has no initialization
 
             var_list_before_if = local_var_list
             var_list_after_if = local_var_list.copy()
-            thenpart.init_check(var_list_after_if, in_constructor)
+            yield thenpart.init_check(var_list_after_if, in_constructor)
 
-            # Take care of typecase - variables from TypeCaseVarAssignment will be added to local_var_list
-            for i in var_list_after_if:
-                if isinstance(i, tuple) and i[0] == 'TYPECASE':
-                    local_var_list.append(i)
-                    continue
-                # Take care of variable that are defined within the if/else block scope
-                if i not in local_var_list:
-                    # If it's already a tuple get the value
-                    if isinstance(i, tuple):
-                        i = i[1]
-                    local_var_list.append(('OTHERSCOPE', i))
+            # Blocks only append to the copy, so what they added follows the enclosing scope's variables
+            self.thenscope_local_var_list = var_list_after_if[len(local_var_list):]
 
-            self.thenscope_local_var_list = var_list_after_if
+            merge_scope_vars(local_var_list, var_list_after_if, set(local_var_list))
 
         else:
             condpart, thenpart, elsepart = self.children
-            condpart.init_check(local_var_list, in_constructor)
+            yield condpart.init_check(local_var_list, in_constructor)
 
             var_list_before_if = local_var_list
 
             var_list_after_then = local_var_list.copy()
-            thenpart_ret_type = thenpart.init_check(var_list_after_then, in_constructor)
+            thenpart_ret_type = (yield thenpart.init_check(var_list_after_then, in_constructor))
 
             var_list_after_else = local_var_list.copy()
-            elsepart_ret_type = elsepart.init_check(var_list_after_else, in_constructor)
+            elsepart_ret_type = (yield elsepart.init_check(var_list_after_else, in_constructor))
+
+            self.thenscope_local_var_list = var_list_after_then[len(local_var_list):]
+            self.elsescope_local_var_list = var_list_after_else[len(local_var_list):]
 
             # local_var_list doesn't lose values
+            present = set(local_var_list)
             for i in list(set(var_list_after_then) & set(var_list_after_else)):
-                if i not in local_var_list:
+                if i not in present:
                     local_var_list.append(i)
+                    present.add(i)
 
-            # Take care of typecase - variables from TypeCaseVarAssignment will be added to local_var_list
-            for i in var_list_after_then:
-                if isinstance(i, tuple) and i[0] == 'TYPECASE':
-                    local_var_list.append(i)
-                    continue
-                # Take care of variable that are defined within the if/else block scope
-                if i not in local_var_list:
-                    # If it's already a tuple get the value
-                    if isinstance(i, tuple):
-                        i = i[1]
-                    local_var_list.append(('OTHERSCOPE', i))
-            for i in var_list_after_else:
-                if isinstance(i, tuple) and i[0] == 'TYPECASE':
-                    local_var_list.append(i)
-                    continue
-                # Take care of variable that are defined within the if/else block scope
-                if i not in local_var_list:
-                    # If it's already a tuple get the value
-                    if isinstance(i, tuple):
-                        i = i[1]
-                    local_var_list.append(('OTHERSCOPE', i))
-
-            self.thenscope_local_var_list = var_list_after_then
-            self.elsescope_local_var_list = var_list_after_else
+            merge_scope_vars(local_var_list, var_list_after_then, present)
+            merge_scope_vars(local_var_list, var_list_after_else, present)
 
         return None
 
@@ -271,33 +423,29 @@ class IfNode(ASTNode):
 
 class WhileNode(ASTNode):
     """if cond then block else block"""
+    __slots__ = ('whilescope_local_var_list',)
+
     def __init__(self, condpart: ASTNode, statementblock: ASTNode):
         super().__init__()
         self.children.append(condpart)
         self.children.append(statementblock)
 
-        # Type checking will populate this
-        self.whilescope_local_var_dict = None
-
-        # Initialization check will populate this
+        # Initialization check will populate this with the variables the loop body
+        # initializes, beyond those of the enclosing scope
         self.whilescope_local_var_list = None
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         """Evaluate for value"""
         condpart, statementblock = self.children
         loophead = new_label("loop_head")
         looptest = new_label("loop_test")
         nextStmt = new_label("done")
 
-        block = statementblock.r_eval(local_var_dict)
-
-        whiletest = condpart.c_eval(loophead, nextStmt, local_var_dict)
-        return ([f'jump {looptest}']
-                + [loophead + ":"]
-                + block
-                + [looptest + ":"]
-                + whiletest
-                + [nextStmt + ":"])
+        out.emit(Instr(Op.JUMP, looptest), Label(loophead))
+        yield statementblock.r_eval(local_var_dict, out)
+        out.emit(Label(looptest))
+        yield condpart.c_eval(loophead, nextStmt, local_var_dict, out)
+        out.emit(Label(nextStmt))
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         condpart, statementblock = self.children
@@ -306,14 +454,14 @@ class WhileNode(ASTNode):
         # Pass in a copy of local_var_dict to type eval because new variables in while are to be ignored after the loop
         var_dict_after_block = local_var_dict.copy()
         populate_local_var_dict_with_initialized_vars(var_dict_after_block, self.whilescope_local_var_list)
-        statementblock_ret_type = statementblock.type_eval(var_dict_after_block)
+        statementblock_ret_type = (yield statementblock.type_eval(var_dict_after_block))
 
         # Update local_var_dict - (only need to update item types. Since while can't add new variables, the only thing that happens is taking the LCA of variables that was previously declared. var_dict never loses or adds items here)
         for new_item in var_dict_after_block:
             if new_item in var_dict_before_block:
                 local_var_dict[new_item] = ch.find_LCA(var_dict_after_block[new_item], var_dict_before_block[new_item])
 
-        if condpart.type_eval(local_var_dict) != "Boolean":
+        if (yield condpart.type_eval(local_var_dict)) != "Boolean":
             raise TypeError("If statement expects the condition to return a Boolean")
 
         return statementblock_ret_type
@@ -324,7 +472,8 @@ class WhileNode(ASTNode):
 
         # Pass in a copy of local_var_list to type eval because new variables in while are to be ignored after the loop
         var_list_after_block = local_var_list.copy()
-        statementblock_ret_type = statementblock.init_check(var_list_after_block, in_constructor)
+        statementblock_ret_type = (yield statementblock.init_check(var_list_after_block, in_constructor))
+        self.whilescope_local_var_list = var_list_after_block[len(local_var_list):]
 
         # If there's a variable that's only defined in the while scope - save it so that we can allocate memory for it
         for variable in var_list_after_block:
@@ -334,8 +483,6 @@ class WhileNode(ASTNode):
                     variable = variable[1]
                 local_var_list.append(('OTHERSCOPE', variable))
 
-        self.whilescope_local_var_list = var_list_after_block
-
         # # While can't define any new class fields in the constructor
         # if in_constructor:
         #     if set([item for item in var_dict_before_block if item.startswith('this.')]) != set([item for item in var_dict_after_block if item.startswith('this.')]):
@@ -351,6 +498,8 @@ class WhileNode(ASTNode):
 
 class MethodcallNode(ASTNode):
     """Method call node"""
+    __slots__ = ('m_name', 'caller_type')
+
     def __init__(self, caller: ASTNode, m_name: str, methodargs: ASTNode):
         super().__init__()
         self.children.append(caller)
@@ -360,44 +509,33 @@ class MethodcallNode(ASTNode):
         # Type checking will check the caller type - can be a superclass
         self.caller_type = None
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         caller, methodargs = self.children
-        methodargs_r_eval = methodargs.r_eval(local_var_dict) if methodargs else []
-        caller_type = self.caller_type
-        return (methodargs_r_eval
-                + caller.r_eval(local_var_dict)
-                + [f'\tcall {caller_type}:{self.m_name}'])
+        if methodargs:
+            yield methodargs.r_eval(local_var_dict, out)
+        yield caller.r_eval(local_var_dict, out)
+        out.emit(Instr(Op.CALL, MemberRef(self.caller_type, self.m_name)))
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         caller, methodargs = self.children
-        caller_type = caller.type_eval(local_var_dict)
+        caller_type = (yield caller.type_eval(local_var_dict))
 
         # print(caller.r_eval())
         # print('In methodcall type eval')
         quackClassEntry = ch.find_class(caller_type)
 
-        # Make sure this function exists
-        quackFunctionEntry = [entry for entry in quackClassEntry.methods_list if entry.method_name == self.m_name]
-        # Check its superclass in order, if its not defined in this class
-        if not quackFunctionEntry:
-            method_found_in_a_superclass = False
-            # path to subclass reversed, but itself
+        # Make sure this function exists, in this class or inherited from a super class
+        method_entry = quackClassEntry.find_method(self.m_name)
+        if not method_entry:
             super_class_chain = ch.get_path_to_subclass(caller_type)[-2::-1]
-            for super_class in super_class_chain:
-                quackFunctionEntry = [entry for entry in ch.find_class(super_class).methods_list if entry.method_name == self.m_name]
-                if quackFunctionEntry: # If the function is found in a super class edit the caller type
-                    method_found_in_a_superclass = True
-                    caller_type = super_class
-                    break
-
-            if not method_found_in_a_superclass:
-                raise NotImplementedError(f'Function {self.m_name} for {caller_type} is not defined or by any of its super classes {super_class_chain}')
-
-        quackFunction = quackFunctionEntry[0]
+            raise NotImplementedError(f'Function {self.m_name} for {caller_type} is not defined or by any of its super classes {super_class_chain}')
+        # The call is checked (and generated) against the class that defines the method
+        caller_type = method_entry.defined_in
+        quackFunction = method_entry.method
 
 
         # Make sure that the arguments are the right type. If there are no arguments, make sure that the funtion is supposed to take no parameters
-        args_types = methodargs.type_eval(local_var_dict) if methodargs else []
+        args_types = (yield methodargs.type_eval(local_var_dict)) if methodargs else []
         ch.is_legal_invocation(caller_type, self.m_name, args_types)
         self.caller_type = caller_type
 
@@ -407,31 +545,29 @@ class MethodcallNode(ASTNode):
         caller, methodargs = self.children
 
         # methodargs doesn't need any init check
-        caller.init_check(local_var_list, in_constructor)
+        yield caller.init_check(local_var_list, in_constructor)
         return None
 
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]) -> List[str]:
-        bool_code = self.r_eval(local_var_dict)
-        return bool_code + [f"\tjump_if {true_branch}", f"\tjump {false_branch}"]
-
     def pretty_label(self) -> str:
         return f"MethodcallNode: {self.m_name}"
 
 
 class StatementNode(ASTNode):
     """Statement node"""
+    __slots__ = ()
+
     def __init__(self, statement: ASTNode):
         super().__init__()
         self.children.append(statement)
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        return self.children[0].r_eval(local_var_dict)
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        yield self.children[0].r_eval(local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
-        return self.children[0].type_eval(local_var_dict)
+        return (yield self.children[0].type_eval(local_var_dict))
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
-        self.children[0].init_check(local_var_list, in_constructor);
+        yield self.children[0].init_check(local_var_list, in_constructor);
         return None
 
     # def get_field_variables(self, field_var_dict: Dict[str, str], temp_local_var_dict: Dict[str, str]):
@@ -444,21 +580,23 @@ class StatementNode(ASTNode):
 
 class ReturnStatementNode(ASTNode):
     """Return Statement node"""
+    __slots__ = ()
+
     def __init__(self, statement: ASTNode):
         super().__init__()
         self.children.append(statement)
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        # Add the return line but delagate filling this to the ClassMethodNode
-        return self.children[0].r_eval(local_var_dict) + ['\treturn TOFILL']
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        yield self.children[0].r_eval(local_var_dict, out)
+        out.emit(Instr(Op.RETURN, out.num_arguments))
 
     def type_eval(self, local_var_dict: Dict[str, str]):
-        return self.children[0].type_eval(local_var_dict)
+        return (yield self.children[0].type_eval(local_var_dict))
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         if in_constructor:
             raise SyntaxError("Can't call return inside the constructor statement block")
-        self.children[0].init_check(local_var_list, in_constructor)
+        yield self.children[0].init_check(local_var_list, in_constructor)
         return None
 
 
@@ -472,32 +610,31 @@ class ReturnStatementNode(ASTNode):
 
 class StatementBlockNode(ASTNode):
     """Statement node"""
+    __slots__ = ()
+
     def __init__(self, statement_block: List[ASTNode]):
         super().__init__()
         self.children += statement_block
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        return [subitem for statement in self.children for subitem in statement.r_eval(local_var_dict)]
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        for statement in self.children:
+            yield statement.r_eval(local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
-        final_ret_type = None
-
         # For each statement, run a type check. If it has a potential to have a return statement - i.e. ifstmt, whilestmt or a return statement update final_ret_type
+        statement_types = []
         for statement in self.children:
-            cur_ret_type = statement.type_eval(local_var_dict)
-            if isinstance(statement, IfNode) or isinstance(statement, WhileNode) or isinstance(statement, ReturnStatementNode):
-                if not final_ret_type: # If no return type was previously assigned...
-                    final_ret_type = cur_ret_type
-                elif not cur_ret_type: # If the current line doesn't return anything continue
-                    continue
-                else: # Otherwise, assign the LCA
-                    final_ret_type = ch.find_LCA(cur_ret_type, final_ret_type)
+            statement_types.append((yield statement.type_eval(local_var_dict)))
+        return join_return_types(self.children, statement_types)
 
-        return final_ret_type
+    def infer_types(self, local_var_dict: Dict[str, str], description: str):
+        """type_eval for a method body: check until the variable types settle"""
+        statement_types = infer_block_types(self.children, local_var_dict, description)
+        return join_return_types(self.children, statement_types)
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         for statement in self.children:
-            cur_ret_type = statement.init_check(local_var_list, in_constructor)
+            cur_ret_type = (yield statement.init_check(local_var_list, in_constructor))
         return None
 
     def pretty_label(self) -> str:
@@ -506,6 +643,8 @@ class StatementBlockNode(ASTNode):
 
 class ClassNode(ASTNode):
     """Class Node"""
+    __slots__ = ('constructor_scope_local_var_dict', 'method_scope_local_var_dict', 'constructor_scope_local_var_list', 'method_scope_local_var_list')
+
     def __init__(self, class_signature: ASTNode, constructor_statement_block: ASTNode, method_block: ASTNode):
         super().__init__()
         self.children.append(class_signature)
@@ -520,21 +659,28 @@ class ClassNode(ASTNode):
         self.constructor_scope_local_var_list = None
         self.method_scope_local_var_list = None
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         class_signature, constructor_statement_block, method_block  = self.children
         # Need to pass the number of arguments in the constructor to generate the correct return statement
-        return (class_signature.r_eval(self.constructor_scope_local_var_dict) +
-                constructor_statement_block.r_eval(self.constructor_scope_local_var_dict, len(class_signature.children[0].arg_names)) +
-                method_block.r_eval(self.method_scope_local_var_dict))
+        constructor = Emitter(len(class_signature.children[0].arg_names))
+        yield class_signature.r_eval(self.constructor_scope_local_var_dict, constructor)
+        yield constructor_statement_block.r_eval(self.constructor_scope_local_var_dict, constructor)
+        out.emit(*constructor.code)
+        yield method_block.r_eval(self.method_scope_local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
+        self.declare(local_var_dict)
+        self.type_eval_methods(local_var_dict)
+
+    def declare(self, local_var_dict: Dict[str, str]):
+        """Check the signature and constructor, and add the class to the class hierarchy"""
         global ch
         class_signature, constructor_statement_block, method_block = self.children
         class_name = class_signature.class_name
         super_class = class_signature.super_class
         class_formal_args = class_signature.children[0]
 
-        class_signature.type_eval(local_var_dict)
+        run(class_signature.type_eval(local_var_dict))
 
         # Populate constructor_scope_local_var_dict with list fetched from init_check
         constructor_scope_local_var_dict = local_var_dict.copy()
@@ -545,27 +691,11 @@ class ClassNode(ASTNode):
             # print('Adding: ', constructor_parameter_name, constructor_parameter_type)
             constructor_scope_local_var_dict[constructor_parameter_name] = constructor_parameter_type
 
-        count = 1
-        print(f'In Class constructor type check iteration number: {count}')
-        constructor_statement_block.type_eval(constructor_scope_local_var_dict)
-        print(constructor_scope_local_var_dict)
-
-        temp_constructor_scope_local_var_dict = constructor_scope_local_var_dict.copy()
-        # Try additional passes through to make sure that variable types don't change
-        while True:
-            count += 1
-            print(f'In Class constructor type check iteration number: {count}')
-            constructor_statement_block.type_eval(constructor_scope_local_var_dict)
-            print(constructor_scope_local_var_dict)
-            if temp_constructor_scope_local_var_dict == constructor_scope_local_var_dict:
-                break
-            else:
-                print(f'Constructor type check additional pass detected type changes. Making another pass. Newly interpreted types {constructor_scope_local_var_dict}')
-                temp_constructor_scope_local_var_dict = constructor_scope_local_var_dict.copy()
+        constructor_statement_block.infer_types(constructor_scope_local_var_dict, f'{class_name} constructor')
 
 
         # Save the variable dictionary for the constructor scope
-        self.constructor_scope_local_var_dict = constructor_scope_local_var_dict.copy()
+        self.constructor_scope_local_var_dict = constructor_scope_local_var_dict
 
 
         field_var_dict = {}
@@ -598,16 +728,22 @@ class ClassNode(ASTNode):
 
         new_class_to_add = class_hierarchy.QuackClass(class_name, super_class, methods_list, field_var_dict)
         ch.add_class_to_hierarchy(new_class_to_add)
-        class_hierarchy.pretty_print(ch)
+        if HIERARCHY.isEnabledFor(logging.DEBUG):
+            HIERARCHY.debug('Added %s\n%s', class_name, class_hierarchy.pretty_format(ch))
+
+    def type_eval_methods(self, local_var_dict: Dict[str, str]):
+        """Check the methods, once every class has been declared"""
+        class_signature, constructor_statement_block, method_block = self.children
+        super_class = class_signature.super_class
 
         # Populate constructor_scope_local_var_dict with list fetched from init_check
         method_scope_local_var_dict = local_var_dict.copy()
         populate_local_var_dict_with_initialized_vars(method_scope_local_var_dict, self.method_scope_local_var_list)
-        # Save the variable dictionary for the method scope
-        self.method_scope_local_var_dict = method_scope_local_var_dict.copy()
+        # Save the variable dictionary for the method scope; each method checks a copy of it
+        self.method_scope_local_var_dict = method_scope_local_var_dict
 
         # Type check the class methods
-        method_block.type_eval(method_scope_local_var_dict, super_class)
+        run(method_block.type_eval(method_scope_local_var_dict, super_class))
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         class_signature, constructor_statement_block, method_block = self.children
@@ -620,8 +756,8 @@ class ClassNode(ASTNode):
 
 
         # class_signature doesn't need a init_check
-        constructor_statement_block.init_check(constructor_statement_block_local_var_list, True)
-        self.constructor_scope_local_var_list = constructor_statement_block_local_var_list.copy()
+        yield constructor_statement_block.init_check(constructor_statement_block_local_var_list, True)
+        self.constructor_scope_local_var_list = constructor_statement_block_local_var_list
 
         method_block_local_var_list = local_var_list.copy()
 
@@ -630,8 +766,8 @@ class ClassNode(ASTNode):
             if item.startswith('this') and item not in method_block_local_var_list:
                 method_block_local_var_list.append(item)
 
-        method_block.init_check(method_block_local_var_list, in_constructor)
-        self.method_scope_local_var_list = method_block_local_var_list.copy()
+        yield method_block.init_check(method_block_local_var_list, in_constructor)
+        self.method_scope_local_var_list = method_block_local_var_list
         return None
 
     def pretty_label(self) -> str:
@@ -639,28 +775,32 @@ class ClassNode(ASTNode):
 
 class ConstructorStatementBlockNode(ASTNode):
     """Constructor Statement Block Node"""
+    __slots__ = ()
+
     def __init__(self, statement_list: List[ASTNode]):
         super().__init__()
         self.children += statement_list
 
-    def r_eval(self, local_var_dict: Dict[str, str], num_constructor_arguments: int):
-        ret = []
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         for statement in self.children:
-            ret += statement.r_eval(local_var_dict)
+            yield statement.r_eval(local_var_dict, out)
 
-        ret += ['\tload $', f'\treturn {num_constructor_arguments}']
-        return ret
+        out.emit(Instr(Op.LOAD, '$'), Instr(Op.RETURN, out.num_arguments))
 
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         for child in self.children:
-            child.type_eval(local_var_dict)
+            yield child.type_eval(local_var_dict)
+        return None
+
+    def infer_types(self, local_var_dict: Dict[str, str], description: str):
+        """type_eval until the variable types settle"""
+        infer_block_types(self.children, local_var_dict, description)
         return None
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         for child in self.children:
-            child.init_check(local_var_list, in_constructor)
-        self.initialized_variables = local_var_list.copy()
+            yield child.init_check(local_var_list, in_constructor)
         return None
 
     def pretty_label(self) -> str:
@@ -668,41 +808,25 @@ class ConstructorStatementBlockNode(ASTNode):
 
 class ClassMethodBlockNode(ASTNode):
     """Class Method Block Node"""
+    __slots__ = ()
+
     def __init__(self, methods_list: List[ASTNode]):
         super().__init__()
         self.children += methods_list
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        ret = []
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         for child in self.children:
-            ret += child.r_eval(local_var_dict.copy())
-        return ret
+            yield child.r_eval(local_var_dict.copy(), out)
 
     # Need the superclass to check compatability
     def type_eval(self, local_var_dict: Dict[str, str], super_class: str):
         for method in self.children:
-            count = 1
-            print(f'In Class method type check for {method.method_name} iteration number: {count}')
-            cur_local_var_dict = local_var_dict.copy()
-            method.type_eval(cur_local_var_dict, super_class)
-            print(cur_local_var_dict)
-
-            # Try additional passes through to make sure that variable types don't change
-            temp_cur_local_var_dict = cur_local_var_dict.copy()
-            while True:
-                count += 1
-                print(f'In Class method type check for {method.method_name} iteration number: {count}')
-                method.type_eval(cur_local_var_dict, super_class)
-                print(cur_local_var_dict)
-                if temp_cur_local_var_dict == cur_local_var_dict:
-                    break
-                else:
-                    print(f'Class method type check additional pass detected type changes. Making another pass. Newly interpreted types {cur_local_var_dict}')
-                    temp_cur_local_var_dict = cur_local_var_dict.copy()
+            # The method's statements are checked until their variable types settle
+            yield method.type_eval(local_var_dict.copy(), super_class)
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         for child in self.children:
-            child.init_check(local_var_list, in_constructor)
+            yield child.init_check(local_var_list, in_constructor)
         return None
 
 
@@ -711,6 +835,8 @@ class ClassMethodBlockNode(ASTNode):
 
 class ClassSignatureNode(ASTNode):
     """Class Signature Node"""
+    __slots__ = ('class_name', 'super_class')
+
     def __init__(self, class_name: str,  formal_args: ASTNode, super_class: str):
         super().__init__()
         self.class_name = class_name
@@ -720,29 +846,31 @@ class ClassSignatureNode(ASTNode):
         else:
             self.super_class = "Obj"
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
 
-        # Write out the class declaration
-        class_declaration = [f'.class {self.class_name}:{self.super_class}']
+        # Write out the class declaration, with the class's interval for the VM's is_instance
+        class_declaration = [ClassDecl(self.class_name, self.super_class),
+                             IntervalDecl(*ch.get_interval(self.class_name))]
 
         # Write out class fields, except for those inherited from super
         field_declaration = []
         for variable in ch.find_class(self.class_name).fields_list:
             if variable not in ch.find_class(self.super_class).fields_list:
-                field_declaration += [f'.field {variable}']
+                field_declaration += [FieldDecl(variable)]
 
-        # Write out method forward declarations
+        # Write out method forward declarations, reserving vtable slots in the
+        # order of the class's method table; inherited methods already have theirs
         method_forward_declaration = []
-        for method in ch.find_class(self.class_name).methods_list:
-            method_forward_declaration += [f'.method {method.method_name} forward']
+        for method_name in ch.find_class(self.class_name).new_methods():
+            method_forward_declaration += [MethodDecl(method_name, forward=True)]
 
         # Write out constructor declaration
-        constructor_declaration = ['.method $constructor']
+        constructor_declaration = [MethodDecl('$constructor')]
         formal_args = self.children[0]
         if formal_args.arg_names:
-            constructor_declaration += [f".args {','.join(formal_args.arg_names)}"]
+            constructor_declaration += [ArgsDecl(tuple(formal_args.arg_names))]
 
-        return class_declaration + field_declaration + method_forward_declaration + constructor_declaration
+        out.emit(*class_declaration, *field_declaration, *method_forward_declaration, *constructor_declaration)
 
     def type_eval(self, local_var_dict: Dict[str, str]) -> None:
         formal_args = self.children[0]
@@ -762,6 +890,9 @@ class ClassSignatureNode(ASTNode):
 
 class ClassMethodNode(ASTNode):
     """Class Method"""
+    __slots__ = ('method_name', 'ret_type', 'method_scope_local_var_dict', 'method_scope_local_var_list',
+                 'falls_through')
+
     def __init__(self, method_name: str, formal_args: ASTNode, ret_type: str, statement_block: ASTNode):
         super().__init__()
         self.children.append(formal_args)
@@ -774,23 +905,26 @@ class ClassMethodNode(ASTNode):
         # var_list for the current method scope. init_check will populate this
         self.method_scope_local_var_list = None
 
+        # Whether control can reach the end of the method body. Dead code elimination
+        # works this out; until then, assume it can
+        self.falls_through = True
+
         # If a return type isn't specified, assume that it returns 'Nothing'
         if not ret_type:
             self.ret_type = 'Nothing'
         else:
             self.ret_type = ret_type
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         formal_args, statement_block = self.children
-        args_declaration = [f".args {','.join(formal_args.arg_names)}"] if formal_args.arg_names else []
+        args_declaration = [ArgsDecl(tuple(formal_args.arg_names))] if formal_args.arg_names else []
 
         # Add local arguments to local_var_dict
         for i in range(len(formal_args.arg_names)):
             local_var_dict[formal_args.arg_names[i]] = formal_args.arg_types[i]
 
-        statement_block_instructions = statement_block.r_eval(self.method_scope_local_var_dict)
         # Write out method declaration
-        method_declaration = [f'.method {self.method_name}']
+        method_declaration = [MethodDecl(self.method_name)]
 
         # Local variables in a function is everyhing that local_var_dict picks out that isn't a field or a function variable
         # local_vars_in_function = [item for item in self.method_scope_local_var_dict if item not in formal_args.arg_names and not item.startswith('this.')]
@@ -806,24 +940,18 @@ class ClassMethodNode(ASTNode):
 
         # Write out local variable declaration
         if local_vars_in_function:
-            local_var_declaration = [f".local {','.join(local_vars_in_function)}"]
+            local_var_declaration = [LocalsDecl(tuple(local_vars_in_function))]
         else:
             local_var_declaration = []
 
-        # Edit return line, if it exists, otherwise append a return line
-        num_class_method_arguments = len(self.children[0].arg_names)
-        is_there_a_return_statement = [instruction.startswith('\treturn') for instruction in statement_block_instructions]
-        if any(is_there_a_return_statement):
-            # If there is a return statement, replace it
-            index_of_trues = [index for index, value in enumerate(is_there_a_return_statement) if value]
-            for return_statement_index in index_of_trues:
-                statement_block_instructions[return_statement_index] = statement_block_instructions[return_statement_index].replace('TOFILL', str(num_class_method_arguments))
-        else:
-            # Otherwise, add a return
-            statement_block_instructions.append('\tconst nothing')
-            statement_block_instructions.append(f'\treturn {num_class_method_arguments}')
+        method = Emitter(len(formal_args.arg_names))
+        method.emit(*method_declaration, *args_declaration, *local_var_declaration)
+        yield statement_block.r_eval(self.method_scope_local_var_dict, method)
+        # If control can reach the end of the method, append a return line
+        if self.falls_through:
+            method.emit(Instr(Op.CONST, NamedConst('nothing')), Instr(Op.RETURN, method.num_arguments))
 
-        return method_declaration + args_declaration + local_var_declaration + statement_block_instructions
+        out.emit(*method.code)
 
     # Need the superclass to check compatability
     def type_eval(self, local_var_dict: Dict[str, str], super_class: str):
@@ -843,8 +971,8 @@ class ClassMethodNode(ASTNode):
         # Populate local_var_dict with local variables
         populate_local_var_dict_with_initialized_vars(method_scope_local_var_dict, self.method_scope_local_var_list)
 
-        statement_block_ret_type = statement_block.type_eval(method_scope_local_var_dict)
-        print(self.method_name, statement_block_ret_type)
+        statement_block_ret_type = statement_block.infer_types(method_scope_local_var_dict, f'Method {self.method_name}')
+        TYPE_INFER.debug('%s returns %s', self.method_name, statement_block_ret_type)
 
         # If the statement block returns something make sure it is a valid return type with the declared return type. If the block returns nothing, make sure there is no return type defined, or that the method is declared to return nothing
         if statement_block_ret_type:
@@ -856,13 +984,12 @@ class ClassMethodNode(ASTNode):
 
         # Save the variable scope for this method for code generation
         self.method_scope_local_var_dict = method_scope_local_var_dict
-        local_var_dict = method_scope_local_var_dict.copy()
 
 
         # Check superclass compatability
 
-        super_class_entry = ch.find_class(super_class)
-        super_class_method_match = [entry for entry in super_class_entry.methods_list if entry.method_name == self.method_name]
+        super_class_entry = ch.find_class(super_class).find_method(self.method_name)
+        super_class_method_match = [super_class_entry.method] if super_class_entry else []
         if super_class_method_match:
             # For every overriding method, make sure it has the same number of arguments as the method it overrides
             if not len(super_class_method_match[0].params) == len(formal_args.arg_names):
@@ -887,8 +1014,8 @@ class ClassMethodNode(ASTNode):
         for method_parameter_name in formal_args.arg_names:
             method_scope_local_var_list.append(method_parameter_name)
 
-        statement_block.init_check(method_scope_local_var_list, in_constructor)
-        self.method_scope_local_var_list = method_scope_local_var_list.copy()
+        yield statement_block.init_check(method_scope_local_var_list, in_constructor)
+        self.method_scope_local_var_list = method_scope_local_var_list
         return None
 
 
@@ -899,12 +1026,14 @@ class ClassMethodNode(ASTNode):
 
 class FormalArgsNode(ASTNode):
     """Formal args Node"""
+    __slots__ = ('arg_names', 'arg_types')
+
     def __init__(self, lst: List[str]):
         super().__init__()
         self.arg_names = lst[::2]
         self.arg_types = lst[1::2]
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         return None
 
     def type_eval(self, local_var_dict: Dict[str, str]):
@@ -919,42 +1048,34 @@ class FormalArgsNode(ASTNode):
 
 class ProgramNode(ASTNode):
     """Program  Node"""
+    __slots__ = ()
+
     def __init__(self, class_list: List[ASTNode], bare_statement_block: ASTNode):
         super().__init__()
         # self.children.append(program)
 
-        # Run topological ordering and reorder the class nodes so that we always load the classes in the right order
-        # class_list_name = [class_node.children[0].class_name for class_node in class_list]
-        # superclass_list_name = [class_node.children[0].super_class for class_node in class_list]
-
-        # DG = dependency_graph.Dependency_Graph()
-        # for i in range(len(class_list_name)):
-        #     DG.addEdge(class_list_name[i], superclass_list_name[i])
-        # topoOrder = DG.topologicalSort()
-
-        # # Drop the Obj class from the ordering
-        # topoOrder.remove("Obj")
-
-        # reordered_class_list = []
-        # for i in topoOrder:
-        #     reordered_class_list.append(class_list[class_list_name.index(i)])
-
-        # self.children += reordered_class_list
-        self.children += class_list
+        # Reorder the class nodes so that we always load the classes in the right order
+        self.children += order_classes(class_list)
         self.children.append(bare_statement_block)
         # self.num_classes = len(class_list)
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        return ([subitem for child in self.children for subitem in child.r_eval(local_var_dict)])
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        for child in self.children:
+            yield child.r_eval(local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
-        for child in self.children:
-            child.type_eval(local_var_dict)
+        *class_list, bare_statement_block = self.children
+        # Declare every class before checking any methods, which may use classes declared after theirs
+        for child in class_list:
+            child.declare(local_var_dict)
+        for child in class_list:
+            child.type_eval_methods(local_var_dict)
+        yield bare_statement_block.type_eval(local_var_dict)
         return None
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         for child in self.children:
-            child.init_check(local_var_list, in_constructor)
+            yield child.init_check(local_var_list, in_constructor)
         return None
 
 
@@ -985,22 +1106,30 @@ class ProgramNode(ASTNode):
 
 class MethodargsNode(ASTNode):
     """Methodargs  Node"""
+    __slots__ = ()
+
     def __init__(self, argument_list: ASTNode):
         super().__init__()
         self.children += argument_list
         # breakpoint()
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        return [subitem for children in self.children for subitem in children.r_eval(local_var_dict)]
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        for child in self.children:
+            yield child.r_eval(local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
-        return [child.type_eval(local_var_dict) for child in self.children]
+        args_types = []
+        for child in self.children:
+            args_types.append((yield child.type_eval(local_var_dict)))
+        return args_types
 
     def pretty_label(self) -> str:
         return "MethodargsNode"
 
 class BareStatementBlockNode(ASTNode):
     """BareStatementBloc Node"""
+    __slots__ = ('bare_statement_block_local_var_dict', 'bare_statement_block_local_var_list')
+
     def __init__(self, statement_list: ASTNode):
         super().__init__()
         self.children += statement_list
@@ -1009,46 +1138,26 @@ class BareStatementBlockNode(ASTNode):
         self.bare_statement_block_local_var_list = None
         # breakpoint()
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        ret = [subitem for children in self.children for subitem in children.r_eval(self.bare_statement_block_local_var_dict)]
-        # Take care of potential returns in the bare statement. Replace with 0 because the bare statements have no arguments
-        ret = [i.replace('TOFILL', str(0)) for i in ret]
-        return ret
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        # Potential returns in the bare statements take out.num_arguments, 0 because the bare statements have no arguments
+        for child in self.children:
+            yield child.r_eval(self.bare_statement_block_local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         # Populate variable with those initialized in this scope
         populate_local_var_dict_with_initialized_vars(local_var_dict, self.bare_statement_block_local_var_list)
 
-        count = 1
-        print(f'In BareStatementBlock type check iteration number: {count}')
-        for child in self.children:
-            child.type_eval(local_var_dict)
-        print(local_var_dict)
-
-
-        temp_local_var_dict = local_var_dict.copy()
-        # Try additional passes through to make sure that variable types don't change
-        while True:
-            count += 1
-            print(f'In BareStatementBlock type check iteration number: {count}')
-            for child in self.children:
-                child.type_eval(local_var_dict)
-            print(local_var_dict)
-            if temp_local_var_dict == local_var_dict:
-                break
-            else:
-                print(f'BareStatementBlock type check additional pass detected type changes. Making another pass. Newly interpreted types {local_var_dict}')
-                temp_local_var_dict = local_var_dict.copy()
+        infer_block_types(self.children, local_var_dict, 'BareStatementBlock')
 
         # Save the local_var_dict for the bare statement block for code generation
-        self.bare_statement_block_local_var_dict = local_var_dict.copy()
+        self.bare_statement_block_local_var_dict = local_var_dict
         return None
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         for child in self.children:
-            child.init_check(local_var_list, in_constructor)
+            yield child.init_check(local_var_list, in_constructor)
 
-        self.bare_statement_block_local_var_list = local_var_list.copy()
+        self.bare_statement_block_local_var_list = local_var_list
         return None
 
 
@@ -1059,21 +1168,23 @@ class BareStatementBlockNode(ASTNode):
 
 class AssignmentNode(ASTNode):
     """Assignment Node"""
+    __slots__ = ('var_type',)
+
     def __init__(self, lexp: ASTNode, var_type: str, rexp: ASTNode):
         super().__init__()
         self.children.append(lexp)
         self.children.append(rexp)
         self.var_type = var_type
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         lexp, rexp = self.children
-        return (rexp.r_eval(local_var_dict)
-                + lexp.l_eval(local_var_dict))
+        yield rexp.r_eval(local_var_dict, out)
+        yield lexp.l_eval(local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         lexp, rexp = self.children
 
-        actual_type = rexp.type_eval(local_var_dict)
+        actual_type = (yield rexp.type_eval(local_var_dict))
         declared_type = self.var_type
 
         if isinstance(lexp, VarReferenceNode) or isinstance(lexp, ThisReferenceLexpNode):
@@ -1084,7 +1195,7 @@ class AssignmentNode(ASTNode):
                 raise SyntaxError(f"Assignment to {lexp.get_value()} is invalid. Most likely, there is a path that doesn't initialize this variable")
         else:
             # Its a field reference
-            prev_inferred_type = lexp.type_eval(local_var_dict)
+            prev_inferred_type = (yield lexp.type_eval(local_var_dict))
 
 
         # If we are trying to assign a variable to something that doesn't return anything...
@@ -1121,8 +1232,9 @@ class AssignmentNode(ASTNode):
                 raise TypeError(f'Declared type {declared_type} in TypeCase is an invalid class')
         else: # It's a field reference
             # Make sure that the assignment to this field is legal
-            if not ch.is_legal_assignment(lexp.type_eval(local_var_dict), actual_type):
-                raise TypeError(f'Assignment to field {lexp.field_name} is invalid. Cannot assign {actual_type} to {lexp.type_eval(local_var_dict)}')
+            field_type = yield lexp.type_eval(local_var_dict)
+            if not ch.is_legal_assignment(field_type, actual_type):
+                raise TypeError(f'Assignment to field {lexp.field_name} is invalid. Cannot assign {actual_type} to {field_type}')
 
         return None
 
@@ -1134,8 +1246,8 @@ class AssignmentNode(ASTNode):
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         lexp, rexp = self.children
         # First check if the right hand side is a valid statement, if so add the left to the local_var_list
-        print(local_var_list)
-        rexp.init_check(local_var_list, in_constructor)
+        INIT_CHECK.debug('Assignment to %s with initialized variables %s', lexp.pretty_label(), local_var_list)
+        yield rexp.init_check(local_var_list, in_constructor)
 
         # If the lexp is a typecasevarreference or varreference or thisreference, check directly with the local_var_list,
         if isinstance(lexp, VarReferenceNode):
@@ -1152,7 +1264,7 @@ class AssignmentNode(ASTNode):
                 local_var_list.append(('TYPECASE', lexp.get_value()))
         else:
         # If the lexp is a fieldreference, run an initialization check on that
-            lexp.init_check(local_var_list, in_constructor)
+            yield lexp.init_check(local_var_list, in_constructor)
 
         return None
 
@@ -1163,21 +1275,23 @@ class AssignmentNode(ASTNode):
 
 class RexpNode(ASTNode):
     """Rexp Node"""
+    __slots__ = ()
+
     def __init__(self, rexp: ASTNode):
         super().__init__()
         self.children.append(rexp)
 
-    def r_eval(self, local_var_dict: Dict[str, str]) -> List[str]:
-        return self.children[0].r_eval(local_var_dict)
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter) -> None:
+        yield self.children[0].r_eval(local_var_dict, out)
 
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]) -> List[str]:
-        return self.children[0].c_eval(true_branch, false_branch, local_var_dict)
+    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str], out: Emitter) -> None:
+        yield self.children[0].c_eval(true_branch, false_branch, local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]) -> str:
-        return self.children[0].type_eval(local_var_dict)
+        return (yield self.children[0].type_eval(local_var_dict))
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
-        self.children[0].init_check(local_var_list, in_constructor)
+        yield self.children[0].init_check(local_var_list, in_constructor)
         return None
 
     def pretty_label(self) -> str:
@@ -1185,24 +1299,25 @@ class RexpNode(ASTNode):
 
 class BareRexpNode(ASTNode):
     """Rexp Node"""
+    __slots__ = ()
+
     def __init__(self, rexp: ASTNode):
         super().__init__()
         self.children.append(rexp)
 
-    def r_eval(self, local_var_dict: Dict[str, str]) -> List[str]:
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter) -> None:
         # Bare right expression need a pop to get rid the thing it returns (whatever that is)
-        return (self.children[0].r_eval(local_var_dict) +
-                ['\tpop']
-                )
+        yield self.children[0].r_eval(local_var_dict, out)
+        out.emit(Instr(Op.POP))
 
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]) -> List[str]:
-        return self.children[0].c_eval(true_branch, false_branch, local_var_dict)
+    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str], out: Emitter) -> None:
+        yield self.children[0].c_eval(true_branch, false_branch, local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]) -> str:
-        return self.children[0].type_eval(local_var_dict)
+        return (yield self.children[0].type_eval(local_var_dict))
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
-        self.children[0].init_check(local_var_list, in_constructor)
+        yield self.children[0].init_check(local_var_list, in_constructor)
         return None
 
     def pretty_label(self) -> str:
@@ -1210,25 +1325,23 @@ class BareRexpNode(ASTNode):
 
 class ConstructorCall(ASTNode):
     """Rexp Node"""
+    __slots__ = ('caller_name',)
+
     def __init__(self, caller_name: str, constructor_arguments: ASTNode):
         super().__init__()
         self.children.append(constructor_arguments)
         self.caller_name = caller_name
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         constructor_arguments = self.children[0]
-        constructorargs_r_eval = constructor_arguments.r_eval(local_var_dict) if constructor_arguments else []
-        return (constructorargs_r_eval +
-                [f'\tnew {self.caller_name}'] +
-                [f'\tcall {self.caller_name}:$constructor'])
-
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]) -> List[str]:
-        # return self.children[0].c_eval(true_branch, false_branch, local_var_dict)
-        return None
+        if constructor_arguments:
+            yield constructor_arguments.r_eval(local_var_dict, out)
+        out.emit(Instr(Op.NEW, self.caller_name),
+                 Instr(Op.CALL, MemberRef(self.caller_name, '$constructor')))
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         methodargs = self.children[0]
-        constructor_arguments_types = methodargs.type_eval(local_var_dict) if methodargs else []
+        constructor_arguments_types = (yield methodargs.type_eval(local_var_dict)) if methodargs else []
         ch.is_legal_invocation(self.caller_name, '$constructor', constructor_arguments_types)
 
         return self.caller_name
@@ -1261,15 +1374,17 @@ class ConstructorCall(ASTNode):
 
 class ThisReferenceLexpNode(ASTNode):
     """ThisLexp Node"""
+    __slots__ = ('variable',)
+
     def __init__(self, field_variable: str):
         super().__init__()
         self.variable = field_variable
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        return ['\tload $', f'\tload_field $:{self.variable}']
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        out.emit(Instr(Op.LOAD, '$'), Instr(Op.LOAD_FIELD, MemberRef('$', self.variable)))
 
-    def l_eval(self, local_var_dict: Dict[str, str]):
-        return ['\tload $', f'\tstore_field $:{self.variable}']
+    def l_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        out.emit(Instr(Op.LOAD, '$'), Instr(Op.STORE_FIELD, MemberRef('$', self.variable)))
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         # Assume that the initialization is done already here - init check must have passsed already
@@ -1291,6 +1406,8 @@ class ThisReferenceLexpNode(ASTNode):
 
 class FieldReferenceLexpNode(ASTNode):
     """FieldLexp Node"""
+    __slots__ = ('field_name', 'referred_class')
+
     def __init__(self, atomic_expr: ASTNode, field_name: str):
         super().__init__()
         self.children.append(atomic_expr)
@@ -1298,22 +1415,22 @@ class FieldReferenceLexpNode(ASTNode):
         # type evaluation will populate this
         self.referred_class = None
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         atomic_expr = self.children[0]
-        return (atomic_expr.r_eval(local_var_dict) +
-                [f'\tload_field {self.referred_class}:{self.field_name}'])
+        yield atomic_expr.r_eval(local_var_dict, out)
+        out.emit(Instr(Op.LOAD_FIELD, MemberRef(self.referred_class, self.field_name)))
 
-    def l_eval(self, local_var_dict: Dict[str, str]):
+    def l_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         atomic_expr = self.children[0]
-        return (atomic_expr.r_eval(local_var_dict) +
-                [f'\tstore_field {self.referred_class}:{self.field_name}'])
+        yield atomic_expr.r_eval(local_var_dict, out)
+        out.emit(Instr(Op.STORE_FIELD, MemberRef(self.referred_class, self.field_name)))
 
     def get_value(self) -> str:
         return self.value
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         atomic_expr = self.children[0]
-        atomic_expr_type = atomic_expr.type_eval(local_var_dict)
+        atomic_expr_type = (yield atomic_expr.type_eval(local_var_dict))
 
         # Find the class of the referred field
         referred_class = ch.find_class(atomic_expr_type)
@@ -1325,7 +1442,7 @@ class FieldReferenceLexpNode(ASTNode):
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         atomic_expr = self.children[0]
-        atomic_expr.init_check(local_var_list, in_constructor)
+        yield atomic_expr.init_check(local_var_list, in_constructor)
 
 
     def pretty_label(self) -> str:
@@ -1334,15 +1451,17 @@ class FieldReferenceLexpNode(ASTNode):
 
 class VarReferenceNode(ASTNode):
     """VarReferecnce Node"""
+    __slots__ = ('variable',)
+
     def __init__(self, variable: str):
         super().__init__()
         self.variable = variable
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        return [f'\tload {self.variable}']
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        out.emit(Instr(Op.LOAD, self.variable))
 
-    def l_eval(self, local_var_dict: Dict[str, str]):
-        return [f'\tstore {self.variable}']
+    def l_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        out.emit(Instr(Op.STORE, self.variable))
 
     def get_value(self):
         return self.variable
@@ -1358,10 +1477,6 @@ class VarReferenceNode(ASTNode):
     # def get_prev_defined_type(self, local_var_dict: Dict[str, str]):
     #     return local_var_dict.get(self.variable, None)
 
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]) -> List[str]:
-        bool_code = self.r_eval(local_var_dict)
-        return bool_code + [f"\tjump_if {true_branch}", f"\tjump {false_branch}"]
-
     def __eq__(self, other):
         return isinstance(other, VarReferenceNode) and (self.variable == other.variable)
 
@@ -1370,16 +1485,18 @@ class VarReferenceNode(ASTNode):
 
 class TypeCaseVarReferenceNode(ASTNode):
     """VarReferecnce Node"""
+    __slots__ = ('variable', 'forced_type')
+
     def __init__(self, variable: str, forced_type: str):
         super().__init__()
         self.variable = variable
         self.forced_type = forced_type
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        return [f'\tload {self.variable}']
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        out.emit(Instr(Op.LOAD, self.variable))
 
-    def l_eval(self, local_var_dict: Dict[str, str]):
-        return [f'\tstore {self.variable}']
+    def l_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        out.emit(Instr(Op.STORE, self.variable))
 
     def get_value(self):
         return self.variable
@@ -1393,10 +1510,6 @@ class TypeCaseVarReferenceNode(ASTNode):
     # def get_prev_defined_type(self, local_var_dict: Dict[str, str]):
     #     return local_var_dict.get(self.variable, None)
 
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]) -> List[str]:
-        bool_code = self.r_eval(local_var_dict)
-        return bool_code + [f"\tjump_if {true_branch}", f"\tjump {false_branch}"]
-
     def __eq__(self, other):
         return isinstance(other, VarReferenceNode) and (self.variable == other.variable)
 
@@ -1406,13 +1519,18 @@ class TypeCaseVarReferenceNode(ASTNode):
 
 class ConstNode(ASTNode):
     """Constant"""
+    __slots__ = ('value', 'value_type')
+
     def __init__(self, value: str, value_type: str):
         super().__init__()
         self.value = value
         self.value_type = value_type
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        return [f"\tconst {self.value}"]
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        if self.value_type == 'Int':
+            out.emit(Instr(Op.CONST, IntConst(self.value)))
+        else:
+            out.emit(Instr(Op.CONST, StrConst.from_literal(self.value)))
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         return self.value_type
@@ -1425,11 +1543,13 @@ class ConstNode(ASTNode):
 
 class NothingNode(ASTNode):
     """Constant"""
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        return ["\tconst nothing"]
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        out.emit(Instr(Op.CONST, NamedConst('nothing')))
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         return "Nothing"
@@ -1443,16 +1563,14 @@ class NothingNode(ASTNode):
 
 class BoolNode(ASTNode):
     """Boolean """
+    __slots__ = ('value',)
+
     def __init__(self, value: str):
         super().__init__()
         self.value = value
 
-    def r_eval(self, local_var_dict: Dict[str, str]) -> List[str]:
-        return [f"\tconst {self.value}"]
-
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]):
-        bool_code = self.r_eval(local_var_dict)
-        return bool_code + [f"\tjump_if {true_branch}", f"\tjump {false_branch}"]
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter) -> None:
+        out.emit(Instr(Op.CONST, NamedConst(self.value)))
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         return "Boolean"
@@ -1522,43 +1640,60 @@ class BoolNode(ASTNode):
 
 #     def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]) -> List[str]:
 #         bool_code = self.r_eval(local_var_dict)
-#         return bool_code + [f"\tjump_if {true_branch}", f"\tjump {false_branch}"]
+#         return bool_code + [Instr(Op.JUMP_IF, true_branch), Instr(Op.JUMP, false_branch)]
 
 #     def pretty_label(self) -> str:
 #         return f"ComparisonNode: {self.comp_op}"
 
+def boolean_value(node: ASTNode, local_var_dict: Dict[str, str], out: Emitter):
+    """Evaluate a short circuit condition for value: its c_eval jumps to code pushing
+    true or false, so the operands it skips are never evaluated
+    """
+    true_label = new_label("true")
+    false_label = new_label("false")
+    done_label = new_label("bool_done")
+    yield node.c_eval(true_label, false_label, local_var_dict, out)
+    out.emit(Label(true_label), Instr(Op.CONST, NamedConst('true')), Instr(Op.JUMP, done_label),
+             Label(false_label), Instr(Op.CONST, NamedConst('false')),
+             Label(done_label))
+
+
+def check_boolean_operands(operator: str, left_type: Optional[str], right_type: Optional[str]) -> None:
+    if left_type != "Boolean" or right_type != "Boolean":
+        raise TypeError(f"'{operator}' expects Boolean operands, not {left_type} and {right_type}")
+
+
 class AndNode(ASTNode):
     """Boolean and, short circuit; can be evaluated for jump or for boolean value"""
+    __slots__ = ()
+
     def __init__(self, left: ASTNode, right: ASTNode):
         super().__init__()
         self.children.append(left)
         self.children.append(right)
 
-    # FIXME: Needs r_eval to allow production of boolean value
-
-    def r_eval(self, local_var_dict: Dict[str, str]) -> List[str]:
-        left, right = self.children
-        return (left.r_eval(local_var_dict) + right.r_eval(local_var_dict) + ['\tcall Boolean:AND'])
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter) -> None:
+        yield boolean_value(self, local_var_dict, out)
 
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]):
+    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str], out: Emitter):
         """Use in a conditional branch"""
         continue_label = new_label("and")
         left, right = self.children
-        return (left.c_eval(continue_label, false_branch, local_var_dict)
-                + [continue_label + ":"]
-                + right.c_eval(true_branch, false_branch, local_var_dict)
-                )
+        yield left.c_eval(continue_label, false_branch, local_var_dict, out)
+        out.emit(Label(continue_label))
+        yield right.c_eval(true_branch, false_branch, local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         left, right = self.children
-        left.type_eval(local_var_dict)
-        right.type_eval(local_var_dict)
+        left_type = (yield left.type_eval(local_var_dict))
+        right_type = (yield right.type_eval(local_var_dict))
+        check_boolean_operands('and', left_type, right_type)
         return "Boolean"
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         left, right = self.children
-        left.init_check(local_var_list, in_constructor)
-        right.init_check(local_var_list, in_constructor)
+        yield left.init_check(local_var_list, in_constructor)
+        yield right.init_check(local_var_list, in_constructor)
         return None
 
     def pretty_label(self) -> str:
@@ -1567,33 +1702,35 @@ class AndNode(ASTNode):
 
 class OrNode(ASTNode):
     """Boolean or, short circuit; can be evaluated for jump or for boolean value"""
+    __slots__ = ()
+
     def __init__(self, left: ASTNode, right: ASTNode):
         super().__init__()
         self.children.append(left)
         self.children.append(right)
 
-    # FIXME: Needs r_eval to allow production of boolean value
-
-    def r_eval(self, local_var_dict: Dict[str, str]):
-        left, right = self.children
-        return (left.r_eval(local_var_dict) + right.r_eval(local_var_dict) + ['\tcall Boolean:OR'])
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
+        yield boolean_value(self, local_var_dict, out)
 
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]) -> List[str]:
+    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str], out: Emitter) -> None:
         """Use in a conditional branch"""
-        continue_label = new_label("and")
+        continue_label = new_label("or")
         left, right = self.children
-        return (left.c_eval(true_branch, continue_label, local_var_dict)
-                + [continue_label + ":"]
-                + right.c_eval(true_branch, false_branch, local_var_dict)
-                )
+        yield left.c_eval(true_branch, continue_label, local_var_dict, out)
+        out.emit(Label(continue_label))
+        yield right.c_eval(true_branch, false_branch, local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
+        left, right = self.children
+        left_type = (yield left.type_eval(local_var_dict))
+        right_type = (yield right.type_eval(local_var_dict))
+        check_boolean_operands('or', left_type, right_type)
         return "Boolean"
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         left, right = self.children
-        left.init_check(local_var_list, in_constructor)
-        right.init_check(local_var_list, in_constructor)
+        yield left.init_check(local_var_list, in_constructor)
+        yield right.init_check(local_var_list, in_constructor)
         return None
 
     def pretty_label(self) -> str:
@@ -1602,29 +1739,32 @@ class OrNode(ASTNode):
 
 class NotNode(ASTNode):
     """Boolean or, short circuit; can be evaluated for jump or for boolean value"""
+    __slots__ = ()
+
     def __init__(self, statement: ASTNode):
         super().__init__()
         self.children.append(statement)
 
     # FIXME: Needs r_eval to allow production of boolean value
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         statement = self.children[0]
-        return (statement.r_eval(local_var_dict) + ['\tcall Boolean:NOT'])
+        yield statement.r_eval(local_var_dict, out)
+        out.emit(Instr(Op.CALL, MemberRef('Boolean', 'NOT')))
 
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]) -> List[str]:
+    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str], out: Emitter) -> None:
         """Use in a conditional branch"""
         statement = self.children[0]
-        return statement.c_eval(false_branch, true_branch, local_var_dict)
+        yield statement.c_eval(false_branch, true_branch, local_var_dict, out)
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         statement = self.children[0]
-        statement.type_eval(local_var_dict)
+        yield statement.type_eval(local_var_dict)
         return "Boolean"
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         statement = self.children[0]
-        statement.init_check(local_var_list, in_constructor)
+        yield statement.init_check(local_var_list, in_constructor)
         return None
 
     def pretty_label(self) -> str:
@@ -1633,29 +1773,32 @@ class NotNode(ASTNode):
 
 class IsInstanceNode(ASTNode):
     """IsInstance Node"""
+    __slots__ = ('target_class',)
+
     def __init__(self, rexp: ASTNode, target_class: str):
         super().__init__()
         self.children.append(rexp)
         self.target_class = target_class
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         target_variable = self.children[0]
-        return target_variable.r_eval(local_var_dict)
+        yield target_variable.r_eval(local_var_dict, out)
 
-    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str]):
-        # Hacky but ¯\_(ツ)_/¯
-        ret = self.children[0].c_eval(true_branch, false_branch, local_var_dict)
-        ret.insert(ret.index('\tjump_if ' + true_branch), f'\tis_instance {self.target_class}')
-        return ret
+    def c_eval(self, true_branch: str, false_branch: str, local_var_dict: Dict[str, str], out: Emitter):
+        target_variable = self.children[0]
+        yield target_variable.r_eval(local_var_dict, out)
+        out.emit(Instr(Op.IS_INSTANCE, self.target_class),
+                 Instr(Op.JUMP_IF, true_branch),
+                 Instr(Op.JUMP, false_branch))
 
     def type_eval(self, local_var_dict: Dict[str, str]):
         target_variable = self.children[0]
-        target_variable.type_eval(local_var_dict)
+        yield target_variable.type_eval(local_var_dict)
         return "Boolean"
 
     def init_check(self, local_var_list: List[str], in_constructor: bool):
         target_variable = self.children[0]
-        target_variable.init_check(local_var_list, in_constructor)
+        yield target_variable.init_check(local_var_list, in_constructor)
         return None
 
     def pretty_label(self) -> str:
@@ -1663,13 +1806,15 @@ class IsInstanceNode(ASTNode):
 
 class TypeAlternativeNode(ASTNode):
     """Type alternative node"""
+    __slots__ = ('alt_name', 'type_name')
+
     def __init__(self, alt_name: str, type_name: str, StatementBlockNode: ASTNode):
         super().__init__()
         self.children.append(StatementBlockNode)
         self.alt_name = alt_name
         self.type_name = type_name
 
-    def r_eval(self, local_var_dict: Dict[str, str]):
+    def r_eval(self, local_var_dict: Dict[str, str], out: Emitter):
         return None
 
     def type_eval(self, local_var_dict: Dict[str, str]):
@@ -1685,8 +1830,19 @@ class TypeAlternativeNode(ASTNode):
 
 def parse_builtin_classes(builtinclass_json):
     global ch
-    ch = class_hierarchy.parse_builtin_classes(builtinclass_json)
+    ch = class_hierarchy.load_builtin_classes(builtinclass_json)
 
 def print_class_hierarchy():
     global ch
     class_hierarchy.pretty_print(ch)
+
+def complete_class_hierarchy(class_names: Set[str]):
+    """Load every class the named classes can reach, then number the hierarchy, once.
+    Checking methods later finds every class it looks up already in the hierarchy.
+    """
+    ch.visible_classes(class_names)
+    ch.number_classes()
+
+def trace_class_hierarchy():
+    if HIERARCHY.isEnabledFor(logging.INFO):
+        HIERARCHY.info('Class Hierarchy\n%s', class_hierarchy.pretty_format(ch))
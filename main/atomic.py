@@ -0,0 +1,25 @@
+"""Atomic replacement of compiler output files.
+
+Programs compiled in parallel (quackc --jobs) and compile servers may
+read a file while another process writes it.  Output files are written
+under a temporary name in the same directory and renamed over the old
+file, so a reader sees either the old contents or the new, never part.
+"""
+import os
+import pathlib
+from typing import Union
+
+
+def write_atomically(path: Union[str, pathlib.Path], contents: Union[str, bytes]) -> None:
+    path = pathlib.Path(path)
+    # Unique per process, and on the same file system as path
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        if isinstance(contents, bytes):
+            temporary.write_bytes(contents)
+        else:
+            temporary.write_text(contents)
+        temporary.replace(path)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
@@ -1,5 +1,11 @@
-from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, Union
+from typing import Any, Callable, Collection, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Type, Union
+import hashlib
 import json
+import pathlib
+import pickle
+
+from atomic import write_atomically
+from tracing import HIERARCHY
 
 class QuackClassMethod():
     def __init__(self, method_name: str, params: List[str], ret: str):
@@ -8,6 +14,15 @@ class QuackClassMethod():
         self.ret = ret
 
 
+class MethodEntry(NamedTuple):
+    """A method as seen from a class: its signature, the class that defines it
+    (the class itself when it overrides) and its slot in the class's vtable
+    """
+    method: QuackClassMethod
+    defined_in: str
+    slot: int
+
+
 class QuackClass():
     def __init__(self, class_name: str, super_class: str, methods_list: List[QuackClassMethod], fields_list: Dict[str, str]):
         self.class_name = class_name
@@ -15,6 +30,55 @@ class QuackClass():
         self.methods_list = methods_list
         self.fields_list = fields_list
         self.children: List[QuackClass] = []
+        # Set by RootObjClass.add_class_to_hierarchy
+        self.parent: Optional[QuackClass] = None
+        self.depth = 0
+        # Class names from Obj down to this class
+        self.path: List[str] = [class_name]
+        # lift[k] is the ancestor 2**k levels up (binary lifting for find_LCA)
+        self.lift: List[QuackClass] = []
+        # Preorder number of this class and the last preorder number in its
+        # subtree, set by RootObjClass.number_classes.  A class is a subclass
+        # of this one exactly when its pre lies in [pre, last].
+        self.pre = -1
+        self.last = -1
+        # Every method the class understands, inherited ones included, by name
+        self.method_table: Dict[str, MethodEntry] = {}
+        self.inherit_methods(None)
+
+    def inherit_methods(self, parent: Optional['QuackClass']) -> None:
+        """Build method_table from the parent's table and this class's own methods.
+        Overriding keeps the inherited slot; new methods take the next slots, in
+        the order they are defined (as the assembler numbers them).
+        """
+        table = dict(parent.method_table) if parent else {}
+        for method in self.methods_list:
+            inherited = table.get(method.method_name)
+            if inherited is None:
+                table[method.method_name] = MethodEntry(method, self.class_name, len(table))
+            elif inherited.defined_in != self.class_name:
+                # If a method is defined twice, the first definition counts
+                table[method.method_name] = MethodEntry(method, self.class_name, inherited.slot)
+        self.method_table = table
+
+    def find_method(self, method_name: str) -> Optional[MethodEntry]:
+        """The method a call of method_name on this class resolves to"""
+        return self.method_table.get(method_name)
+
+    def interface(self) -> dict:
+        """What other modules need to type check against this class (see write_interface)"""
+        return {
+            "class_name": self.class_name,
+            "super": self.super_class,
+            "fields": self.fields_list,
+            "methods": [[method.method_name, method.params, method.ret] for method in self.methods_list],
+        }
+
+    def new_methods(self) -> List[str]:
+        """Names of the methods this class adds to its parent's, in slot order"""
+        inherited = len(self.parent.method_table) if self.parent else 0
+        return sorted((name for name, entry in self.method_table.items() if entry.slot >= inherited),
+                      key=lambda name: self.method_table[name].slot)
 
 
 class RootObjClass(QuackClass):
@@ -25,25 +89,25 @@ class RootObjClass(QuackClass):
                        QuackClassMethod("EQUALS", ["Obj"], "Boolean")
                        ]
         super().__init__("Obj", "Obj", Obj_methods, {})
-
-    def get_path_to_subclass_helper(self, cur_node: QuackClass, class_name: str, path_so_far: List[str]) -> bool:
-        path_so_far.append(cur_node.class_name)
-
-        if cur_node.class_name == class_name:
-            return True
-
-        if any([self.get_path_to_subclass_helper(child, class_name, path_so_far) for child in cur_node.children]):
-            return True
-
-        path_so_far.pop()
-        return False
-
+        # Every class in the hierarchy by name, kept up to date by add_class_to_hierarchy
+        self.classes: Dict[str, QuackClass] = {"Obj": self}
+        # find_LCA results by (class, class), in sorted order; cleared when a class is added
+        self.lca_cache: Dict[Tuple[str, str], str] = {}
+        # Whether number_classes has run; after that, no class may be added
+        self.numbered = False
+        # Looks up classes that are not in the hierarchy yet, e.g. from interface files
+        self.class_loader: Optional[Callable[[str], Optional[QuackClass]]] = None
+        # Classes being loaded, so that a cycle of superclasses ends
+        self.loading: Set[str] = set()
+
+    def find_indexed_class(self, class_name: str) -> QuackClass:
+        node = self.find_class(class_name)
+        assert node is not None, f"{class_name} is not in the class hierarchy"
+        return node
 
     def get_path_to_subclass(self, class_name: str) -> List[str]:
-        ret = []
-        assert(self.get_path_to_subclass_helper(self, class_name, ret))
-        # self.get_path_to_subclass_helper(self, class_name, ret)
-        return ret
+        """Names of the classes from Obj down to class_name. The list is cached; don't modify it"""
+        return self.find_indexed_class(class_name).path
 
     def find_LCA(self, class_name_1: str, class_name_2: str) -> str:
         # None is the bottom type so...
@@ -51,34 +115,101 @@ class RootObjClass(QuackClass):
             return class_name_2
         if not class_name_2:
             return class_name_1
-        path_to_class_1 = self.get_path_to_subclass(class_name_1)
-        path_to_class_2 = self.get_path_to_subclass(class_name_2)
-
-        # print(path_to_class_1)
-        # print(path_to_class_2)
-        last_common_index = -1
-        for index, (i, j) in enumerate(zip(path_to_class_1, path_to_class_2)):
-            if i == j:
-                last_common_index += 1
-            else:
-                break
-        return path_to_class_1[last_common_index]
+        key = (class_name_1, class_name_2) if class_name_1 <= class_name_2 else (class_name_2, class_name_1)
+        lca = self.lca_cache.get(key)
+        if lca is None:
+            lca = self.lca_cache[key] = self.find_LCA_node(self.find_indexed_class(class_name_1),
+                                                           self.find_indexed_class(class_name_2)).class_name
+        return lca
+
+    @staticmethod
+    def find_LCA_node(node_1: QuackClass, node_2: QuackClass) -> QuackClass:
+        """Least common ancestor by binary lifting, O(log depth)"""
+        if node_1.depth < node_2.depth:
+            node_1, node_2 = node_2, node_1
+        # Lift the deeper class to the depth of the other
+        steps, k = node_1.depth - node_2.depth, 0
+        while steps:
+            if steps & 1:
+                node_1 = node_1.lift[k]
+            steps >>= 1
+            k += 1
+        if node_1 is node_2:
+            return node_1
+        # Then lift both as far as they stay apart; their parents are the LCA
+        for k in reversed(range(len(node_1.lift))):
+            if k < len(node_1.lift) and node_1.lift[k] is not node_2.lift[k]:
+                node_1 = node_1.lift[k]
+                node_2 = node_2.lift[k]
+        return node_1.parent
+
+    def visible_classes(self, names: Iterable[str]) -> Set[str]:
+        """The classes named, and the classes named by their interfaces, transitively.
+        Looking them up loads those the class loader has and the hierarchy has not.
+        """
+        visible: Set[str] = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name in visible:
+                continue
+            visible.add(name)
+            quack_class = self.find_class(name)
+            if quack_class is None:
+                continue
+            stack.append(quack_class.super_class)
+            stack.extend(quack_class.fields_list.values())
+            for entry in quack_class.method_table.values():
+                stack.extend(entry.method.params)
+                stack.append(entry.method.ret)
+        return visible
+
+    def number_classes(self) -> None:
+        """Assign preorder intervals, visiting children in the order they were added.
+        The builtin classes are added first, so with no subclasses of the builtins
+        they are numbered Obj 0, Int 1, String 2, Nothing 3, Boolean 4, as the VM's
+        builtin classes are (see builtins.c).  Done once, when every class of the
+        program is in the hierarchy: the intervals go into object files, so adding
+        a class afterwards is an error rather than a reason to renumber.
+        """
+        assert not self.numbered, "The classes are numbered already"
+        counter = 0
+        stack: List[Tuple[QuackClass, bool]] = [(self, False)]
+        while stack:
+            node, done = stack.pop()
+            if done:
+                node.last = counter - 1
+                continue
+            node.pre = counter
+            counter += 1
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+        self.numbered = True
+
+    def get_interval(self, class_name: str) -> Tuple[int, int]:
+        """(pre, last) of a class; its subclasses are numbered pre..last"""
+        assert self.numbered, "The classes are not numbered yet"
+        node = self.find_indexed_class(class_name)
+        return node.pre, node.last
+
+    def is_subclass(self, class_name: str, super_class_name: str) -> bool:
+        """Whether class_name is super_class_name or one of its descendants"""
+        node = self.find_indexed_class(class_name)
+        super_node = self.find_indexed_class(super_class_name)
+        if not self.numbered:
+            # Classes are still being added: look for super_node on the path to node
+            return node.depth >= super_node.depth and node.path[super_node.depth] == super_class_name
+        return super_node.pre <= node.pre <= super_node.last
 
     # Make sure that type 'actual_class' can be assigned to 'expected_class'
     def is_legal_assignment(self, expected_class: str, actual_class: str) -> bool:
-        path_to_expected_class = self.get_path_to_subclass(expected_class)
-        path_to_actual_class = self.get_path_to_subclass(actual_class)
-
-        # Return if path_to_actual_class starts with path_to_expected_class. In other words, if actual_class is a subclass of expected_class
-        return path_to_actual_class[:len(path_to_expected_class)] == path_to_expected_class
+        # In other words, if actual_class is a subclass of expected_class
+        return self.is_subclass(actual_class, expected_class)
 
     # Make sure that type 'actual_class' can be assigned to 'expected_class'
     def is_legal_argument_for_overriding_class(self, actual_argument_class: str, superclass_argument_class: str) -> bool:
-        path_to_actual_class = self.get_path_to_subclass(actual_argument_class)
-        path_to_superclass_class = self.get_path_to_subclass(superclass_argument_class)
-
-        # Return if path_to_actual_class starts with path_to_expected_class. In other words, if superclass_class is a subclass of actual_class
-        return path_to_superclass_class[:len(path_to_actual_class)] == path_to_actual_class
+        # In other words, if superclass_class is a subclass of actual_class
+        return self.is_subclass(superclass_argument_class, actual_argument_class)
 
     def is_legal_invocation(self, class_name: str, method_name: str, passed_types: List[str]):
         class_entry = self.find_class(class_name)
@@ -86,12 +217,12 @@ class RootObjClass(QuackClass):
         if not class_entry:
             raise TypeError(f'Function call on {class_name} was made but {class_name} does not exist')
 
-        # Make sure this function exists
-        quackFunctionEntry = [entry for entry in class_entry.methods_list if entry.method_name == method_name]
-        if not quackFunctionEntry:
+        # Make sure this function exists in the class itself; constructors are not inherited
+        method_entry = class_entry.find_method(method_name)
+        if not method_entry or method_entry.defined_in != class_name:
             raise ValueError(f'Function call {method_name} on {class_name} was made but {method_name} is undefined for {class_name}')
 
-        expected_param_args = quackFunctionEntry[0].params
+        expected_param_args = method_entry.method.params
         # Make sure we got the right number of arguments
         if len(expected_param_args) != len(passed_types):
             raise SyntaxError(f'Function call {method_name} on {class_name} expected {len(expected_param_args)} arguments but received {len(passed_types)}')
@@ -102,45 +233,88 @@ class RootObjClass(QuackClass):
                 raise SyntaxError(f'Function call {method_name} on {class_name} expected {expected} on argument number {index} but received {actual}')
 
 
-    def find_class_helper(self, cur_node: QuackClass, class_name: str) -> Union[QuackClass, None]:
-        if cur_node.class_name == class_name:
-            return cur_node
-
-        child_res = [self.find_class_helper(child, class_name) for child in cur_node.children]
-        if any(child_res):
-            return next(item for item in child_res if item)
-
-        return None
-
-    def find_class(self, class_name: str) -> QuackClass:
-        return self.find_class_helper(self, class_name)
-
-
-    def add_class_to_hierarchy_helper(self, cur_node: QuackClass, node_to_add: QuackClass) -> None:
-        if node_to_add.super_class == cur_node.class_name:
-            cur_node.children.append(node_to_add)
-        else:
-            for child in cur_node.children:
-                self.add_class_to_hierarchy_helper(child, node_to_add)
+    def find_class(self, class_name: str) -> Optional[QuackClass]:
+        node = self.classes.get(class_name)
+        if node is None and self.class_loader is not None:
+            node = self.load_class(class_name)
+        return node
+
+    def load_class(self, class_name: str) -> Optional[QuackClass]:
+        """Add a class from the class loader, after its superclasses"""
+        if class_name in self.loading:
+            return None
+        node = self.class_loader(class_name)
+        if node is None:
+            return None
+        self.loading.add(class_name)
+        try:
+            if self.find_class(node.super_class) is None:
+                return None
+        finally:
+            self.loading.discard(class_name)
+        HIERARCHY.info('Loaded the interface of %s', class_name)
+        self.add_class_to_hierarchy(node)
+        return self.classes.get(class_name)
 
     def add_class_to_hierarchy(self, node_to_add: QuackClass) -> None:
-        self.add_class_to_hierarchy_helper(self, node_to_add)
-
-def pretty_helper(node: QuackClass, level: int, indent_str: str):
-    # print(node)
-    # print(node.children)
-    if len(node.children) == 0:
-        return [indent_str*level, node.class_name, '\n']
-
-    l = [indent_str*level, node.class_name, '\n']
-    # print(l)
-    for n in node.children:
-        l += pretty_helper(n, level+1, indent_str)
-
+        assert not self.numbered, f"{node_to_add.class_name} added after the classes were numbered"
+        parent = self.classes.get(node_to_add.super_class)
+        # A class whose superclass is not in the hierarchy is left out of it
+        if parent is None:
+            return
+        node_to_add.parent = parent
+        node_to_add.inherit_methods(parent)
+        node_to_add.depth = parent.depth + 1
+        node_to_add.path = parent.path + [node_to_add.class_name]
+        node_to_add.lift = [parent]
+        while len(node_to_add.lift[-1].lift) >= len(node_to_add.lift):
+            node_to_add.lift.append(node_to_add.lift[-1].lift[len(node_to_add.lift) - 1])
+        parent.children.append(node_to_add)
+        # If a class is defined twice, lookups find the first definition
+        self.classes.setdefault(node_to_add.class_name, node_to_add)
+        self.lca_cache.clear()
+
+def write_interface(quack_class: QuackClass, path: pathlib.Path) -> None:
+    """Write the typed interface of a class: its superclass, field types and
+    method signatures, in one line of JSON
+    """
+    write_atomically(path, json.dumps(quack_class.interface(), separators=(',', ':')) + '\n')
+
+
+def read_interface(path: pathlib.Path) -> QuackClass:
+    with open(path) as f:
+        interface = json.load(f)
+    methods_list = [QuackClassMethod(name, params, ret) for name, params, ret in interface['methods']]
+    return QuackClass(interface['class_name'], interface['super'], methods_list, interface['fields'])
+
+
+def interface_loader(directory: pathlib.Path, exclude: Collection[str] = ()) -> Callable[[str], Optional[QuackClass]]:
+    """Class loader (see RootObjClass.class_loader) reading <directory>/<class>.qki.
+    Classes in exclude (those of the program being compiled) are never loaded.
+    """
+    def load(class_name: str) -> Optional[QuackClass]:
+        path = directory.joinpath(class_name + '.qki')
+        if class_name in exclude or not path.exists():
+            return None
+        return read_interface(path)
+    return load
+
+
+def pretty_helper(node: QuackClass, level: int, indent_str: str) -> List[str]:
+    # An explicit stack, so deep hierarchies do not need deep recursion
+    l = []
+    stack = [(node, level)]
+    while stack:
+        node, level = stack.pop()
+        l += [indent_str*level, node.class_name, '\n']
+        stack.extend((child, level+1) for child in reversed(node.children))
     return l
 
+def pretty_format(RootNode: QuackClass) -> str:
+    return ''.join(pretty_helper(RootNode, 0, '  '))
+
 def pretty_print(RootNode: QuackClass):
-    print(''.join(pretty_helper(RootNode, 0, '  ')))
+    print(pretty_format(RootNode))
 
 
 
@@ -168,6 +342,62 @@ def parse_builtin_classes(path_to_json: str) -> QuackClass:
     return root_node
 
 
+# Snapshots of the builtin hierarchy live with the serialized parser tables.
+# Bump SNAPSHOT_VERSION when the pickled classes change shape in a way the
+# hash of this file would not catch.
+SNAPSHOT_DIR = pathlib.Path(__file__).resolve().parent / '__quackcache__'
+SNAPSHOT_VERSION = 1
+
+# Snapshots already read by this process (the compile server, a REPL) by path
+_snapshots: Dict[pathlib.Path, bytes] = {}
+
+
+def builtin_snapshot_path(path_to_json: str) -> pathlib.Path:
+    """Snapshot file for a builtin class description.  Its name hashes the description,
+    this module and SNAPSHOT_VERSION, so editing either makes a new snapshot.
+    """
+    digest = hashlib.sha256(str(SNAPSHOT_VERSION).encode('utf-8'))
+    digest.update(pathlib.Path(__file__).read_bytes())
+    digest.update(pathlib.Path(path_to_json).read_bytes())
+    return SNAPSHOT_DIR / f'builtins_{digest.hexdigest()[:16]}.pickle'
+
+
+def build_builtin_snapshot(path_to_json: str) -> bytes:
+    """Parse the builtin classes and save the snapshot, replacing older ones.  Programs
+    add their classes to it, so it is not numbered yet.
+    """
+    root_node = parse_builtin_classes(path_to_json)
+    snapshot = pickle.dumps(root_node, protocol=pickle.HIGHEST_PROTOCOL)
+    path = builtin_snapshot_path(path_to_json)
+    try:
+        SNAPSHOT_DIR.mkdir(exist_ok=True)
+        # Other compilers may be loading the current snapshot; only older ones go
+        for stale_snapshot in SNAPSHOT_DIR.glob('builtins_*.pickle'):
+            if stale_snapshot != path:
+                stale_snapshot.unlink(missing_ok=True)
+        # A concurrent compile never reads half a snapshot
+        write_atomically(path, snapshot)
+    except OSError:
+        # Read-only checkout or similar; the snapshot still serves this process
+        pass
+    return snapshot
+
+
+def load_builtin_classes(path_to_json: str) -> RootObjClass:
+    """A fresh copy of the builtin class hierarchy (as parse_builtin_classes builds it),
+    loaded from its snapshot, which is built first if it is missing or out of date
+    """
+    path = builtin_snapshot_path(path_to_json)
+    snapshot = _snapshots.get(path)
+    if snapshot is None:
+        try:
+            snapshot = path.read_bytes()
+        except OSError:
+            snapshot = build_builtin_snapshot(path_to_json)
+        _snapshots[path] = snapshot
+    return pickle.loads(snapshot)
+
+
 
 if __name__ == "__main__":
     root = parse_builtin_classes('../builtinclass.json')
@@ -0,0 +1,111 @@
+"""Dead code elimination of checked ASTs.
+
+Code generation emits every statement it is given: statements after a
+return, both branches of an if whose condition is a literal (as
+folding.py leaves 1 < 2) or a typecase test for Obj, which every value
+passes, the loop of a while false, and the
+const nothing; return a method ends with even when every path through
+it has returned.  eliminate_dead_code() drops such statements and
+branches before code generation, so their code and labels are never
+emitted, and records on each method whether control can reach its end.
+A method that can reach its end returns nothing there, so one declared
+to return anything but Nothing or Obj is a type error.
+
+A statement completes if control can go on to the statement after it:
+a return does not, an if does if either branch does, a while true loop
+does not (Quack has no break), and a block does if all its statements
+do.  Dropped code has been checked, so dropping it hides no errors, and
+the variables it assigns stay in the method's locals.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from AST_Classes import (ASTNode, BareStatementBlockNode, BoolNode, ClassMethodNode,
+                         ConstructorStatementBlockNode, IfNode, IsInstanceNode, ReturnStatementNode,
+                         RexpNode, StatementBlockNode, VarReferenceNode, WhileNode)
+
+BLOCKS = (StatementBlockNode, ConstructorStatementBlockNode, BareStatementBlockNode)
+
+
+def literal_condition(condition: ASTNode) -> Optional[bool]:
+    """The value of a condition that is a Boolean literal, or None"""
+    while isinstance(condition, RexpNode):
+        condition = condition.children[0]
+    if isinstance(condition, BoolNode):
+        return condition.value == "true"
+    # The test of a typecase alternative for Obj, on the variable holding its value
+    if (isinstance(condition, IsInstanceNode) and condition.target_class == "Obj"
+            and isinstance(condition.children[0], VarReferenceNode)):
+        return True
+    return None
+
+
+def taken_branch(node: ASTNode) -> Optional[ASTNode]:
+    """What an if or while with a literal condition amounts to, or None"""
+    if isinstance(node, IfNode):
+        condition = literal_condition(node.children[0])
+        if condition is None:
+            return None
+        if condition:
+            return node.children[1]
+        return node.children[2] if len(node.children) == 3 else StatementBlockNode([])
+    if isinstance(node, WhileNode) and literal_condition(node.children[0]) is False:
+        return StatementBlockNode([])
+    return None
+
+
+def node_completes(node: ASTNode, completes: Dict[int, bool]) -> bool:
+    """Whether control goes on after node, given whether its children do (by id)"""
+    if isinstance(node, ReturnStatementNode):
+        return False
+    if isinstance(node, IfNode):
+        return len(node.children) == 2 or completes[id(node.children[1])] or completes[id(node.children[2])]
+    if isinstance(node, WhileNode):
+        return literal_condition(node.children[0]) is not True
+    if isinstance(node, BLOCKS):
+        return all(completes[id(statement)] for statement in node.children)
+    return True
+
+
+def eliminate_dead_code(node: ASTNode) -> int:
+    """Drop the unreachable statements and untaken branches under node in place, and
+    set falls_through on its methods.  Returns how many statements and branches were
+    dropped.  Raises TypeError for a method that may end without returning the type
+    it is declared to return.
+    """
+    dropped = 0
+    # By id, as some nodes define __eq__ and are not hashable
+    completes: Dict[int, bool] = {}
+    # The nodes dropped, kept alive so that new nodes do not reuse their ids
+    removed: List[ASTNode] = []
+    # Each node is on the stack twice: to visit its children, then to prune them
+    stack: List[Tuple[ASTNode, bool]] = [(node, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children if child)
+            continue
+        for index, child in enumerate(node.children):
+            if not child:
+                continue
+            branch = taken_branch(child)
+            if branch is not None:
+                completes.setdefault(id(branch), True)
+                removed.append(child)
+                node.children[index] = branch
+                dropped += 1
+        if isinstance(node, BLOCKS):
+            for index, statement in enumerate(node.children):
+                if not completes[id(statement)]:
+                    removed += node.children[index + 1:]
+                    dropped += len(node.children) - index - 1
+                    del node.children[index + 1:]
+                    break
+        completes[id(node)] = node_completes(node, completes)
+        if isinstance(node, ClassMethodNode):
+            node.falls_through = completes[id(node.children[1])]
+            # As ClassMethodNode.type_eval does for a method with no return at all
+            if node.falls_through and node.ret_type not in ("Nothing", "Obj"):
+                raise TypeError(f"Method {node.method_name} may end without a return, "
+                                f"but is declared to return {node.ret_type}")
+    return dropped
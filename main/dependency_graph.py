@@ -1,27 +1,75 @@
 from collections import defaultdict
+import heapq
+from typing import Dict, Hashable, List
+
+
+class CycleError(ValueError):
+    """The graph has a cycle, so it has no topological order"""
+    def __init__(self, cycle: List[Hashable]):
+        super().__init__(' -> '.join(str(vertex) for vertex in cycle))
+        # The vertices on the cycle, with the first one repeated at the end
+        self.cycle = cycle
+
 
 class Dependency_Graph:
     def __init__(self):
-        self.graph = defaultdict(list)
+        # Vertices in the order they were first seen (dicts keep insertion order)
+        self.graph: Dict[Hashable, List[Hashable]] = defaultdict(list)
 
-    def addEdge(self, vertex, incident_vertex):
-        self.graph[vertex].append(incident_vertex)
+    def addVertex(self, vertex) -> None:
+        self.graph[vertex]
 
-    def topologicalSort(self):
-        def helper(v, visited, stack):
-            visited.append(v)
+    def addEdge(self, vertex, incident_vertex) -> None:
+        """vertex must come before incident_vertex"""
+        self.graph[vertex].append(incident_vertex)
+        self.graph[incident_vertex]
 
-            for i in self.graph[v]:
-                if i not in visited:
-                    helper(i, visited, stack)
+    def topologicalSort(self) -> List[Hashable]:
+        """Order the vertices so that every edge goes forward, by Kahn's algorithm.
+        Of the vertices that are ready, the one added first goes next, so vertices
+        already in a valid order keep it.  O(E + V log V), without recursion.
+        Raises CycleError naming a cycle if there is one.
+        """
+        position = {vertex: index for index, vertex in enumerate(self.graph)}
+        in_degree = dict.fromkeys(self.graph, 0)
+        for incident_vertices in self.graph.values():
+            for incident_vertex in incident_vertices:
+                in_degree[incident_vertex] += 1
 
-            stack.insert(0, v)
+        # Heap of (position, vertex); positions are unique, so vertices are never compared
+        ready = [(position[vertex], vertex) for vertex, degree in in_degree.items() if degree == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, vertex = heapq.heappop(ready)
+            order.append(vertex)
+            for incident_vertex in self.graph[vertex]:
+                in_degree[incident_vertex] -= 1
+                if in_degree[incident_vertex] == 0:
+                    heapq.heappush(ready, (position[incident_vertex], incident_vertex))
 
-        visited = []
-        stack = []
+        if len(order) < len(in_degree):
+            raise CycleError(self.find_cycle([vertex for vertex, degree in in_degree.items() if degree > 0]))
+        return order
 
-        for k in list(self.graph):
-            if k not in visited:
-                helper(k, visited, stack)
+    def find_cycle(self, unordered: List[Hashable]) -> List[Hashable]:
+        """A cycle among the vertices Kahn's algorithm could not order.  Each of them
+        has a predecessor among them, so walking predecessors must come back around.
+        """
+        remaining = set(unordered)
+        predecessor = {}
+        for vertex in unordered:
+            for incident_vertex in self.graph[vertex]:
+                if incident_vertex in remaining:
+                    predecessor.setdefault(incident_vertex, vertex)
 
-        return stack
+        seen = {}
+        walk = []
+        vertex = unordered[0]
+        while vertex not in seen:
+            seen[vertex] = len(walk)
+            walk.append(vertex)
+            vertex = predecessor[vertex]
+        # Reverse the walk so the cycle follows the edges
+        cycle = walk[seen[vertex]:][::-1]
+        return cycle + [cycle[0]]
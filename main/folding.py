@@ -0,0 +1,130 @@
+"""Constant folding of checked ASTs.
+
+The parser turns operators into method calls: 1 + 2 * 3 is
+1.PLUS(2.TIMES(3)) and -x is 0.MINUS(x).  When the receiver and the
+argument are both literals, the vm would call the builtin method and
+box its result on every evaluation.  fold_constants() evaluates such
+calls once, as the builtins in builtins.c would, and replaces them by
+the literal result, which then goes into the constant pool like any
+other literal.  not, and and or of Boolean literals are folded too.
+
+Folding runs after type checking, so it does not hide type errors, and
+leaves alone what the vm would not compute the same way: Int results
+outside of a C int, division by zero and string escapes.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+from AST_Classes import ASTNode, AndNode, BoolNode, ConstNode, MethodcallNode, NotNode, OrNode
+from assemble import StrConst
+
+INT_MIN = -2 ** 31
+INT_MAX = 2 ** 31 - 1
+
+
+def divide(a: int, b: int) -> Optional[int]:
+    """C integer division, which truncates towards zero"""
+    if b == 0:
+        return None
+    quotient = abs(a) // abs(b)
+    return -quotient if (a < 0) != (b < 0) else quotient
+
+
+INT_METHODS: Dict[str, Callable[[int, int], object]] = {
+    "PLUS": lambda a, b: a + b,
+    "MINUS": lambda a, b: a - b,
+    "TIMES": lambda a, b: a * b,
+    "DIVIDE": divide,
+    "EQUALS": lambda a, b: a == b,
+    "LESS": lambda a, b: a < b,
+    "MORE": lambda a, b: a > b,
+    "ATLEAST": lambda a, b: a >= b,
+    "ATMOST": lambda a, b: a <= b,
+}
+
+# String comparisons are strcmp on the UTF-8 bytes
+STRING_COMPARISONS: Dict[str, Callable[[bytes, bytes], bool]] = {
+    "EQUALS": lambda a, b: a == b,
+    "LESS": lambda a, b: a < b,
+    "MORE": lambda a, b: a > b,
+    "ATLEAST": lambda a, b: a >= b,
+    "ATMOST": lambda a, b: a <= b,
+}
+
+
+def literal(value) -> Optional[ASTNode]:
+    """The literal node for the result of a builtin method, if the vm would get the same"""
+    if isinstance(value, bool):
+        return BoolNode("true" if value else "false")
+    if isinstance(value, int) and INT_MIN <= value <= INT_MAX:
+        return ConstNode(value, 'Int')
+    return None
+
+
+def fold_int_call(m_name: str, a: int, b: int) -> Optional[ASTNode]:
+    if m_name not in INT_METHODS or not (INT_MIN <= a <= INT_MAX and INT_MIN <= b <= INT_MAX):
+        return None
+    return literal(INT_METHODS[m_name](a, b))
+
+
+def fold_string_call(m_name: str, a: str, b: str) -> Optional[ASTNode]:
+    """a and b are the literals as written, quotes included"""
+    if m_name == "PLUS":
+        # Escapes could combine across the two literals
+        if "\\" in a or "\\" in b:
+            return None
+        return ConstNode(a[:-1] + b[1:], 'String')
+    if m_name in STRING_COMPARISONS:
+        a_text, b_text = StrConst.from_literal(a).value, StrConst.from_literal(b).value
+        # The vm's strings end at a NUL
+        if "\0" in a_text or "\0" in b_text:
+            return None
+        return literal(STRING_COMPARISONS[m_name](a_text.encode("utf-8"), b_text.encode("utf-8")))
+    return None
+
+
+def fold(node: ASTNode) -> Optional[ASTNode]:
+    """The literal a node evaluates to, if its operands are literals and it can be folded"""
+    if isinstance(node, MethodcallNode):
+        caller, methodargs = node.children
+        if not isinstance(caller, ConstNode) or not methodargs or len(methodargs.children) != 1:
+            return None
+        argument = methodargs.children[0]
+        if not isinstance(argument, ConstNode) or argument.value_type != caller.value_type:
+            return None
+        if caller.value_type == 'Int':
+            return fold_int_call(node.m_name, caller.value, argument.value)
+        return fold_string_call(node.m_name, caller.value, argument.value)
+    if isinstance(node, NotNode):
+        operand = node.children[0]
+        if isinstance(operand, BoolNode):
+            return literal(operand.value != "true")
+    elif isinstance(node, (AndNode, OrNode)):
+        left, right = node.children
+        if isinstance(left, BoolNode) and isinstance(right, BoolNode):
+            if isinstance(node, AndNode):
+                return literal(left.value == "true" and right.value == "true")
+            return literal(left.value == "true" or right.value == "true")
+    return None
+
+
+def fold_constants(node: ASTNode) -> int:
+    """Fold the constant expressions under node (not node itself) in place, innermost
+    first, so that folded operands fold their parents too.  Returns how many were folded.
+    """
+    folded = 0
+    # Each node is on the stack twice: to visit its children, then to fold them
+    stack: List[Tuple[ASTNode, bool]] = [(node, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children if child)
+            continue
+        for index, child in enumerate(node.children):
+            if not child:
+                continue
+            result = fold(child)
+            if result is not None:
+                node.children[index] = result
+                folded += 1
+    return folded
@@ -0,0 +1,178 @@
+"""Incremental compilation for quackc.
+
+Each class of a program gets a fingerprint: a hash of its AST (so layout
+and comments don't count), of its own interface and of the interfaces
+of every class it can see through its code.  Interfaces are superclass,
+fields and the flattened method table.  The visible classes are the
+ones the class names, closed over the classes their interfaces name,
+which includes every superclass.  A change to a class's signature
+therefore changes the fingerprints of its subclasses and of every class
+that uses it.  A class's preorder interval is in its own fingerprint
+only: its object file is the only one that records it, so adding a
+class rebuilds the classes numbered after it, but not their dependents.
+
+quackc keeps the fingerprints of a program's classes, with a hash of
+each object file it wrote, in a manifest next to the object files.  A
+class whose fingerprint and object file still match is not checked past
+its declaration, and gets no code generation or assembly.  The manifest
+also records a hash of the compiler itself, the builtin classes and the
+peephole rules enabled; if any of them changes, everything is rebuilt.
+"""
+import hashlib
+import json
+import pathlib
+from typing import Dict, Iterator, Set, Tuple
+
+import class_hierarchy
+import peephole
+from atomic import write_atomically
+from AST_Classes import ASTNode, ClassNode, referenced_classes
+
+MANIFEST_VERSION = 1
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def toolchain_fingerprint(builtinclass_json: str) -> str:
+    """Hash of the compiler and assembler sources, the builtin class description and
+    the peephole rules enabled"""
+    digest = hashlib.sha256()
+    digest.update(",".join(peephole.enabled).encode("utf-8"))
+    sources = sorted(ROOT.joinpath("main").glob("*.py")) + [ROOT / "assemble.py", ROOT / "opdefs.txt",
+                                                          pathlib.Path(builtinclass_json)]
+    for source in sources:
+        digest.update(source.name.encode("utf-8"))
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+def syntax_fingerprint(node: ASTNode) -> str:
+    """Hash of an AST as the parser built it: the node types, their names and
+    literal values, and their shape.  Call it before checking the program, which
+    adds types and variable lists to the nodes.
+    """
+    digest = hashlib.sha256()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            digest.update(b"None;")
+            continue
+        attributes = sorted((name, value) for name, value in node_attributes(node)
+                            if name != "children" and is_literal(value))
+        digest.update(repr((type(node).__name__, attributes, len(node.children))).encode("utf-8"))
+        stack.extend(reversed(node.children))
+    return digest.hexdigest()
+
+
+def node_attributes(node: ASTNode) -> Iterator[Tuple[str, object]]:
+    """The attributes of a node and their values (nodes have __slots__, not a __dict__)"""
+    for node_class in type(node).__mro__:
+        for name in node_class.__dict__.get("__slots__", ()):
+            if hasattr(node, name):
+                yield name, getattr(node, name)
+
+
+def is_literal(value) -> bool:
+    if isinstance(value, (list, tuple)):
+        return all(isinstance(item, (str, int, bool)) for item in value)
+    return isinstance(value, (str, int, bool))
+
+
+def syntax_fingerprints(program: ASTNode, main_class: str) -> Dict[str, str]:
+    """syntax_fingerprint of each class of a parsed program (the RootNode), and of
+    its statements as main_class
+    """
+    *class_list, bare_statement_block = program.children[0].children
+    fingerprints = {main_class: syntax_fingerprint(bare_statement_block)}
+    for class_node in class_list:
+        fingerprints.setdefault(class_node.children[0].class_name, syntax_fingerprint(class_node))
+    return fingerprints
+
+
+def interface(quack_class: class_hierarchy.QuackClass) -> str:
+    entries = sorted((name, entry.method.params, entry.method.ret, entry.defined_in, entry.slot)
+                     for name, entry in quack_class.method_table.items())
+    return repr((quack_class.class_name, quack_class.super_class, sorted(quack_class.fields_list.items()),
+                 entries))
+
+
+def class_fingerprint(class_name: str, node: ASTNode, syntax: str,
+                      hierarchy: class_hierarchy.RootObjClass) -> str:
+    """Fingerprint of a class (a ClassNode, or the statements of the main class) whose AST
+    hashed to syntax, once every class of the program is in the hierarchy
+    """
+    names = referenced_classes(node)
+    if isinstance(node, ClassNode):
+        names.add(class_name)
+        for method in node.children[2].children:
+            names.update(method.children[0].arg_types)
+            names.add(method.ret_type)
+    digest = hashlib.sha256()
+    digest.update(repr((class_name, syntax)).encode("utf-8"))
+    if isinstance(node, ClassNode):
+        # The object file's .interval
+        digest.update(repr(hierarchy.get_interval(class_name)).encode("utf-8"))
+    for name in sorted(hierarchy.visible_classes(names)):
+        quack_class = hierarchy.find_class(name)
+        digest.update((interface(quack_class) if quack_class else repr(name)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def object_fingerprint(object_text: str) -> str:
+    return hashlib.sha256(object_text.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """Fingerprints of the classes of one program, and of the object files written for them"""
+    def __init__(self, path: pathlib.Path, toolchain: str):
+        self.path = path
+        self.toolchain = toolchain
+        # class name -> {"fingerprint": ..., "object": ...}
+        self.classes: Dict[str, Dict[str, str]] = {}
+        # Fingerprints of the classes of the program being compiled, by class name
+        self.pending: Dict[str, str] = {}
+
+    @classmethod
+    def load(cls, path: pathlib.Path, toolchain: str) -> "Manifest":
+        """The manifest at path, or an empty one if there is none or it was written
+        by another version of the compiler
+        """
+        manifest = cls(path, toolchain)
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+        if saved.get("version") == MANIFEST_VERSION and saved.get("toolchain") == toolchain:
+            manifest.classes = saved.get("classes", {})
+        return manifest
+
+    def up_to_date(self, class_name: str, fingerprint: str, object_path: pathlib.Path) -> bool:
+        entry = self.classes.get(class_name)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return False
+        try:
+            object_text = object_path.read_text()
+        except OSError:
+            return False
+        # Another program may have written a class of the same name since
+        return entry["object"] == object_fingerprint(object_text)
+
+    def check(self, class_name: str, fingerprint: str, object_path: pathlib.Path) -> bool:
+        """Note the fingerprint of a class of the program, and whether it is up to date"""
+        self.pending[class_name] = fingerprint
+        return self.up_to_date(class_name, fingerprint, object_path)
+
+    def update(self, written: Dict[str, str]) -> None:
+        """Record the pending fingerprints of the classes whose object files were just
+        written (class name -> object file text), and forget classes no longer in the program
+        """
+        for class_name, object_text in written.items():
+            self.classes[class_name] = {"fingerprint": self.pending[class_name],
+                                        "object": object_fingerprint(object_text)}
+        self.classes = {name: entry for name, entry in self.classes.items() if name in self.pending}
+
+    def save(self) -> None:
+        write_atomically(self.path, json.dumps({"version": MANIFEST_VERSION, "toolchain": self.toolchain,
+                                                "classes": self.classes}, indent=4))
@@ -1,11 +1,30 @@
 import sys
-from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, Union
+import argparse
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Type, Union
+import lark
 from lark import Lark, Transformer, v_args, Visitor, Tree, Token
 from lark.tree import pydot__tree_to_png
 from dataclasses import dataclass
 
 import class_hierarchy
+from atomic import write_atomically
+import tracing
+from tracing import PARSE, CODEGEN, PEEPHOLE
 from AST_Classes import *
+from traversal import run
+from folding import fold_constants
+from dead_code import eliminate_dead_code
+import assemble
+import peephole
+
+# Local variable holding the value a typecase tests. Quack identifiers cannot start
+# with $, so it is no program's variable; nested typecases can share it, as the
+# alternatives only read it before their statements run
+TYPECASE_TEMP = '$typecase'
 
 quack_grammar = """
     ?start: program -> root
@@ -148,62 +167,97 @@ quack_grammar = """
     #     | lexp              -> var_reference
     #     | "(" sum ")"
 
+# Building the LALR tables for quack_grammar is the slowest part of starting the
+# compiler, so they are serialized once per grammar version and reloaded from here.
+PARSER_CACHE_DIR = Path(__file__).resolve().parent / '__quackcache__'
+
+
+def grammar_fingerprint() -> str:
+    """Short hash identifying quack_grammar and the Lark version that builds its tables"""
+    return hashlib.sha256((quack_grammar + lark.__version__).encode('utf-8')).hexdigest()[:16]
+
+
+def parser_cache_path() -> Path:
+    return PARSER_CACHE_DIR / f'quack_lalr_{grammar_fingerprint()}.lark'
+
+
+def build_parser_cache() -> Path:
+    """Regenerate the serialized parser for the current grammar and drop tables left by older grammars.
+    Other compilers may be loading the current tables meanwhile, so they are replaced atomically,
+    never deleted.
+    """
+    cache_path = parser_cache_path()
+    PARSER_CACHE_DIR.mkdir(exist_ok=True)
+    for stale_cache in PARSER_CACHE_DIR.glob('quack_lalr_*.lark'):
+        if stale_cache != cache_path:
+            stale_cache.unlink(missing_ok=True)
+    # Lark writes its cache file in place, so it writes one of this process's own first
+    scratch_path = cache_path.with_name(f'{cache_path.name}.{os.getpid()}.build')
+    try:
+        Lark(quack_grammar, parser='lalr', cache=str(scratch_path))
+        write_atomically(cache_path, scratch_path.read_bytes())
+    finally:
+        scratch_path.unlink(missing_ok=True)
+    return cache_path
+
+
+def make_quack_parser(transformer: Optional[Transformer] = None) -> Lark:
+    """LALR parser for quack_grammar, loaded from the serialized tables when they are up to date.
+    With a transformer, its callbacks run as each rule is reduced and parse() returns their result
+    instead of a parse tree.
+    """
+    cache_path = parser_cache_path()
+    try:
+        if not cache_path.exists():
+            build_parser_cache()
+    except OSError:
+        # Read-only checkout or similar; just build the tables in memory
+        return Lark(quack_grammar, parser='lalr', transformer=transformer)
+    return Lark(quack_grammar, parser='lalr', transformer=transformer, cache=str(cache_path))
+
+
 # tc = None
 # var_dict: Dict[str, str] = {}
 
+_ast_parser: Optional[Lark] = None
+
+def ast_parser() -> Lark:
+    """The parser that builds ASTs, made once per process.
+    MakeAssemblyTree runs inside the LALR parser, so the source is parsed once and
+    the AST is built directly without materializing the parse tree. Its callbacks
+    keep no state between parses, so one instance serves every program.
+    """
+    global _ast_parser
+    if _ast_parser is None:
+        _ast_parser = make_quack_parser(MakeAssemblyTree())
+    return _ast_parser
+
+
 # class MakeAssemblyTree(Transformer):
 class MakeAssemblyTree(Transformer):
 
-    def __init__(self, file):
-        self.vars = {}
-        self.file = file
-        self.var_dict = {}
-        self.Input_output_dtypes_dict = {}
-        self.final_instr = []
-
-        # Functions to populate Input_output_dtypes:
-        # neg, add, sub, mul, div
-        # self.Input_output_dtypes_dict['neg'] = [Input_output_dtypes(['Int'], 'Int')]
-        # self.Input_output_dtypes_dict['add'] = [Input_output_dtypes(['Int', 'Int'], 'Int'),
-        #                                         Input_output_dtypes(['String', 'String'], 'String')]
-        # self.Input_output_dtypes_dict['sub'] = [Input_output_dtypes(['Int', 'Int'], 'Int')]
-        # self.Input_output_dtypes_dict['mul'] = [Input_output_dtypes(['Int', 'Int'], 'Int')]
-        # self.Input_output_dtypes_dict['div'] = [Input_output_dtypes(['Int', 'Int'], 'Int')]
-
-    def write_to_file(self):
-        with open(self.file, 'w') as file:
-            print(self.var_dict)
-            file.write('.class Main:Obj\n')
-            file.write('\n')
-            file.write('.method $constructor\n')
-            file.write(f'.local {",".join(self.var_dict.keys())}\n')
-            for line in self.final_instr:
-                file.write(line)
-            file.write('\thalt\n')
-            file.write('\treturn 0\n')
-
     def root(self, lst) -> ASTNode:
-        print(f'In number {lst}')
+        PARSE.debug('In number %s', lst)
         return RootNode(lst[0])
 
     def number(self, lst) -> ASTNode:
-        print(f'In number {lst}')
+        PARSE.debug('In number %s', lst)
         return ConstNode(int(lst[0]), 'Int')
 
     def string(self, lst) -> ASTNode:
-        print(f'In string {lst}')
+        PARSE.debug('In string %s', lst)
         return ConstNode(str(lst[0]), 'String')
 
     def true(self, lst) -> ASTNode:
-        print(f'In true {lst}')
+        PARSE.debug('In true %s', lst)
         return BoolNode("true")
 
     def false(self, lst) -> ASTNode:
-        print(f'In true {lst}')
+        PARSE.debug('In true %s', lst)
         return BoolNode("false")
 
     def nothing(self, lst) -> ASTNode:
-        print(f'In nothing {lst}')
+        PARSE.debug('In nothing %s', lst)
         return NothingNode()
 
     def methodcall(self, lst) -> ASTNode:
@@ -215,22 +269,22 @@ class MakeAssemblyTree(Transformer):
         return MethodcallNode(caller, m_name.value, methodargs)
 
     def statement(self, lst) -> ASTNode:
-        print(f'In statement {lst}')
+        PARSE.debug('In statement %s', lst)
         return StatementNode(lst[0])
 
     def statement_block(self, lst) -> ASTNode:
         # breakpoint()
-        print(f'In statement_block {lst}')
+        PARSE.debug('In statement_block %s', lst)
         return StatementBlockNode(lst)
 
     def constructor_statement_block(self, lst) -> ASTNode:
         # breakpoint()
-        print(f'In constructor statement_block {lst}')
+        PARSE.debug('In constructor statement_block %s', lst)
         return ConstructorStatementBlockNode(lst)
 
     def method_block(self, lst) -> ASTNode:
         # breakpoint()
-        print(f'In method {lst}')
+        PARSE.debug('In method %s', lst)
         return ClassMethodBlockNode(lst)
 
     # def methodargs_recur(self, lst) -> ASTNode:
@@ -239,16 +293,16 @@ class MakeAssemblyTree(Transformer):
     #     return MethodargsrecurNode(methodargs, constant)
 
     def methodargs(self, lst) -> ASTNode:
-        print(f'In methodargs {lst}')
+        PARSE.debug('In methodargs %s', lst)
         return MethodargsNode(lst)
 
     def qclass(self, lst) -> ASTNode:
-        print(f'In class {lst}')
+        PARSE.debug('In class %s', lst)
         class_signature, constructor_statement_block, method_block = lst
         return ClassNode(class_signature, constructor_statement_block, method_block)
 
     def class_signature(self, lst) -> ASTNode:
-        print(f'In class signature {lst}')
+        PARSE.debug('In class signature %s', lst)
         class_name, formal_args, super_class = lst
         if super_class:
             super_class = super_class.value
@@ -256,11 +310,11 @@ class MakeAssemblyTree(Transformer):
         return ClassSignatureNode(class_name.value, formal_args, super_class)
 
     def formal_args(self, lst) -> ASTNode:
-        print(f'In formal args {lst}')
+        PARSE.debug('In formal args %s', lst)
         return FormalArgsNode([item.value for item in lst if item])
 
     def class_body(self, lst) -> ASTNode:
-        print(f'In class body {lst}')
+        PARSE.debug('In class body %s', lst)
         return ClassBodyNode([item for item in lst if isinstance(item, StatementNode)],
                              [item for item in lst if isinstance(item, ClassMethodNode)])
 
@@ -279,26 +333,25 @@ class MakeAssemblyTree(Transformer):
     def program(self, lst) -> ASTNode:
         class_list = [item for item in lst if isinstance(item, ClassNode)]
         statement_list = lst[len(class_list):]
-        print(f'In program {class_list}, {statement_list}')
+        PARSE.debug('In program %s, %s', class_list, statement_list)
         return ProgramNode(class_list, BareStatementBlockNode(statement_list))
 
     def assignment(self, lst) -> ASTNode:
         lexp, *var_type, rexp = lst
         var_type = var_type[0]
-        print(var_type)
         if var_type:
             var_type = var_type.value
-        print(f'In assignment lexp:{lexp}, type:{var_type}, rexp:{rexp}')
+        PARSE.debug('In assignment lexp:%s, type:%s, rexp:%s', lexp, var_type, rexp)
         return AssignmentNode(lexp, var_type, rexp)
 
     def ifstmt(self, lst) -> ASTNode:
         condpart, thenpart, elsepart = lst
-        print(f'In ifstmt {lst}')
+        PARSE.debug('In ifstmt %s', lst)
         return IfNode(condpart, thenpart, elsepart)
 
     def ifelseifstmt(self, lst) -> ASTNode:
         condpart, thenpart, *elifblock, elsepart = lst
-        print(f'In ifelseifstmt {lst}')
+        PARSE.debug('In ifelseifstmt %s', lst)
         elif_node = IfNode(elifblock[-2], elifblock[-1], elsepart)
 
         # Number of additional elifs to handle
@@ -312,80 +365,80 @@ class MakeAssemblyTree(Transformer):
 
     def whilestmt(self, lst) -> ASTNode:
         condpart, statementblock = lst
-        print(f'In whilestmt {lst}')
+        PARSE.debug('In whilestmt %s', lst)
         return WhileNode(condpart, statementblock)
 
 
     def _or(self, lst) -> ASTNode:
         left, right = lst
-        print(f'In OR {left}, {right}')
+        PARSE.debug('In OR %s, %s', left, right)
         return OrNode(left, right)
 
     def _and(self, lst) -> ASTNode:
         left, right = lst
-        print(f'In OR {left}, {right}')
+        PARSE.debug('In OR %s, %s', left, right)
         return AndNode(left, right)
 
     def _not(self, lst) -> ASTNode:
         statement = lst[0]
-        print(f'In NOT {statement}')
+        PARSE.debug('In NOT %s', statement)
         return NotNode(statement)
 
     def eq(self, lst) -> ASTNode:
         left, right = lst
-        print(f'In eq {left}, {right}')
+        PARSE.debug('In eq %s, %s', left, right)
         return MethodcallNode(left, 'EQUALS', MethodargsNode([right]))
         # return ComparisonNode(left, right, "==")
 
     def lt(self, lst) -> ASTNode:
         left, right = lst
-        print(f'In lt {left}, {right}')
+        PARSE.debug('In lt %s, %s', left, right)
         return MethodcallNode(left, 'LESS', MethodargsNode([right]))
 
     def gt(self, lst) -> ASTNode:
         left, right = lst
-        print(f'In gt {left}, {right}')
+        PARSE.debug('In gt %s, %s', left, right)
         return MethodcallNode(left, 'MORE', MethodargsNode([right]))
 
     def geq(self, lst) -> ASTNode:
         left, right = lst
-        print(f'In geq {left}, {right}')
+        PARSE.debug('In geq %s, %s', left, right)
         return MethodcallNode(left, 'ATLEAST', MethodargsNode([right]))
 
     def leq(self, lst) -> ASTNode:
         left, right = lst
-        print(f'In leq {left}, {right}')
+        PARSE.debug('In leq %s, %s', left, right)
         return MethodcallNode(left, 'ATMOST', MethodargsNode([right]))
 
 
     def type(self, lst) -> str:
-        print(f'In type NAME:{lst[0]}')
+        PARSE.debug('In type NAME:%s', lst[0])
         return lst[0].value
 
     def lexp(self, lst) -> ASTNode:
-        print(f'In lexp NAME:{lst[0]}')
+        PARSE.debug('In lexp NAME:%s', lst[0])
         return BareLexpNode(lst[0].value)
 
     def rexp(self, lst) -> ASTNode:
-        print(f'In rexp NAME:{lst[0]}')
+        PARSE.debug('In rexp NAME:%s', lst[0])
         return RexpNode(lst[0])
 
     def bare_right_expression(self, lst) -> ASTNode:
-        print(f'In barerexp NAME:{lst[0]}')
+        PARSE.debug('In barerexp NAME:%s', lst[0])
         return BareRexpNode(lst[0])
 
     def var_reference(self, lst) -> ASTNode:
         referenced_variable = lst[0].value
-        print(f'In var_reference var:{referenced_variable}')
+        PARSE.debug('In var_reference var:%s', referenced_variable)
         return VarReferenceNode(referenced_variable)
 
     def fieldreference(self, lst) -> ASTNode:
         atomic_expr, field_name = lst
-        print(f'In fieldreference {atomic_expr}, {field_name}')
+        PARSE.debug('In fieldreference %s, %s', atomic_expr, field_name)
         return FieldReferenceLexpNode(atomic_expr, field_name)
 
     def this_reference_lexp(self, lst) -> ASTNode:
-        print(f'In field_reference_lexp {lst}')
+        PARSE.debug('In field_reference_lexp %s', lst)
         return ThisReferenceLexpNode(lst[0].value)
 
     def constructorcall(self, lst) -> ASTNode:
@@ -394,88 +447,89 @@ class MakeAssemblyTree(Transformer):
             arguments = arguments[0]
         else:
             arguments = None
-        print(f'In constructor call with {caller_name} with arguments {arguments}')
+        PARSE.debug('In constructor call with %s with arguments %s', caller_name, arguments)
         return ConstructorCall(caller_name.value, arguments)
 
     def return_statement(self, lst) -> ASTNode:
-        print(f'In return {lst}')
+        PARSE.debug('In return %s', lst)
         return ReturnStatementNode(lst[0])
 
     def type_alternative(self, lst) -> ASTNode:
         alt_name, type_name, statement_block = lst
-        print(f'In type_alternative {lst}')
+        PARSE.debug('In type_alternative %s', lst)
         return TypeAlternativeNode(alt_name.value, type_name.value, statement_block)
 
     # Typecase is a just a glorified if/else
     def typecase(self, lst) -> ASTNode:
         rexp, *type_alternative_list = lst
-        print(f'In typecase {lst}')
+        PARSE.debug('In typecase %s', lst)
 
         def replace_var_reference(node: ASTNode, rexp_to_add: ASTNode, alt_name_reference_node: ASTNode):
             if not node:
                 return
-            print(node, node.children)
+            PARSE.debug('%s %s', node, node.children)
             for i in range(len(node.children)):
                 if node.children[i] == alt_name_reference_node:
                     node.children[i] = rexp_to_add
             for child in node.children:
                 replace_var_reference(child, rexp_to_add, alt_name_reference_node)
 
-        def typecase_tree_builder(cur_index: int, rexp_to_add: ASTNode) -> IfNode:
+        # The alternatives test and take the value of a variable: rexp itself if it is one,
+        # which they can read again, or else the hidden TYPECASE_TEMP, so that rexp is
+        # evaluated once
+        if isinstance(rexp, VarReferenceNode):
+            scrutinee, statements = rexp.variable, []
+        else:
+            scrutinee, statements = TYPECASE_TEMP, [AssignmentNode(VarReferenceNode(TYPECASE_TEMP), None, rexp)]
+
+        # Build the chain of IfNodes from the last alternative up, without recursion
+        if_node = None
+        for cur_item in reversed(type_alternative_list):
             # Add assignment node
-            cur_item = type_alternative_list[cur_index]
-            assignment_node = AssignmentNode(TypeCaseVarReferenceNode(cur_item.alt_name, cur_item.type_name), cur_item.type_name, rexp)
+            assignment_node = AssignmentNode(TypeCaseVarReferenceNode(cur_item.alt_name, cur_item.type_name),
+                                             cur_item.type_name, VarReferenceNode(scrutinee))
             cur_item.children[0].children.insert(0, assignment_node)
 
             # Exchange variable reference to the alt_name with the rexp
-            alt_name_reference_node = VarReferenceNode(cur_item.alt_name)
+            # replace_var_reference(cur_item.children[0], rexp, VarReferenceNode(cur_item.alt_name))
 
-            # replace_var_reference(cur_item.children[0], rexp_to_add, alt_name_reference_node)
+            if_node = IfNode(IsInstanceNode(VarReferenceNode(scrutinee), cur_item.type_name),
+                             cur_item.children[0], if_node)
 
-
-            # Base case is the last type_alternative_list item
-            if cur_index == len(type_alternative_list) - 1:
-                return IfNode(IsInstanceNode(rexp, cur_item.type_name),
-                              cur_item.children[0],
-                              None)
-
-            else:
-                return IfNode(IsInstanceNode(rexp, cur_item.type_name),
-                                             cur_item.children[0],
-                                             typecase_tree_builder(cur_index + 1, rexp_to_add))
-
-        return typecase_tree_builder(0, rexp)
+        if if_node:
+            statements.append(if_node)
+        return StatementBlockNode(statements)
 
 
     # def neg(self, expression: Instr_dtype_pair) -> Instr_dtype_pair:
     def neg(self, lst) -> ASTNode:
         val = lst[0]
-        print(f'In neg: {val}')
+        PARSE.debug('In neg: %s', val)
         return MethodcallNode(ConstNode(0, 'Int'), "MINUS", MethodargsNode([val]))
 
     def add(self, lst) -> ASTNode:
         val1, val2 = lst
-        print(f'In add: {val1}, {val2}')
+        PARSE.debug('In add: %s, %s', val1, val2)
         return MethodcallNode(val1, "PLUS", MethodargsNode([val2]))
 
     def sub(self, lst) -> ASTNode:
         val1, val2 = lst
-        print(f'In sub: {val1}, {val2}')
+        PARSE.debug('In sub: %s, %s', val1, val2)
         return MethodcallNode(val1, "MINUS", MethodargsNode([val2]))
 
     def mul(self, lst) -> ASTNode:
         val1, val2 = lst
-        print(f'In mul: {val1}, {val2}')
+        PARSE.debug('In mul: %s, %s', val1, val2)
         return MethodcallNode(val1, "TIMES", MethodargsNode([val2]))
 
     def div(self, lst) -> ASTNode:
         val1, val2 = lst
-        print(f'In mul: {val1}, {val2}')
+        PARSE.debug('In mul: %s, %s', val1, val2)
         return MethodcallNode(val1, "DIVIDE", MethodargsNode([val2]))
 
 def type_check(RootNode: ASTNode) -> Dict[str, str]:
     var_dict: Dict[str, str] = {}
-    RootNode.type_eval(var_dict)
+    run(RootNode.type_eval(var_dict))
     # temp_var_dict = var_dict.copy()
     # print('Variables after first pass', var_dict)
     # count = 1
@@ -491,55 +545,102 @@ def type_check(RootNode: ASTNode) -> Dict[str, str]:
     # print('Finished Type Checking')
     return var_dict
 
-def write_to_file(quack_file: str, RootNode: ASTNode, output_asm: str, var_dict: Dict[str, str]) -> List[str]:
-    final_file_list = []
-    # instr = RootNode.r_eval(var_dict)
+class ClassCode(NamedTuple):
+    """A declared class whose methods still have to be checked and its code generated"""
+    class_name: str
+    # A ClassNode, or the BareStatementBlockNode of the main class
+    node: ASTNode
+    # Variables found when the class was declared (empty for the main class)
+    var_dict: Dict[str, str]
+
+
+def declare_program(RootNode: ASTNode, output_asm: str,
+                    up_to_date: Optional[Callable[[str, ASTNode], bool]] = None) -> List[ClassCode]:
+    """Check the program as far as its class declarations, completing the class hierarchy,
+    and return the classes that need code, in program order.  The statements at the end of
+    the program become the class '<output_asm>_main', which comes last.  With up_to_date,
+    a class for which up_to_date(class name, node) is true once every class is declared
+    is left out.
+    """
     ProgramNode = RootNode.children[0]
 
     # Run an initialization check
-    ProgramNode.init_check([], False)
+    run(ProgramNode.init_check([], False))
 
     *class_list, bare_statement_block_node = ProgramNode.children
-    for qclass in class_list:
-        qclass.type_eval({})
-    for qclass in class_list:
-        class_name = qclass.children[0].class_name
-        with open(f'{class_name}.asm', 'w') as f:
-            instr = qclass.r_eval({})
-            for i in instr:
-                # Replace self constructor and field reference on 'self', except class declaration
-                if i == f'\tnew {class_name}':
-                    i = '\tnew $'
-                if (i.startswith('\tstore') or i.startswith('\tload') or i.startswith('\tcall')) and f'{class_name}:' in i:
-                    i = i.replace(f'{class_name}:', '$:')
-                if (i == f'\tis_instance {class_name}'):
-                    i = '\tis_instance $'
-                f.write(i)
-                f.write('\n')
-        final_file_list.append(class_name)
-
-    with open(output_asm + '_main.asm', 'w') as f:
-        bare_statement_block_local_var_dict = {}
-        bare_statement_block_node.type_eval(bare_statement_block_local_var_dict)
-        instr = bare_statement_block_node.r_eval(bare_statement_block_local_var_dict)
-        f.write(f".class {output_asm + '_main'}:Obj\n")
-        f.write('\n')
-        f.write('.method $constructor\n')
-        bare_statement_block_local_var_list = [item[1] if isinstance(item, tuple) else item for item in bare_statement_block_local_var_dict.keys()]
-        if bare_statement_block_local_var_list:
-            f.write(f".local {','.join(bare_statement_block_local_var_list)}\n")
-        for i in instr:
-            f.write(i)
-            f.write('\n')
-        f.write('\tconst nothing\n')
-        f.write('\treturn 0\n')
-
-    print('\nPrinting Class Hierarchy')
-    print_class_hierarchy()
-    print('------------------------------------------------------')
-
-    final_file_list.append(output_asm + '_main')
-    return final_file_list
+    # Declare every class before checking any methods, which may use classes declared after theirs
+    class_var_dicts = [{} for _ in class_list]
+    for qclass, class_var_dict in zip(class_list, class_var_dicts):
+        qclass.declare(class_var_dict)
+
+    classes = [ClassCode(qclass.children[0].class_name, qclass, class_var_dict)
+               for qclass, class_var_dict in zip(class_list, class_var_dicts)]
+    classes.append(ClassCode(output_asm + '_main', bare_statement_block_node, {}))
+    complete_class_hierarchy(referenced_classes(ProgramNode) | {class_code.class_name for class_code in classes[:-1]})
+    if up_to_date:
+        stale = []
+        for class_code in classes:
+            if up_to_date(class_code.class_name, class_code.node):
+                CODEGEN.info('%s is up to date', class_code.class_name)
+            else:
+                stale.append(class_code)
+        classes = stale
+    trace_class_hierarchy()
+    return classes
+
+
+def simplify_class(class_code: ClassCode) -> None:
+    """Fold the constant expressions of a checked class, then drop its dead code"""
+    folded = fold_constants(class_code.node)
+    CODEGEN.info('Folded %d constant expressions in %s', folded, class_code.class_name)
+    dropped = eliminate_dead_code(class_code.node)
+    CODEGEN.info('Dropped %d unreachable statements and branches in %s', dropped, class_code.class_name)
+
+
+def generate_class(class_code: ClassCode) -> List[IRItem]:
+    """Check the methods of a declared class and generate its code.  Once the hierarchy
+    is complete, classes are independent of each other: they may be generated in any
+    order, or in different processes.  Labels are numbered from 1 in each class, so a
+    class's code does not depend on the classes generated before it.
+    """
+    reset_labels()
+    out = Emitter()
+    if isinstance(class_code.node, ClassNode):
+        class_code.node.type_eval_methods(class_code.var_dict)
+        simplify_class(class_code)
+        # The assembler resolves references to the class it is assembling by name,
+        # so they need no rewriting to '$'
+        run(class_code.node.r_eval({}, out))
+    else:
+        local_var_dict = {}
+        run(class_code.node.type_eval(local_var_dict))
+        simplify_class(class_code)
+        out.emit(ClassDecl(class_code.class_name, 'Obj'), MethodDecl('$constructor'))
+        local_var_list = [item[1] if isinstance(item, tuple) else item for item in local_var_dict.keys()]
+        if local_var_list:
+            out.emit(LocalsDecl(tuple(local_var_list)))
+        run(class_code.node.r_eval(local_var_dict, out))
+        out.emit(Instr(Op.CONST, NamedConst('nothing')), Instr(Op.RETURN, 0))
+    CODEGEN.info('Generated %s (%d items)', class_code.class_name, len(out.code))
+    items, hits = peephole.optimize(out.code)
+    PEEPHOLE.info('%s: %d items, %s', class_code.class_name, len(items),
+                  ', '.join(f'{rule} {count}' for rule, count in hits.items()) or 'no hits')
+    return items
+
+
+def generate_assembly(RootNode: ASTNode, output_asm: str,
+                      up_to_date: Optional[Callable[[str, ASTNode], bool]] = None) -> Dict[str, List[IRItem]]:
+    """Check the program and generate code for each of its classes that needs it (see
+    declare_program), keyed by class name
+    """
+    return {class_code.class_name: generate_class(class_code)
+            for class_code in declare_program(RootNode, output_asm, up_to_date)}
+
+
+def write_to_file(assembly: Dict[str, List[IRItem]]) -> None:
+    """Render each class's code as assembly source in <class name>.asm"""
+    for class_name, items in assembly.items():
+        write_atomically(f'{class_name}.asm', ''.join(line + '\n' for line in assemble.render(items)))
 
 
 def ast_pydot__tree_to_png(tree: ASTNode, filename: str, rankdir: 'Literal["TB", "LR", "BT", "RL"]'="LR", **kwargs) -> None:
@@ -587,32 +688,60 @@ def pydot__tree_to_graph(tree: ASTNode, rankdir="LR", **kwargs):
     return graph
 
 
-def main(quack_file, output_asm, builtinclass_json):
-    quack_parser = Lark(quack_grammar, parser='lalr')
-    # quack_parser = Lark(quack_grammar)
-    quack = quack_parser.parse
+def cli() -> object:
+    parser = argparse.ArgumentParser(
+        description="Compile a Quack program into tiny vm assembly, one .asm file per class")
+    parser.add_argument("quack_file", nargs="?")
+    parser.add_argument("output_asm", nargs="?")
+    parser.add_argument("builtinclass_json", nargs="?", default="./builtinclass.json")
+    parser.add_argument("--build-parser", action="store_true",
+                        help="Regenerate the serialized LALR parser for the current grammar and exit")
+    parser.add_argument("--dump-cst", action="store_true",
+                        help="Also print the concrete syntax tree (parses the source a second time)")
+    parser.add_argument("--trace", default="", metavar="CATEGORY[:LEVEL],...",
+                        help=f"Trace compiler phases ({', '.join(tracing.CATEGORIES)} or all) "
+                             f"at level info or debug, e.g. --trace=parse,type-infer:debug")
+    parser.add_argument("--peephole", default="all", metavar="RULE,...",
+                        help=f"Peephole rules to apply to the generated code ({', '.join(peephole.RULES)}), "
+                             f"all (the default) or none")
+    args = parser.parse_args()
+    if not args.build_parser and not (args.quack_file and args.output_asm):
+        parser.error("the following arguments are required: quack_file, output_asm")
+    try:
+        tracing.configure(args.trace)
+        peephole.configure(args.peephole)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def parse_program(quack_file: str, output_asm: str, builtinclass_json: str, dump_cst: bool = False) -> ASTNode:
+    """Load the builtin classes and parse a Quack program into its AST"""
     with open(quack_file) as f:
         input_str = f.read()
-    print(input_str)
+    PARSE.info('Compiling %s\n%s', quack_file, input_str)
     parse_builtin_classes(builtinclass_json)
-    tree = MakeAssemblyTree(output_asm)
-    print('------------------------------------------------------')
-    print(quack(input_str).pretty())
-    print('------------------------------------------------------')
-    ast = tree.transform(quack(input_str))
-    print('------------------------------------------------------')
-    # pydot__tree_to_png(quack(input_str), 'CST.png')
+    if dump_cst:
+        print(make_quack_parser().parse(input_str).pretty())
+    ast = ast_parser().parse(input_str)
+    # pydot__tree_to_png(make_quack_parser().parse(input_str), 'CST.png')
     # ast_pydot__tree_to_png(ast, 'AST.png')
-    print('Printing Transformed AST')
-    pretty_print(ast)
-    print('------------------------------------------------------')
-    final_file_list = write_to_file(quack_file, ast, output_asm, {})
-    with open('final_file_list', 'w') as f:
-        for i in final_file_list:
-            f.write(i + ' ')
+    if PARSE.isEnabledFor(logging.INFO):
+        PARSE.info('Transformed AST\n%s', pretty_format(ast))
+    return ast
+
+
+def compile_to_assembly(quack_file: str, output_asm: str, builtinclass_json: str, dump_cst: bool = False) -> Dict[str, List[IRItem]]:
+    """Parse and check a Quack program, returning the code for each class (see generate_assembly)"""
+    return generate_assembly(parse_program(quack_file, output_asm, builtinclass_json, dump_cst), output_asm)
+
+
+def main(quack_file, output_asm, builtinclass_json, dump_cst=False):
+    write_to_file(compile_to_assembly(quack_file, output_asm, builtinclass_json, dump_cst))
 
 if __name__ == '__main__':
-    if len(sys.argv) != 4:
-        print('Usage: lark_parser.py [input_quack_file] [path/to/output.asm] [path/to/builtinclass.json]')
-        sys.exit(1)
-    main(sys.argv[1], sys.argv[2], sys.argv[3])
+    args = cli()
+    if args.build_parser:
+        print(f'Wrote {build_parser_cache()}')
+        sys.exit(0)
+    main(args.quack_file, args.output_asm, args.builtinclass_json, args.dump_cst)
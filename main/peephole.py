@@ -0,0 +1,209 @@
+"""Peephole optimization of generated method code.
+
+Code generation emits each statement on its own, so the code of a method
+has jumps to the very next instruction (the jump over an empty else),
+conditional jumps over a single jump (if and while conditions), jumps to
+jumps (nested if statements ending together), code after a return, and
+constants or variables pushed only to be popped (bare expressions).
+optimize() rewrites the instructions of each method with the enabled
+rules, over and over until none of them applies, before the code is
+assembled.  Each rule counts its hits (instructions or labels removed,
+jumps rewritten); --trace=peephole reports them for each class.
+
+Rules only look at the instructions of one method.  Labels are local to
+a method, and only jumps refer to them.
+"""
+import collections
+import pathlib
+import sys
+from typing import Callable, Counter, Dict, List, Set, Tuple, Union
+
+# assemble.py lives at the repository root, one level above this directory
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+from assemble import Op, Instr, Label, IRItem
+
+Code = List[Union[Instr, Label]]
+
+JUMPS = (Op.JUMP, Op.JUMP_IF, Op.JUMP_IFNOT)
+# Instructions control never falls through
+ENDS_BLOCK = (Op.JUMP, Op.RETURN, Op.HALT)
+INVERSE = {Op.JUMP_IF: Op.JUMP_IFNOT, Op.JUMP_IFNOT: Op.JUMP_IF}
+# Instructions that only push a value
+PURE_PUSHES = (Op.CONST, Op.LOAD)
+
+
+def labels_at(code: Code, index: int) -> Set[str]:
+    """Names of the labels from code[index] up to the next instruction"""
+    names = set()
+    while index < len(code) and isinstance(code[index], Label):
+        names.add(code[index].name)
+        index += 1
+    return names
+
+
+def thread_jumps(code: Code) -> Tuple[Code, int]:
+    """A jump to a label where code goes on with jump M jumps to M instead"""
+    # Where each label leads: the first instruction after it
+    leads_to: Dict[str, Instr] = {}
+    pending: List[str] = []
+    for item in code:
+        if isinstance(item, Label):
+            pending.append(item.name)
+        else:
+            for name in pending:
+                leads_to[name] = item
+            pending = []
+
+    out = []
+    hits = 0
+    for item in code:
+        if isinstance(item, Instr) and item.op in JUMPS:
+            target = item.operand
+            seen = {target}
+            while True:
+                next_instr = leads_to.get(target)
+                if next_instr is None or next_instr.op != Op.JUMP or next_instr.operand in seen:
+                    break
+                target = next_instr.operand
+                seen.add(target)
+            if target != item.operand:
+                item = Instr(item.op, target)
+                hits += 1
+        out.append(item)
+    return out, hits
+
+
+def invert_branch(code: Code) -> Tuple[Code, int]:
+    """jump_if L; jump M; L:  becomes  jump_ifnot M; L:  (and the other way around)"""
+    out = []
+    hits = 0
+    index = 0
+    while index < len(code):
+        item = code[index]
+        if (isinstance(item, Instr) and item.op in INVERSE and index + 1 < len(code)
+                and isinstance(code[index + 1], Instr) and code[index + 1].op == Op.JUMP
+                and item.operand in labels_at(code, index + 2)):
+            out.append(Instr(INVERSE[item.op], code[index + 1].operand))
+            hits += 1
+            index += 2
+            continue
+        out.append(item)
+        index += 1
+    return out, hits
+
+
+def jump_to_next(code: Code) -> Tuple[Code, int]:
+    """jump L directly followed by L: is dropped"""
+    out = []
+    hits = 0
+    for index, item in enumerate(code):
+        if isinstance(item, Instr) and item.op == Op.JUMP and item.operand in labels_at(code, index + 1):
+            hits += 1
+            continue
+        out.append(item)
+    return out, hits
+
+
+def unreachable(code: Code) -> Tuple[Code, int]:
+    """Instructions after a jump or return, up to the next label, are dropped"""
+    out = []
+    hits = 0
+    dead = False
+    for item in code:
+        if isinstance(item, Label):
+            dead = False
+        elif dead:
+            hits += 1
+            continue
+        elif item.op in ENDS_BLOCK:
+            dead = True
+        out.append(item)
+    return out, hits
+
+
+def unused_labels(code: Code) -> Tuple[Code, int]:
+    """Labels no jump refers to are dropped, so that code after them may be found unreachable"""
+    used = {item.operand for item in code if isinstance(item, Instr) and item.op in JUMPS}
+    out = [item for item in code if not isinstance(item, Label) or item.name in used]
+    return out, len(code) - len(out)
+
+
+def pure_pop(code: Code) -> Tuple[Code, int]:
+    """const or load directly followed by pop is dropped"""
+    out = []
+    hits = 0
+    for item in code:
+        if (isinstance(item, Instr) and item.op == Op.POP and out and isinstance(out[-1], Instr)
+                and out[-1].op in PURE_PUSHES):
+            out.pop()
+            hits += 1
+            continue
+        out.append(item)
+    return out, hits
+
+
+Rule = Callable[[Code], Tuple[Code, int]]
+
+# In the order they are applied on each round
+RULES: Dict[str, Rule] = {
+    "thread-jumps": thread_jumps,
+    "invert-branch": invert_branch,
+    "jump-to-next": jump_to_next,
+    "unreachable": unreachable,
+    "unused-labels": unused_labels,
+    "pure-pop": pure_pop,
+}
+
+# Names of the rules optimize() applies
+enabled: List[str] = list(RULES)
+
+# Hits of each rule in this process, over every class optimized
+TOTALS: Counter[str] = collections.Counter()
+
+
+def configure(spec: str) -> None:
+    """Enable the rules of a specification like "jump-to-next,pure-pop", or "all" or "none" """
+    global enabled
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    if names == ["all"]:
+        enabled = list(RULES)
+    elif names == ["none"] or not names:
+        enabled = []
+    else:
+        for name in names:
+            if name not in RULES:
+                raise ValueError(f"Unknown peephole rule '{name}', expected 'all', 'none' or some of {', '.join(RULES)}")
+        enabled = [name for name in RULES if name in names]
+
+
+def optimize_method(code: Code, hits: Counter[str]) -> Code:
+    changed = True
+    while changed:
+        changed = False
+        for name in enabled:
+            code, rule_hits = RULES[name](code)
+            if rule_hits:
+                hits[name] += rule_hits
+                changed = True
+    return code
+
+
+def optimize(items: List[IRItem]) -> Tuple[List[IRItem], Counter[str]]:
+    """The code of a class with each method's instructions optimized, and the hits of each rule"""
+    hits: Counter[str] = collections.Counter()
+    if not enabled:
+        return items, hits
+    out: List[IRItem] = []
+    code: Code = []
+    for item in items:
+        if isinstance(item, (Instr, Label)):
+            code.append(item)
+            continue
+        # Declarations separate the code of one method from the next
+        if code:
+            out += optimize_method(code, hits)
+            code = []
+        out.append(item)
+    out += optimize_method(code, hits)
+    TOTALS.update(hits)
+    return out, hits
@@ -0,0 +1,411 @@
+"""In-process driver for the Quack compiler.
+
+Parses and checks a Quack program, generates code for each of its
+classes and assembles them with assemble.translate_ir(), all in one
+interpreter.  Code generation hands the assembler instruction IR
+directly; assembly source (.asm) is only rendered with --emit-asm.
+
+Building the class hierarchy is sequential.  Once every class is
+declared, the vtable and field layout of each class the program defines
+is registered in the assembler's import cache, and the classes no longer
+depend on each other: checking their methods, generating their code and
+assembling them is done class by class, in any order.  For a single
+program, --jobs N does that in N forked worker processes; the code is the
+same as when the classes are compiled one after another.
+
+Each class also gets a typed interface file, <tvmlib>/<Class>.qki.  A
+program may use classes it does not define if their interface and object
+files are there; the compiler loads their interfaces when it first looks
+them up.
+
+Compilation is incremental: classes whose fingerprints (see incremental.py)
+match the program's manifest, <tvmlib>/<root>.manifest, keep their object
+files.  --rebuild ignores the manifest.
+
+With --server, quackc keeps running with the parser, the builtin class
+hierarchy and the assembler's instruction set loaded, and compiles the
+programs it is asked to, one JSON object per line, from stdin or from
+the clients of a Unix socket (--socket).  A request names a program and
+may set the other options:
+
+    {"file": "S.qk", "builtins": "./builtinclass.json", "emit_asm": false, "rebuild": false}
+
+and gets one line back, with the object code of each class compiled:
+
+    {"file": "S.qk", "ok": true, "compiled": ["A", "S_main"], "up_to_date": ["B"],
+     "objects": {"A": {...}, "S_main": {...}}, "diagnostics": []}
+
+A program that does not compile gets "ok": false and the error in
+"diagnostics".  Every request starts from a fresh class hierarchy and
+import cache, and writes the same files a quackc run would.
+
+quackc compiles several programs given together one after another, or,
+with --jobs N, in N worker processes.  Each worker has its own compiler
+state, reset for every program as in the server.  The programs must be
+independent: two programs that define a class of the same name would
+race for its object file.  Output files are written atomically, so
+programs that only use each other's classes through interface and object
+files still read them whole.
+"""
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import pathlib
+import signal
+import socketserver
+import sys
+import traceback
+from typing import Dict, List, NamedTuple, Optional, TextIO, Tuple
+
+# assemble.py lives at the repository root, one level above this directory
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+import assemble
+
+import AST_Classes
+from atomic import write_atomically
+import class_hierarchy
+import incremental
+import lark_parser
+import peephole
+import tracing
+from tracing import CODEGEN
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser(
+        description="Compile Quack programs into tiny vm object code, one .json file per class")
+    parser.add_argument("quack_files", nargs="*", metavar="quack_file")
+    parser.add_argument("--builtins", default="./builtinclass.json",
+                        help="Builtin class description (default ./builtinclass.json)")
+    parser.add_argument("--emit-asm", action="store_true",
+                        help="Also write the assembly source of each class compiled to <Class>.asm")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Compile every class, even those the build manifest says are up to date")
+    parser.add_argument("--dump-cst", action="store_true",
+                        help="Also print the concrete syntax tree (parses the source a second time)")
+    parser.add_argument("--trace", default="", metavar="CATEGORY[:LEVEL],...",
+                        help=f"Trace compiler phases ({', '.join(tracing.CATEGORIES)} or all) "
+                             f"at level info or debug, e.g. --trace=parse,type-infer:debug")
+    parser.add_argument("--peephole", default="all", metavar="RULE,...",
+                        help=f"Peephole rules to apply to the generated code ({', '.join(peephole.RULES)}), "
+                             f"all (the default) or none")
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N",
+                        help="Compile up to N of the programs (or of the classes of a single program) "
+                             "at a time, in worker processes")
+    parser.add_argument("--server", action="store_true",
+                        help="Compile the programs requested on stdin (or --socket), one JSON object per line")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="With --server, take requests from clients of a Unix socket at PATH")
+    args = parser.parse_args()
+    if not args.server and not args.quack_files:
+        parser.error("the following arguments are required: quack_file (or --server)")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    roots = [output_root(quack_file) for quack_file in args.quack_files]
+    for root in set(roots):
+        if roots.count(root) > 1:
+            parser.error(f"Programs would all write {root}_main: "
+                         f"{', '.join(f for f in args.quack_files if output_root(f) == root)}")
+    try:
+        tracing.configure(args.trace)
+        peephole.configure(args.peephole)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def output_root(quack_file: str) -> str:
+    """S.qk compiles its trailing statements to the class S_main"""
+    return pathlib.Path(quack_file).name.split(".")[0]
+
+
+def register_layouts(class_names: List[str]) -> None:
+    """Register the layout of each class the program defines, superclasses first, as its
+    code will lay it out: the methods in slot order, and the fields after the superclass's
+    """
+    for class_name in class_names:
+        quack_class = AST_Classes.ch.find_class(class_name)
+        super_fields = assemble.import_module(quack_class.super_class).fields
+        methods = sorted(quack_class.method_table, key=lambda name: quack_class.method_table[name].slot)
+        fields = super_fields + [field for field in quack_class.fields_list if field not in super_fields]
+        assemble.register_layout(class_name, methods, fields)
+
+
+def compile_class(class_code: lark_parser.ClassCode) -> Tuple[List[assemble.IRItem], assemble.ObjectCode]:
+    """Check, generate and assemble a declared class"""
+    items = lark_parser.generate_class(class_code)
+    objcode = assemble.translate_ir(items)
+    registered = assemble.IMPORTS.get(objcode.class_name)
+    assert registered is None or (registered.methods, registered.fields) == (objcode.method_list, objcode.field_list), \
+        f"{objcode.class_name} was assembled with another layout than the one registered for it"
+    return items, objcode
+
+
+# The classes compile_classes hands to its forked workers, which inherit them
+_classes: List[lark_parser.ClassCode] = []
+
+
+def compile_forked_class(index: int) -> Tuple[List[assemble.IRItem], assemble.ObjectCode]:
+    return compile_class(_classes[index])
+
+
+def compile_classes(classes: List[lark_parser.ClassCode], n_workers: int = 1) \
+        -> List[Tuple[List[assemble.IRItem], assemble.ObjectCode]]:
+    """compile_class each class, in up to n_workers forked processes.  Results (or the
+    first error) come in the order of classes, whatever order the workers finish in.
+    """
+    global _classes
+    try:
+        fork = multiprocessing.get_context("fork")
+    except ValueError:
+        # No fork on this platform; the workers would have to re-parse the program
+        n_workers = 1
+    if n_workers <= 1 or len(classes) <= 1:
+        return [compile_class(class_code) for class_code in classes]
+    _classes = classes
+    try:
+        with concurrent.futures.ProcessPoolExecutor(min(n_workers, len(classes)), mp_context=fork) as pool:
+            return list(pool.map(compile_forked_class, range(len(classes))))
+    finally:
+        _classes = []
+
+
+def program_classes(ast: AST_Classes.ASTNode) -> List[str]:
+    """Names of the classes a parsed program defines"""
+    *class_list, _ = ast.children[0].children
+    return [class_node.children[0].class_name for class_node in class_list]
+
+
+def write_interfaces(class_names: List[str]) -> None:
+    for class_name in class_names:
+        path = assemble.config().tvmlib.joinpath(class_name).with_suffix(".qki")
+        class_hierarchy.write_interface(AST_Classes.ch.find_class(class_name), path)
+        CODEGEN.info("Wrote %s", path)
+
+
+def object_path(class_name: str) -> pathlib.Path:
+    return assemble.config().tvmlib.joinpath(class_name).with_suffix(".json")
+
+
+def write_objects(objects: Dict[str, assemble.ObjectCode]) -> Dict[str, str]:
+    """Write each object file, returning the text written for each class"""
+    written = {}
+    for class_name, objcode in objects.items():
+        path = object_path(class_name)
+        written[class_name] = text = objcode.json() + "\n"
+        write_atomically(path, text)
+        CODEGEN.info("Wrote %s", path)
+    return written
+
+
+def compile_program(quack_file: str, builtinclass_json: str = "./builtinclass.json",
+                    dump_cst: bool = False, emit_asm: bool = False,
+                    manifest: Optional[incremental.Manifest] = None, jobs: int = 1) -> Dict[str, assemble.ObjectCode]:
+    """Compile a Quack program to object code for each of its classes, keyed by class name.
+    Writes the typed interface of each class the program defines to <tvmlib>/<Class>.qki.
+    With emit_asm, also writes <Class>.asm for each class, as lark_parser.py does.
+    With a manifest, classes it lists as up to date are left out, and the fingerprints
+    of the program's classes are left pending in it.  jobs is the number of processes
+    to compile classes in (see compile_classes).
+    """
+    root = output_root(quack_file)
+    ast = lark_parser.parse_program(quack_file, root, builtinclass_json, dump_cst)
+    # Classes the program uses but does not define come from their interface files
+    class_names = program_classes(ast)
+    AST_Classes.ch.class_loader = class_hierarchy.interface_loader(assemble.config().tvmlib, class_names)
+    up_to_date = None
+    if manifest is not None:
+        syntax = incremental.syntax_fingerprints(ast, root + "_main")
+
+        def up_to_date(class_name: str, node: AST_Classes.ASTNode) -> bool:
+            fingerprint = incremental.class_fingerprint(class_name, node, syntax[class_name], AST_Classes.ch)
+            return manifest.check(class_name, fingerprint, object_path(class_name))
+
+    classes = lark_parser.declare_program(ast, root, up_to_date)
+    write_interfaces(class_names)
+    register_layouts(class_names)
+    compiled = compile_classes(classes, jobs)
+    if emit_asm:
+        lark_parser.write_to_file({class_code.class_name: items
+                                   for class_code, (items, _) in zip(classes, compiled)})
+    return {class_code.class_name: objcode for class_code, (_, objcode) in zip(classes, compiled)}
+
+
+class Build(NamedTuple):
+    objects: Dict[str, assemble.ObjectCode]
+    # Classes left as they were, because the manifest says they are up to date
+    up_to_date: List[str]
+
+
+def build(quack_file: str, builtinclass_json: str = "./builtinclass.json", dump_cst: bool = False,
+          emit_asm: bool = False, rebuild: bool = False, jobs: int = 1) -> Build:
+    """Compile a program as a quackc run does, writing its object files and manifest"""
+    # Object files may have changed since the last program, in a server
+    assemble.reset_imports()
+    manifest_path = assemble.config().tvmlib.joinpath(output_root(quack_file) + ".manifest")
+    toolchain = incremental.toolchain_fingerprint(builtinclass_json)
+    if rebuild:
+        manifest = incremental.Manifest(manifest_path, toolchain)
+    else:
+        manifest = incremental.Manifest.load(manifest_path, toolchain)
+    objects = compile_program(quack_file, builtinclass_json, dump_cst, emit_asm, manifest, jobs)
+    manifest.update(write_objects(objects))
+    manifest.save()
+    return Build(objects, [class_name for class_name in manifest.pending if class_name not in objects])
+
+
+def serve_request(line: str, default_builtins: str) -> str:
+    """Response line for a request line (see the module docstring)"""
+    try:
+        request = json.loads(line)
+        quack_file = request["file"]
+    except (ValueError, TypeError, KeyError) as e:
+        return json.dumps({"ok": False, "diagnostics": [f"Bad request: {e!r}"]})
+    try:
+        result = build(quack_file, request.get("builtins", default_builtins),
+                       emit_asm=request.get("emit_asm", False), rebuild=request.get("rebuild", False))
+    except Exception as e:
+        CODEGEN.debug("%s", traceback.format_exc())
+        return json.dumps({"file": quack_file, "ok": False, "diagnostics": [f"{type(e).__name__}: {e}"]})
+    return json.dumps({
+        "file": quack_file,
+        "ok": True,
+        "compiled": list(result.objects),
+        "up_to_date": result.up_to_date,
+        "objects": {class_name: objcode.struct() for class_name, objcode in result.objects.items()},
+        "diagnostics": [],
+    })
+
+
+def serve_stream(requests: TextIO, responses: TextIO, default_builtins: str) -> None:
+    for line in requests:
+        if line.strip():
+            responses.write(serve_request(line, default_builtins) + "\n")
+            responses.flush()
+
+
+def serve(socket_path: Optional[str], default_builtins: str) -> None:
+    """Answer requests until stdin closes, or forever on a Unix socket.
+    Requests are compiled one at a time; the compiler's state is global.
+    """
+    if socket_path is None:
+        serve_stream(sys.stdin, sys.stdout, default_builtins)
+        return
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                line = line.decode("utf-8")
+                if line.strip():
+                    self.wfile.write((serve_request(line, default_builtins) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    # Stop on kill as on ^C, removing the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with socketserver.UnixStreamServer(socket_path, Handler) as server:
+        print(f"Serving on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+
+class Job(NamedTuple):
+    quack_file: str
+    builtinclass_json: str
+    dump_cst: bool
+    emit_asm: bool
+    rebuild: bool
+
+
+def run_job(job: Job) -> Tuple[List[str], List[str]]:
+    """Build a program in a worker process, returning the classes compiled and those up to date.
+    Object code stays in the worker; it has been written to the object files.
+    """
+    result = build(*job)
+    return list(result.objects), result.up_to_date
+
+
+def report(compiled: List[str], up_to_date: List[str]) -> None:
+    for class_name in compiled:
+        print(f"Compiled {class_name} to {object_path(class_name)}")
+    for class_name in up_to_date:
+        print(f"{class_name} is up to date")
+
+
+def report_failure(job: Job, error: Exception) -> None:
+    print(f"{job.quack_file}: {type(error).__name__}: {error}", file=sys.stderr)
+
+
+def build_each(jobs: List[Job]) -> bool:
+    """Build the programs one after the other in this process, reporting on each.
+    A program that does not compile does not stop the others.  Returns whether they
+    all compiled.
+    """
+    ok = True
+    for job in jobs:
+        try:
+            result = build(*job)
+        except Exception as e:
+            report_failure(job, e)
+            ok = False
+            continue
+        report(list(result.objects), result.up_to_date)
+    return ok
+
+
+def configure_worker(trace: str, peephole_rules: str) -> None:
+    tracing.configure(trace)
+    peephole.configure(peephole_rules)
+
+
+def build_all(jobs: List[Job], n_workers: int, trace: str, peephole_rules: str) -> bool:
+    """Build the programs in a pool of n_workers processes, reporting on each program in
+    the order given.  A program that does not compile does not stop the others.
+    Returns whether they all compiled.
+    """
+    ok = True
+    # Workers forked from here share the parser; spawned ones build their own
+    lark_parser.ast_parser()
+    with concurrent.futures.ProcessPoolExecutor(n_workers, initializer=configure_worker,
+                                                initargs=(trace, peephole_rules)) as pool:
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                compiled, up_to_date = future.result()
+            except Exception as e:
+                report_failure(job, e)
+                ok = False
+                continue
+            report(compiled, up_to_date)
+    return ok
+
+
+def main():
+    args = cli()
+    if args.server:
+        serve(args.socket, args.builtins)
+        return
+    jobs = [Job(quack_file, args.builtins, args.dump_cst, args.emit_asm, args.rebuild)
+            for quack_file in args.quack_files]
+    if len(jobs) == 1:
+        # A single program is compiled class by class in parallel instead
+        result = build(*jobs[0], jobs=args.jobs)
+        report(list(result.objects), result.up_to_date)
+        return
+    if args.jobs == 1:
+        ok = build_each(jobs)
+    else:
+        ok = build_all(jobs, min(args.jobs, len(jobs)), args.trace, args.peephole)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Leveled compile tracing for the Quack compiler.
+
+Every compiler phase logs to its own category, a child of the "quackc"
+logger.  All categories are silent until configure() switches them on
+(the --trace option of quackc).  Messages use logging's lazy %-formatting,
+so a disabled category never formats node reprs or variable dicts; code
+that has to build a large message first should check isEnabledFor.
+"""
+import logging
+import sys
+from typing import Dict
+
+PARSE = logging.getLogger("quackc.parse")
+INIT_CHECK = logging.getLogger("quackc.init-check")
+TYPE_INFER = logging.getLogger("quackc.type-infer")
+CODEGEN = logging.getLogger("quackc.codegen")
+HIERARCHY = logging.getLogger("quackc.hierarchy")
+PEEPHOLE = logging.getLogger("quackc.peephole")
+# The assembler's own logger; it logs through the root logger
+ASSEMBLE = logging.getLogger("assemble")
+
+CATEGORIES: Dict[str, logging.Logger] = {
+    "parse": PARSE,
+    "init-check": INIT_CHECK,
+    "type-infer": TYPE_INFER,
+    "codegen": CODEGEN,
+    "hierarchy": HIERARCHY,
+    "peephole": PEEPHOLE,
+    "assemble": ASSEMBLE,
+}
+
+LEVELS: Dict[str, int] = {
+    "info": logging.INFO,
+    "debug": logging.DEBUG,
+}
+
+# Trace output goes to stderr and does not pass through the root logger
+# (assemble.py configures that one for its own messages)
+_handler = logging.StreamHandler(sys.stderr)
+_handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+_root = logging.getLogger("quackc")
+_root.addHandler(_handler)
+_root.propagate = False
+_root.setLevel(logging.WARNING)
+
+
+def configure(spec: str) -> None:
+    """Enable tracing from a specification like "parse,type-infer:debug".
+    Each item is a category (or "all") with an optional ":info" or ":debug"
+    level; a category named without a level traces at info.
+    """
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        category, _, level_name = item.partition(":")
+        level_name = level_name or "info"
+        if level_name not in LEVELS:
+            raise ValueError(f"Unknown trace level '{level_name}', expected one of {', '.join(LEVELS)}")
+        if category == "all":
+            loggers = list(CATEGORIES.values())
+        elif category in CATEGORIES:
+            loggers = [CATEGORIES[category]]
+        else:
+            raise ValueError(f"Unknown trace category '{category}', expected 'all' or one of {', '.join(CATEGORIES)}")
+        for logger in loggers:
+            logger.setLevel(LEVELS[level_name])
+
+
+def reset() -> None:
+    """Silence every category again"""
+    for logger in CATEGORIES.values():
+        logger.setLevel(logging.NOTSET)
+    ASSEMBLE.setLevel(logging.WARNING)
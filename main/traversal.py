@@ -0,0 +1,67 @@
+"""Explicit-stack traversal of Quack ASTs.
+
+Left-deep chains of method calls (a + b + c + ...) and else-if chains
+make ASTs thousands of nodes deep.  The compiler passes (init_check,
+type_eval, r_eval, c_eval and l_eval on each node class) would need a
+Python frame per level if they called each other directly, so instead
+each pass method of a node that has children is a generator.  It yields
+the call of a pass on a child, e.g.
+
+    caller_type = yield caller.type_eval(local_var_dict)
+
+and run() drives the calls from a stack of suspended generators: the
+yielded generator is pushed, and what it returns (or raises) is sent
+back to the generator that yielded it.  Pass methods of leaf nodes may
+be plain methods; what they return is sent straight back.  Code outside
+the passes starts one with run(node.type_eval(...)).
+
+walk() visits every node of a tree, for analyses that only look at
+nodes and do not care about their order.
+"""
+from types import GeneratorType
+from typing import Any, Iterator, List
+
+
+def run(step: Any) -> Any:
+    """Run a pass (the generator a pass method returned, or its plain result) to
+    completion, returning its result or raising what it raised
+    """
+    if type(step) is not GeneratorType:
+        return step
+    stack: List[GeneratorType] = [step]
+    value: Any = None
+    error: BaseException = None
+    while True:
+        try:
+            if error is None:
+                child = stack[-1].send(value)
+            else:
+                child = stack[-1].throw(error)
+                error = None
+        except StopIteration as done:
+            stack.pop()
+            if not stack:
+                return done.value
+            value = done.value
+            continue
+        except BaseException as e:
+            stack.pop()
+            if not stack:
+                raise
+            # Raise it in the pass that started the one that raised it
+            error = e
+            continue
+        if type(child) is GeneratorType:
+            stack.append(child)
+            value = None
+        else:
+            value = child
+
+
+def walk(node: Any) -> Iterator[Any]:
+    """Every node of the tree under node (included), parents before their children"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(child for child in reversed(node.children) if child)
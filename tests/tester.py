@@ -1,5 +1,5 @@
-"""Simple test script for Ori (tiny vm) asm files.
-(Extend later to work with Quack compilation)
+"""Simple test script for Ori (tiny vm) asm files,
+and for Quack programs compiled with quackc.
 
 FIXME: There must be better ways to handle file dependencies
 """
@@ -21,8 +21,13 @@ log.setLevel(logging.INFO)
 PY = "python3"
 ROOT = ".."
 ASM = f"{ROOT}/assemble.py"
+QUACKC = f"{ROOT}/main/quackc.py"
+BUILTIN_CLASSES = f"{ROOT}/builtinclass.json"
 VM = f"{ROOT}/build/tiny_vm"
-BUILTINS = ["Bool.json", "Int.json", "Nothing.json", "Obj.json", "String.json"]
+# Seconds per run.  Built without assertions, the vm goes on after
+# a failed type check, and may then loop forever.
+VM_TIMEOUT = 10
+BUILTINS = ["Bool.json", "Boolean.json", "Int.json", "Nothing.json", "Obj.json", "String.json"]
 ASMREQS = ["asm.conf", "opdefs.txt"]
 
 def install_prereqs():
@@ -57,23 +62,57 @@ def assemble(class_name: str) -> bool:
     return True
 
 
+def compile_quack(program: str) -> bool:
+    """Compile the Quack program P.qk to OBJ/C.json for each
+    of its classes C, and OBJ/P_main.json for its statements.
+    """
+    src = pathlib.Path("./" + program + ".qk")
+    try:
+        proc = subprocess.run([PY, QUACKC, "--builtins", BUILTIN_CLASSES, src], text=True)
+        proc.check_returncode() # May throw CalledProcessError
+    except subprocess.CalledProcessError:
+        log.warning(f"Compiler failed on {src}")
+        return False
+    return True
+
+
 def test_class(class_name: str) -> bool:
     """Assemble, run, and check a single test case
     for a class C, in src/C.asm, with expected output
     in expect/C_stdout.txt.  Returns True iff test case
     has expected outcome.
     """
-    ok = True
-    observed_stdout = pathlib.Path("out/" + class_name + "_stdout.txt")
-    observed_stderr = pathlib.Path("out/" + class_name + "_stderr.txt")
-    expect_stdout = pathlib.Path("expect/" + class_name + "_stdout.txt")
     if not assemble(class_name):
         return False
+    return run_class(class_name, class_name)
+
+
+def test_program(program: str) -> bool:
+    """Compile, run, and check a single test case for
+    a Quack program P, in P.qk, with expected output in
+    expect/P_stdout.txt.  Returns True iff test case
+    has expected outcome.
+    """
+    if not compile_quack(program):
+        return False
+    return run_class(program, program + "_main")
+
+
+def run_class(case_name: str, class_name: str) -> bool:
+    """Run class_name as the main program and compare
+    its output with expect/<case_name>_stdout.txt
+    """
+    ok = True
+    observed_stdout = pathlib.Path("out/" + case_name + "_stdout.txt")
+    observed_stderr = pathlib.Path("out/" + case_name + "_stderr.txt")
+    expect_stdout = pathlib.Path("expect/" + case_name + "_stdout.txt")
+    if not expect_stdout.exists():
+        log.warning(f"No expected output {expect_stdout}")
+        return False
     try:
-        std_out = open(observed_stdout, "w")
-        std_err = open(observed_stderr, "w")
-        proc = subprocess.run([VM, class_name], text=True,
-                              stdout=std_out, stderr=std_err)
+        with open(observed_stdout, "w") as std_out, open(observed_stderr, "w") as std_err:
+            proc = subprocess.run([VM, class_name], text=True,
+                                  stdout=std_out, stderr=std_err, timeout=VM_TIMEOUT)
         proc.check_returncode() # May throw CalledProcessError
         if filecmp.cmp(observed_stdout, expect_stdout):
             log.info(f"OK: {class_name} produced expected output")
@@ -83,12 +122,20 @@ def test_class(class_name: str) -> bool:
     except subprocess.CalledProcessError:
         log.warning(f"Crashed: {proc.args}")
         ok = False
+    except subprocess.TimeoutExpired:
+        log.warning(f"Timed out after {VM_TIMEOUT}s: {class_name}")
+        ok = False
     return ok
 
 
 def main():
-    """Stub"""
+    """Run every case in src/TESTS.csv, in order.  Actions are
+    assemble (only), run (assemble and run), xfail (assemble and
+    run, known to fail) and quack (compile and run a Quack program).
+    Exits with status 1 if any case did not have its expected outcome.
+    """
     install_prereqs()
+    failures = 0
     with open("src/TESTS.csv") as cases:
         case_reader = csv.DictReader(cases)
         for case in case_reader:
@@ -101,12 +148,24 @@ def main():
             elif action == "run":
                 log.info(f"Class '{class_name} -- assemble and run")
                 ok = test_class(class_name)
+            elif action == "xfail":
+                log.info(f"Class '{class_name} -- assemble and run, expected to fail")
+                ok = not test_class(class_name)
+                if not ok:
+                    log.warning(f"{class_name} passed; it is no longer expected to fail")
+            elif action == "quack":
+                log.info(f"Program '{class_name} -- compile and run")
+                ok = test_program(class_name)
             else:
                 log.error(f"Unrecognized action '{action}' for class {class_name}")
+                ok = False
             if not ok:
+                failures += 1
                 print(f"*** Failed test case: {action} {class_name}", file=sys.stderr)
     # FIXME: Add a check for omitted source files
-    print("Testing complete")
+    print(f"Testing complete, {failures} failed")
+    if failures:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,79 @@
+"""
+Time class hierarchy queries on a synthetic hierarchy.
+
+Builds the builtin classes plus --classes random classes (each extends a
+random earlier class, so the tree is bushy with a few deep chains), then
+times find_class, get_path_to_subclass, find_LCA and is_legal_assignment
+on random class names.  Pass --main-dir to measure the class_hierarchy
+module of another checkout, e.g. an older revision in a git worktree.
+"""
+
+import argparse
+import pathlib
+import random
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser("Class hierarchy query times on a synthetic hierarchy")
+    parser.add_argument("--classes", type=int, default=1000, help="Classes to add to the builtins")
+    parser.add_argument("--queries", type=int, default=20000, help="Queries per operation")
+    parser.add_argument("--chain", type=float, default=0.5,
+                        help="Probability that a class extends one of the 8 latest classes; "
+                             "near 1 gives deep hierarchies")
+    parser.add_argument("--seed", type=int, default=211)
+    parser.add_argument("--main-dir", default=str(ROOT / "main"),
+                        help="Directory to import class_hierarchy from")
+    return parser.parse_args()
+
+
+def build_hierarchy(class_hierarchy, n_classes: int, chain: float, rng: random.Random):
+    root = class_hierarchy.parse_builtin_classes(str(ROOT / "builtinclass.json"))
+    names = ["Obj", "Int", "String", "Boolean", "Nothing"]
+    for i in range(n_classes):
+        # Favor recent classes so that some chains get deep
+        if rng.random() < chain:
+            super_class = names[-1 - rng.randrange(min(len(names), 8))]
+        else:
+            super_class = rng.choice(names)
+        name = f"C{i}"
+        root.add_class_to_hierarchy(class_hierarchy.QuackClass(name, super_class, [], {}))
+        names.append(name)
+    return root, names
+
+
+def time_queries(label: str, query, pairs) -> None:
+    start = time.perf_counter()
+    for a, b in pairs:
+        query(a, b)
+    seconds = time.perf_counter() - start
+    print(f"{label:<22} {seconds * 1e6 / len(pairs):>9.2f} us/query")
+
+
+def main():
+    args = cli()
+    sys.path.insert(0, args.main_dir)
+    import class_hierarchy
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    root, names = build_hierarchy(class_hierarchy, args.classes, args.chain, rng)
+    build_seconds = time.perf_counter() - start
+    depth = max(len(root.get_path_to_subclass(name)) for name in names) - 1
+
+    pairs = [(rng.choice(names), rng.choice(names)) for _ in range(args.queries)]
+    print(f"{len(names)} classes, max depth {depth}, built in {build_seconds * 1000:.1f} ms")
+    time_queries("find_class", lambda a, b: root.find_class(a), pairs)
+    time_queries("get_path_to_subclass", lambda a, b: root.get_path_to_subclass(a), pairs)
+    time_queries("find_LCA", root.find_LCA, pairs)
+    # Type inference joins the same few types over and over
+    repeated = [rng.choice(pairs[:50]) for _ in range(args.queries)]
+    time_queries("find_LCA, 50 pairs", root.find_LCA, repeated)
+    time_queries("is_legal_assignment", root.is_legal_assignment, pairs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Time class ordering (AST_Classes.order_classes) on generated programs.
+
+Each program declares a chain of classes in reverse, C0 extends C1
+extends ... extends C<n-1>, so every class is declared before its
+superclass and ordering has to reverse the whole list.  Every class
+also takes a parameter of the next class but one, to add constructor
+dependencies.  The program is parsed once (which orders it); then
+order_classes is timed on the parsed class list.
+"""
+
+import argparse
+import pathlib
+import statistics
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "main"))
+
+import AST_Classes
+import lark_parser
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser("Class ordering time for programs declared in reverse order")
+    parser.add_argument("sizes", nargs="*", type=int, default=[100, 1000, 5000],
+                        help="Numbers of classes to measure")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per size")
+    return parser.parse_args()
+
+
+def reversed_chain_program(n_classes: int) -> str:
+    lines = []
+    for i in range(n_classes):
+        super_class = f" extends C{i + 1}" if i + 1 < n_classes else ""
+        param = f"p: C{i + 2}" if i + 2 < n_classes else ""
+        lines.append(f"class C{i}({param}){super_class} {{ }}")
+    lines.append("x = 0;")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    args = cli()
+    print(f"{'classes':>8} {'ms':>9} {'us/class':>9}")
+    for n_classes in args.sizes:
+        AST_Classes.parse_builtin_classes(str(ROOT / "builtinclass.json"))
+        parser = lark_parser.make_quack_parser(lark_parser.MakeAssemblyTree())
+        program = parser.parse(reversed_chain_program(n_classes)).children[0]
+        class_list = program.children[:-1]
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            AST_Classes.order_classes(class_list)
+            timings.append(time.perf_counter() - start)
+        seconds = statistics.median(timings)
+        print(f"{n_classes:>8} {seconds * 1000:>9.2f} {seconds * 1e6 / n_classes:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Time code emission (r_eval/c_eval) on deeply nested if/while programs.
+
+Each program nests alternating if and while statements to the given
+depth, with an assignment at every level, so its code grows linearly
+with the depth.  The program is parsed and type checked once; only the
+emission of its code into an Emitter is timed.  With linear emission
+the time per emitted item stays flat as the depth grows.
+"""
+
+import argparse
+import pathlib
+import statistics
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "main"))
+
+import AST_Classes
+import lark_parser
+from traversal import run
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser("Code emission time for nested if/while programs")
+    parser.add_argument("depths", nargs="*", type=int, default=[50, 100, 200, 400, 800],
+                        help="Nesting depths to measure")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per depth")
+    return parser.parse_args()
+
+
+def nested_program(depth: int) -> str:
+    """x = 0; if x < 1 { x = x + 1; while x < 1 { x = x + 1; if ... } }"""
+    lines = ["x = 0;"]
+    for level in range(depth):
+        keyword = "if" if level % 2 == 0 else "while"
+        lines.append(f"{'  ' * level}{keyword} x < {level + 1} {{ x = x + 1;")
+    lines.extend(f"{'  ' * level}}}" for level in reversed(range(depth)))
+    return "\n".join(lines) + "\n"
+
+
+def checked_statements(source: str) -> AST_Classes.BareStatementBlockNode:
+    """Parse and check a class-free program, returning its statement block"""
+    AST_Classes.parse_builtin_classes(str(ROOT / "builtinclass.json"))
+    ast = lark_parser.make_quack_parser(lark_parser.MakeAssemblyTree()).parse(source)
+    program = ast.children[0]
+    run(program.init_check([], False))
+    statements = program.children[-1]
+    run(statements.type_eval({}))
+    return statements
+
+
+def emit_once(statements: AST_Classes.BareStatementBlockNode) -> (float, int):
+    out = AST_Classes.Emitter()
+    start = time.perf_counter()
+    run(statements.r_eval(statements.bare_statement_block_local_var_dict, out))
+    return time.perf_counter() - start, len(out.code)
+
+
+def main():
+    args = cli()
+    print(f"{'depth':>6} {'items':>8} {'ms':>9} {'us/item':>8}")
+    for depth in args.depths:
+        statements = checked_statements(nested_program(depth))
+        timings = []
+        for _ in range(args.runs):
+            seconds, n_items = emit_once(statements)
+            timings.append(seconds)
+        seconds = statistics.median(timings)
+        print(f"{depth:>6} {n_items:>8} {seconds * 1000:>9.2f} {seconds * 1e6 / n_items:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
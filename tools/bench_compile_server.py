@@ -0,0 +1,85 @@
+"""
+Compare per-program latency of quackc runs with the quackc --server mode.
+
+Compiles the given programs (by default the ones in tests/ that compile)
+--rounds times each, once by running main/quackc.py per program as the
+quackc script does, and once by sending the same requests to a single
+quackc --server over stdin.  Every compile is a --rebuild, so neither
+side skips work through the build manifest.  Runs in a scratch copy of
+OBJ, asm.conf and builtinclass.json.
+"""
+
+import argparse
+import json
+import pathlib
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+QUACKC = ROOT / "main" / "quackc.py"
+DEFAULT_PROGRAMS = ["FactorialControlFlow", "GoldenRatio", "Handv2", "Rect", "Schroedinger",
+                    "bad_class_order_shouldnt_matter"]
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser("quackc run vs. quackc --server latency per program")
+    parser.add_argument("programs", nargs="*",
+                        default=[str(ROOT / "tests" / f"{name}.qk") for name in DEFAULT_PROGRAMS])
+    parser.add_argument("--rounds", type=int, default=3, help="Times each program is compiled")
+    return parser.parse_args()
+
+
+def scratch_copy(workdir: pathlib.Path) -> None:
+    shutil.copytree(ROOT / "OBJ", workdir / "OBJ")
+    shutil.copy(ROOT / "asm.conf", workdir)
+    shutil.copy(ROOT / "builtinclass.json", workdir)
+
+
+def per_run(programs, workdir: pathlib.Path) -> list:
+    timings = []
+    for program in programs:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(QUACKC), "--rebuild", program], cwd=workdir,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def per_request(programs, workdir: pathlib.Path) -> list:
+    """Request latencies; the first one includes the server's start-up"""
+    server = subprocess.Popen([sys.executable, str(QUACKC), "--server"], cwd=workdir, text=True,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    timings = []
+    for program in programs:
+        request_start = time.perf_counter()
+        server.stdin.write(json.dumps({"file": program, "rebuild": True}) + "\n")
+        server.stdin.flush()
+        response = json.loads(server.stdout.readline())
+        assert response["ok"], response["diagnostics"]
+        timings.append(time.perf_counter() - request_start)
+    server.stdin.close()
+    server.wait()
+    return timings
+
+
+def main():
+    args = cli()
+    programs = [str(pathlib.Path(program).resolve()) for program in args.programs] * args.rounds
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = pathlib.Path(tmp)
+        scratch_copy(workdir)
+        runs = per_run(programs, workdir)
+        requests = per_request(programs, workdir)
+
+    print(f"{len(args.programs)} programs, {args.rounds} rounds")
+    print(f"quackc per program:    {statistics.mean(runs) * 1000:8.1f} ms")
+    print(f"first server request:  {requests[0] * 1000:8.1f} ms")
+    print(f"later server requests: {statistics.mean(requests[1:] or requests) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
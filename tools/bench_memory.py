@@ -0,0 +1,92 @@
+"""
+Measure the peak memory (RSS) of checking and generating a large program.
+
+Generates one program of --classes classes with --methods methods each.
+Every method assigns --locals local variables and then runs --branches
+if/elif/else and while statements that initialize variables of their own,
+so that the variable scopes of the method are large and its AST has many
+scoped blocks.  Each tree given (default: this checkout) parses, checks and
+generates the program in a fresh process, with the AST alive throughout as
+in quackc; the peak RSS of that process and its time are printed.  Compare
+two checkouts of the compiler with, e.g.
+
+    python tools/bench_memory.py . /path/to/older/checkout
+"""
+
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+# Run in the child process, with the tree to measure as its working directory
+MEASURE = """
+import json, resource, sys, time
+sys.path.insert(0, 'main')
+sys.path.insert(0, '.')
+import lark_parser
+start = time.perf_counter()
+ast = lark_parser.parse_program(sys.argv[1], 'Big', 'builtinclass.json')
+assembly = lark_parser.generate_assembly(ast, 'Big')
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'items': sum(len(items) for items in assembly.values())}))
+"""
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser("Peak memory of checking and generating a large program")
+    parser.add_argument("trees", nargs="*", default=[str(ROOT)], help="Checkouts of the compiler to measure")
+    parser.add_argument("--classes", type=int, default=20, help="Classes in the program")
+    parser.add_argument("--methods", type=int, default=10, help="Methods per class")
+    parser.add_argument("--locals", type=int, default=60, help="Local variables each method assigns")
+    parser.add_argument("--branches", type=int, default=60, help="Scoped statements per method")
+    return parser.parse_args()
+
+
+def method(index: int, n_locals: int, n_branches: int) -> str:
+    lines = [f"    def m{index}(k: Int): Int {{"]
+    lines += [f"        v{i} = k + {i};" for i in range(n_locals)]
+    for i in range(n_branches):
+        if i % 2 == 0:
+            lines.append(f"        if k < {i} {{ a{i} = v{i % n_locals}; k = a{i}; }} "
+                         f"elif k == {i} {{ b{i} = {i}; k = b{i}; }} else {{ c{i} = k; k = c{i} - 1; }}")
+        else:
+            lines.append(f"        while k < {i} {{ w{i} = k + 1; k = w{i}; }}")
+    lines.append("        return k;")
+    lines.append("    }")
+    return "\n".join(lines)
+
+
+def program(n_classes: int, n_methods: int, n_locals: int, n_branches: int) -> str:
+    classes = []
+    for c in range(n_classes):
+        methods = "\n\n".join(method(m, n_locals, n_branches) for m in range(n_methods))
+        classes.append(f"class C{c}(n: Int) {{\n    this.n = n;\n\n{methods}\n}}\n")
+    return "\n".join(classes) + "x = C0(1);\nx.m0(3).PRINT();\n"
+
+
+def measure(tree: pathlib.Path, source: pathlib.Path) -> dict:
+    result = subprocess.run([sys.executable, "-c", MEASURE, str(source)], cwd=tree,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    args = cli()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = pathlib.Path(tmp) / "Big.qk"
+        source.write_text(program(args.classes, args.methods, args.locals, args.branches))
+        print(f"{args.classes} classes x {args.methods} methods, {args.locals} locals and "
+              f"{args.branches} scoped statements per method")
+        print(f"{'tree':<40} {'peak RSS':>10} {'seconds':>8}")
+        for tree in args.trees:
+            result = measure(pathlib.Path(tree).resolve(), source)
+            print(f"{tree:<40} {result['maxrss_kb'] / 1024:>8.1f}MB {result['seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Measure quackc --jobs throughput, in programs compiled per second, against
+the number of worker processes.
+
+Generates --programs independent programs (their classes have distinct
+names) of --classes classes each, then compiles all of them with one
+quackc --jobs N --rebuild run per worker count.  With --single, compiles
+one program of --classes classes instead, which quackc --jobs N splits
+by class, and reports classes per second.  Times include quackc's
+start-up.  Runs in a scratch copy of OBJ, asm.conf and builtinclass.json.
+"""
+
+import argparse
+import os
+import pathlib
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+QUACKC = ROOT / "main" / "quackc.py"
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser("quackc --jobs throughput against the number of workers")
+    parser.add_argument("workers", nargs="*", type=int,
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}), help="Worker counts to measure")
+    parser.add_argument("--programs", type=int, default=32, help="Programs to compile")
+    parser.add_argument("--classes", type=int, default=8, help="Classes per program")
+    parser.add_argument("--single", action="store_true",
+                        help="Compile a single program, parallel by class")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per worker count")
+    return parser.parse_args()
+
+
+def program(index: int, n_classes: int) -> str:
+    """A chain of classes P<index>C0 <- P<index>C1 <- ..., each with a loop and some branches"""
+    lines = []
+    for i in range(n_classes):
+        name = f"P{index}C{i}"
+        super_class = f" extends P{index}C{i - 1}" if i else ""
+        lines.append(f"""class {name}(n: Int){super_class} {{
+    this.n = n;
+    this.total = 0;
+
+    def step(k: Int): Int {{
+        if k < this.n {{
+            return k + 1;
+        }} elif k == this.n {{
+            return k * 2;
+        }} else {{
+            return k - 1;
+        }}
+    }}
+
+    def run(): Int {{
+        i = 0;
+        while i < this.n {{
+            if i < this.n / 2 {{
+                this.total = this.total + i * 2;
+            }} else {{
+                this.total = this.total - i;
+            }}
+            i = i + 1;
+        }}
+        return this.total;
+    }}
+
+    def STR(): String {{
+        return "{name}(" + this.n.STR() + ")";
+    }}
+}}
+""")
+    lines.append(f"x = P{index}C{n_classes - 1}(10);\nx.step(x.run()).PRINT();\n")
+    return "\n".join(lines)
+
+
+def scratch_copy(workdir: pathlib.Path) -> None:
+    shutil.copytree(ROOT / "OBJ", workdir / "OBJ")
+    shutil.copy(ROOT / "asm.conf", workdir)
+    shutil.copy(ROOT / "builtinclass.json", workdir)
+
+
+def compile_all(programs, n_workers: int, workdir: pathlib.Path) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(QUACKC), "--rebuild", "--jobs", str(n_workers), *programs],
+                   cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    args = cli()
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = pathlib.Path(tmp)
+        scratch_copy(workdir)
+        programs = []
+        for index in range(1 if args.single else args.programs):
+            path = workdir / f"P{index}.qk"
+            path.write_text(program(index, args.classes))
+            programs.append(str(path))
+
+        if args.single:
+            unit, count = "classes", args.classes
+            print(f"1 program of {args.classes} classes, {os.cpu_count()} CPUs")
+        else:
+            unit, count = "files", args.programs
+            print(f"{args.programs} programs of {args.classes} classes, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'seconds':>9} {unit + '/s':>9} {'speedup':>8}")
+        baseline = None
+        for n_workers in args.workers:
+            seconds = statistics.median(compile_all(programs, n_workers, workdir) for _ in range(args.runs))
+            baseline = baseline or seconds
+            print(f"{n_workers:>8} {seconds:>9.2f} {count / seconds:>9.1f} {baseline / seconds:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare cold and warm start-up latency of the Quack compiler front end.
+
+A cold run has no serialized parser and must build the LALR tables for
+quack_grammar; a warm run loads them from main/__quackcache__.  Each run
+is a fresh interpreter compiling the given program, which is what the
+quackc script pays per invocation.
+"""
+
+import argparse
+import pathlib
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+FRONT_END = ROOT / "main" / "lark_parser.py"
+PARSER_CACHE_DIR = ROOT / "main" / "__quackcache__"
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser("Cold vs. warm compile latency of lark_parser.py")
+    parser.add_argument("program", nargs="?", default=str(ROOT / "tests" / "GoldenRatio.qk"),
+                        help="Quack program to compile; defaults to tests/GoldenRatio.qk")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per configuration")
+    return parser.parse_args()
+
+
+def compile_once(program: pathlib.Path, workdir: pathlib.Path) -> float:
+    """Seconds for one complete front end run in a new interpreter"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(FRONT_END), str(program), "bench",
+                    str(ROOT / "builtinclass.json")],
+                   cwd=workdir, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    args = cli()
+    program = pathlib.Path(args.program).resolve()
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = pathlib.Path(tmp)
+        cold = []
+        for _ in range(args.runs):
+            shutil.rmtree(PARSER_CACHE_DIR, ignore_errors=True)
+            cold.append(compile_once(program, workdir))
+        # The last cold run left fresh tables behind
+        warm = [compile_once(program, workdir) for _ in range(args.runs)]
+
+    print(f"{program.name}, {args.runs} runs each")
+    print(f"cold (build LALR tables): {statistics.mean(cold) * 1000:8.1f} ms")
+    print(f"warm (load cached tables): {statistics.mean(warm) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
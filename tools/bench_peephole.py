@@ -0,0 +1,89 @@
+"""
+Count the vm instructions of the tests/*.qk programs without and with the
+peephole optimizer.
+
+Each program is compiled with quackc --peephole none and --peephole all
+(or the rules given with --rules), in a scratch copy of OBJ, asm.conf and
+builtinclass.json.  For each, prints the instructions in its code (from
+the .asm quackc emits) and the instructions the vm executes running it
+(tiny_vm -S), and checks that both runs print the same.  Programs that
+do not compile are skipped.
+"""
+
+import argparse
+import pathlib
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+QUACKC = ROOT / "main" / "quackc.py"
+
+EXECUTED = re.compile(r"^Executed (\d+) instructions$", re.MULTILINE)
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser("vm instruction counts without and with the peephole optimizer")
+    parser.add_argument("programs", nargs="*", default=sorted(str(p) for p in (ROOT / "tests").glob("*.qk")),
+                        help="Quack programs (default tests/*.qk)")
+    parser.add_argument("--rules", default="all", help="Peephole rules to compare against none")
+    parser.add_argument("--vm", default=str(ROOT / "bin" / "tiny_vm"), help="tiny_vm binary built with -S")
+    return parser.parse_args()
+
+
+def scratch_copy(workdir: pathlib.Path) -> None:
+    shutil.copytree(ROOT / "OBJ", workdir / "OBJ")
+    shutil.copy(ROOT / "asm.conf", workdir)
+    shutil.copy(ROOT / "builtinclass.json", workdir)
+
+
+def measure(program: pathlib.Path, rules: str, vm: str):
+    """(instructions in the code, instructions executed, output) of a program, or None
+    if it does not compile
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = pathlib.Path(tmp)
+        scratch_copy(workdir)
+        shutil.copy(program, workdir)
+        compiled = subprocess.run([sys.executable, str(QUACKC), "--emit-asm", "--peephole", rules, program.name],
+                                  cwd=workdir, capture_output=True, text=True)
+        if compiled.returncode != 0:
+            return None
+        static = sum(1 for asm in workdir.glob("*.asm")
+                     for line in asm.read_text().splitlines() if line.startswith("\t"))
+        main_class = program.name.split(".")[0] + "_main"
+        run = subprocess.run([vm, "-S", "-L", "OBJ", main_class], cwd=workdir,
+                             capture_output=True, text=True, timeout=60)
+        executed = EXECUTED.search(run.stderr)
+        return static, int(executed.group(1)) if executed else None, run.stdout
+
+
+def main():
+    args = cli()
+    print(f"{'program':<34} {'code':>13} {'executed':>17}")
+    totals = [0, 0, 0, 0]
+    for program in map(pathlib.Path, args.programs):
+        before = measure(program, "none", args.vm)
+        if before is None:
+            print(f"{program.name:<34} does not compile")
+            continue
+        after = measure(program, args.rules, args.vm)
+        if after[2] != before[2]:
+            print(f"{program.name:<34} OUTPUT DIFFERS")
+            continue
+        if before[1] is None or after[1] is None:
+            print(f"{program.name:<34} {before[0]:>6} {after[0]:>6}  (vm counts unavailable)")
+            continue
+        print(f"{program.name:<34} {before[0]:>6} {after[0]:>6} {before[1]:>8} {after[1]:>8} "
+              f"{100 * (before[1] - after[1]) / before[1]:>5.1f}%")
+        for index, value in enumerate((before[0], after[0], before[1], after[1])):
+            totals[index] += value
+    if totals[2]:
+        print(f"{'total':<34} {totals[0]:>6} {totals[1]:>6} {totals[2]:>8} {totals[3]:>8} "
+              f"{100 * (totals[2] - totals[3]) / totals[2]:>5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
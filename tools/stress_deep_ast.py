@@ -0,0 +1,117 @@
+"""
+Compile programs whose ASTs are --depth levels deep, at Python's default
+recursion limit.
+
+Each case is a program with one very deep construct: a left-deep sum
+(a + b + c + ..., a chain of method calls), a right-deep parenthesized
+sum, an or chain, a not chain, an elif chain and a typecase with that
+many alternatives (binding the same variable name, as each distinct name
+becomes a local of the whole method).  Every case is parsed, checked, generated and
+assembled in-process; the time of each phase is printed.  Exits with
+status 1 if any case fails, e.g. with a RecursionError.
+"""
+
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+import traceback
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "main"))
+sys.path.insert(0, str(ROOT))
+
+import assemble
+import lark_parser
+
+
+
+def cli() -> object:
+    parser = argparse.ArgumentParser("Compile programs with very deep ASTs")
+    parser.add_argument("--depth", type=int, default=10000, help="Depth of each deep construct")
+    parser.add_argument("cases", nargs="*", help="Cases to run (default all)")
+    return parser.parse_args()
+
+
+def left_sum(n: int) -> str:
+    return "x = 0;\nx = " + " + ".join(["x"] * n) + ";\nx.PRINT();\n"
+
+
+def right_sum(n: int) -> str:
+    return "x = " + "(1 + " * (n - 1) + "1" + ")" * (n - 1) + ";\nx.PRINT();\n"
+
+
+def or_chain(n: int) -> str:
+    return "b = false;\nif " + " or ".join(["b"] * n) + " { \"yes\".PRINT(); }\n"
+
+
+def not_chain(n: int) -> str:
+    return "b = " + "not " * n + "true;\nb.PRINT();\n"
+
+
+def elif_chain(n: int) -> str:
+    lines = ["x = 3;", "y = 0;", "if x == 0 { y = 0; }"]
+    lines += [f"elif x == {i} {{ y = {i}; }}" for i in range(1, n)]
+    lines.append("else { y = -1; }\ny.PRINT();")
+    return "\n".join(lines) + "\n"
+
+
+def typecase_alternatives(n: int) -> str:
+    types = ["Int", "String", "Boolean", "Nothing"]
+    alternatives = "\n".join(f"    v: {types[i % len(types)]} {{ y = {i}; }}" for i in range(n - 1))
+    return f"x: Obj = 3;\ny = 0;\ntypecase x {{\n{alternatives}\n    o: Obj {{ y = -1; }}\n}}\ny.PRINT();\n"
+
+
+CASES = {
+    "left-sum": left_sum,
+    "right-sum": right_sum,
+    "or-chain": or_chain,
+    "not-chain": not_chain,
+    "elif-chain": elif_chain,
+    "typecase": typecase_alternatives,
+}
+
+
+def compile_case(source_path: pathlib.Path) -> dict:
+    """Times of each phase of compiling a program"""
+    times = {}
+    start = time.perf_counter()
+    ast = lark_parser.parse_program(str(source_path), source_path.stem, str(ROOT / "builtinclass.json"))
+    times["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assembly = lark_parser.generate_assembly(ast, source_path.stem)
+    times["check+generate"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assemble.reset_imports()
+    for items in assembly.values():
+        assemble.translate_ir(items)
+    times["assemble"] = time.perf_counter() - start
+    return times
+
+
+def main():
+    args = cli()
+    print(f"recursion limit {sys.getrecursionlimit()}, depth {args.depth}")
+    print(f"{'case':<12} {'parse':>9} {'check+gen':>10} {'assemble':>9}")
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.cases or CASES:
+            source_path = pathlib.Path(tmp) / f"{name.replace('-', '_')}.qk"
+            source_path.write_text(CASES[name](args.depth))
+            try:
+                times = compile_case(source_path)
+            except Exception:
+                failed = True
+                print(f"{name:<12} FAILED")
+                traceback.print_exc(limit=-3)
+                continue
+            print(f"{name:<12} {times['parse'] * 1000:>7.0f}ms {times['check+generate'] * 1000:>8.0f}ms "
+                  f"{times['assemble'] * 1000:>7.0f}ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -35,14 +35,19 @@ struct obj_struct {
 
 /* A class contains its name (only for debugging),
  * a pointer to its superclass (for isinstance or typecase),
- * and a table of method pointers ("virtual functions"
+ * its preorder interval in the class hierarchy (also for
+ * isinstance), and a table of method pointers ("virtual functions"
  * in C++ terminology).  Method pointers are addresses of
  * instruction sequences.
  */
+#define UNNUMBERED (-1)  // Class without an interval; is_instance walks its supers
+
 struct class_header_struct {
     char *class_name;
     int healthy_class_tag;
     class_ref super;  // Needed for typecase
+    int pre;          // Preorder number, or UNNUMBERED; subclasses are numbered
+    int last;         //   pre..last, so is_instance needs no walk up the supers
     int n_fields;     // Redundant but convenient for debugging
     int object_size;  // Malloc this much before calling constructor
 };
@@ -45,6 +45,51 @@ static void set_loaded(class_ref c) {
     return;
 }
 
+/* Is ancestor clazz or one of its superclasses? */
+static int is_ancestor(class_ref ancestor, class_ref clazz) {
+    for (; clazz; clazz = clazz->header.super) {
+        if (clazz == ancestor) return 1;
+        if (clazz == the_class_Obj) return 0;
+    }
+    return 0;
+}
+
+/* Take the preorder interval [pre, last] from the object file, if it has one.
+ * is_instance trusts the intervals of two numbered classes, so a class is
+ * numbered only if its interval nests in its superclass's interval and
+ * overlaps no other loaded class except its ancestors.  Anything else
+ * (no interval, a subclass of an unnumbered class, classes compiled
+ * separately) stays UNNUMBERED and is checked by walking the superclasses.
+ */
+static void set_interval(class_ref the_class, cJSON *interval) {
+    if (! cJSON_IsArray(interval) || cJSON_GetArraySize(interval) != 2) {
+        return;
+    }
+    int pre = (int) cJSON_GetNumberValue(cJSON_GetArrayItem(interval, 0));
+    int last = (int) cJSON_GetNumberValue(cJSON_GetArrayItem(interval, 1));
+    class_ref the_super = the_class->header.super;
+    if (the_super->header.pre == UNNUMBERED
+        || pre <= the_super->header.pre || pre > last || last > the_super->header.last) {
+        log_info("Class %s interval [%d, %d] does not nest in %s; unnumbered",
+                 the_class->header.class_name, pre, last, the_super->header.class_name);
+        return;
+    }
+    for (int i=0; i < n_classes_loaded; ++i) {
+        class_ref other = loaded_classes[i];
+        if (other->header.pre == UNNUMBERED
+            || last < other->header.pre || other->header.last < pre) {
+            continue;
+        }
+        if (! is_ancestor(other, the_super)) {
+            log_info("Class %s interval [%d, %d] overlaps %s; unnumbered",
+                     the_class->header.class_name, pre, last, other->header.class_name);
+            return;
+        }
+    }
+    the_class->header.pre = pre;
+    the_class->header.last = last;
+}
+
 /* Initialize loader
  * (loads built-in classes, dummy main program,
  * special named constants)
@@ -259,8 +304,11 @@ static int load_json(char buf[]) {
             .healthy_class_tag = HEALTHY,
             .n_fields = n_fields,
             .object_size = obj_size,
-            .super = the_super
+            .super = the_super,
+            .pre = UNNUMBERED,
+            .last = UNNUMBERED
     };
+    set_interval(the_class, cJSON_GetObjectItemCaseSensitive(tree, "interval"));
     log_debug("Class %s class object size %d with %d methods",
              class_name, class_obj_size, n_methods);
     log_debug("Objects of %s size %d with %d fields",
@@ -185,6 +185,11 @@ int is_instance(obj_ref thing, class_ref clazz) {
     assert(clazz->header.healthy_class_tag == HEALTHY);
     class_ref thing_class = thing->header.clazz;
     log_debug("Is_instance %s, %s", thing_class->header.class_name, clazz->header.class_name);
+    // Subclasses of a numbered class are numbered within its interval
+    if (thing_class->header.pre != UNNUMBERED && clazz->header.pre != UNNUMBERED) {
+        return clazz->header.pre <= thing_class->header.pre
+               && thing_class->header.pre <= clazz->header.last;
+    }
     while (1) {
         if (thing_class == clazz) {
             log_debug("YES");
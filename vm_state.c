@@ -16,6 +16,7 @@
 vm_Word vm_code_block[CODE_CAPACITY];
 vm_addr vm_pc =   &vm_code_block[0];
 int vm_run_state = VM_RUNNING;
+long vm_steps = 0;
 enum LOG_LEVEL vm_logging = INFO;
 
 char *guess_description(vm_Word w);
@@ -285,6 +286,7 @@ void vm_step() {
     vm_Instr instr = vm_fetch_next().instr;
     char *name = guess_description((vm_Word) instr);
     log_debug("Step:  %s",name );
+    ++vm_steps;
     (*instr)();
     health_check_builtins();
     stack_dump(8);
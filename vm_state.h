@@ -117,5 +117,6 @@ extern obj_ref get_const_value(int index);
 
 /* Execution control */
 void vm_run();
+extern long vm_steps;   // Instructions executed so far
 
 #endif //TINY_VM_VM_STATE_H